@@ -0,0 +1,60 @@
+"""Measure the startup time of the command-line tool for each command.
+
+Each command is run with `--help` in a new Python process, which imports the tool
+and parses the arguments but does not connect to any remote cluster. The time of
+the interpreter alone is measured as a reference, and the median time of each
+command is printed. With `--budget`, the benchmark fails if any command takes more
+than the given time (in milliseconds) on top of the interpreter:
+
+    python benchmarks/cli_startup.py --repeat 20 --budget 150
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from jupyterdask.cli import COMMANDS
+
+CODE = "from jupyterdask.main import main; main()"
+
+
+def measure(args: list[str], repeat: int) -> float:
+    """Run a Python process several times and return its median run time.
+
+    :param args: arguments of the Python interpreter
+    :param repeat: number of runs
+    :return: median run time (in milliseconds)
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, *args], stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(times)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="runs per command.")
+    parser.add_argument("--budget", type=float, help="maximum ms per command.")
+    args = parser.parse_args()
+
+    baseline = measure(["-c", "pass"], args.repeat)
+    print(f"{'command':<10} {'ms':>8} {'+ms':>8}")
+    print(f"{'(python)':<10} {baseline:>8.1f} {0:>8.1f}")
+    over_budget = []
+    for command in ("run", *COMMANDS):
+        argv = ["--help"] if command == "run" else [command, "--help"]
+        elapsed = measure(["-c", CODE, *argv], args.repeat)
+        print(f"{command:<10} {elapsed:>8.1f} {elapsed - baseline:>8.1f}")
+        if args.budget is not None and elapsed - baseline > args.budget:
+            over_budget.append(command)
+    if over_budget:
+        sys.exit(f"Over the budget of {args.budget} ms: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Measure the throughput of the Dask communication protocols between two processes.
+
+Messages of increasing sizes are sent with the comms of `distributed` (as used
+between the Dask workers) to a process listening on the loopback interface and,
+with `--veth`, in a network namespace connected by a pair of virtual Ethernet
+devices, which adds a network stack with a configurable MTU. Creating the network
+namespace requires root privileges, e.g.:
+
+    sudo python benchmarks/comm_throughput.py --veth --mtu 9000
+
+The protocols to compare are given with `--protocol` (e.g. `tcp` and `ucx`, if
+UCX-Py is installed). On the remote cluster, the benchmark can also be run between
+two nodes, by starting the listening process with `--serve` on one of them.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import subprocess
+import sys
+import time
+
+from distributed.comm import CommClosedError, connect, listen
+from distributed.protocol import to_serialize
+
+NAMESPACE = "jupyterdask-bench"
+HOST_ADDRESS = "10.213.0.1"
+NAMESPACE_ADDRESS = "10.213.0.2"
+
+SIZES = [2**10, 2**16, 2**20, 2**24, 2**26]
+
+
+async def serve(address: str) -> None:
+    """Acknowledge the messages received until the standard input is closed.
+
+    :param address: address where to listen, e.g. `tcp://127.0.0.1:0`
+    """
+
+    async def handle(comm):
+        with contextlib.suppress(CommClosedError):
+            while True:
+                await comm.read()
+                await comm.write(b"")
+
+    listener = listen(address, handle)
+    await listener.start()
+    print(listener.contact_address, flush=True)
+    await asyncio.get_running_loop().run_in_executor(None, sys.stdin.read)
+    listener.stop()
+
+
+async def measure(address: str, size: int, total: int) -> float:
+    """Send messages of a given size to a listening process.
+
+    :param address: contact address of the listening process
+    :param size: size (in bytes) of each message
+    :param total: approximate number of bytes to send
+    :return: throughput (in MiB/s)
+    """
+    comm = await connect(address)
+    message = to_serialize(bytes(size))
+    # Warm up the connection
+    await comm.write(message)
+    await comm.read()
+    count = max(1, total // size)
+    start_time = time.perf_counter()
+    for _ in range(count):
+        await comm.write(message)
+        await comm.read()
+    elapsed = time.perf_counter() - start_time
+    await comm.close()
+    return count * size / 2**20 / elapsed
+
+
+@contextlib.contextmanager
+def start_server(address: str, namespace: str | None = None):
+    """Start a listening process, in a network namespace if given.
+
+    :param address: address where to listen
+    :param namespace: name of the network namespace
+    :return: contact address of the process
+    """
+    command = [sys.executable, __file__, "--serve", address]
+    if namespace is not None:
+        command = ["ip", "netns", "exec", namespace, *command]
+    with subprocess.Popen(
+        command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    ) as process:
+        try:
+            yield process.stdout.readline().strip()
+        finally:
+            process.stdin.close()
+            process.wait(timeout=30)
+
+
+@contextlib.contextmanager
+def veth_pair(mtu: int):
+    """Connect a new network namespace by a pair of virtual Ethernet devices.
+
+    :param mtu: MTU of the devices
+    """
+    commands = [
+        f"ip netns add {NAMESPACE}",
+        f"ip link add jdbench0 mtu {mtu} type veth peer name jdbench1 mtu {mtu}",
+        f"ip link set jdbench1 netns {NAMESPACE}",
+        f"ip addr add {HOST_ADDRESS}/30 dev jdbench0",
+        "ip link set jdbench0 up",
+        f"ip -n {NAMESPACE} addr add {NAMESPACE_ADDRESS}/30 dev jdbench1",
+        f"ip -n {NAMESPACE} link set jdbench1 up",
+        f"ip -n {NAMESPACE} link set lo up",
+    ]
+    try:
+        for command in commands:
+            subprocess.run(command.split(), check=True)
+        yield
+    finally:
+        # Deleting the namespace also deletes the devices
+        subprocess.run(["ip", "netns", "del", NAMESPACE], check=False)
+
+
+def run(paths: list[tuple[str, str, str | None]], args: argparse.Namespace) -> None:
+    """Measure and print the throughput over each path and protocol.
+
+    :param paths: name, listening host and network namespace of each path
+    :param args: command-line arguments
+    """
+    print(f"{'path':<9} {'protocol':<9} {'size':>10} {'MiB/s':>9}")
+    for name, host, namespace in paths:
+        for protocol in args.protocol:
+            with start_server(f"{protocol}://{host}:0", namespace) as address:
+                for size in SIZES:
+                    total = args.total * 2**20
+                    rate = asyncio.run(measure(address, size, total))
+                    print(f"{name:<9} {protocol:<9} {size:>10} {rate:>9.1f}")
+
+
+def main() -> None:
+    """Run the benchmark, or the listening process with `--serve`."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--protocol", action="append", help="e.g. tcp or ucx.")
+    parser.add_argument("--total", type=int, default=256, help="MiB sent per size.")
+    parser.add_argument("--veth", action="store_true", help="also over veth.")
+    parser.add_argument("--mtu", type=int, default=1500, help="MTU of veth.")
+    parser.add_argument("--serve", metavar="ADDRESS", help="listen at an address.")
+    parser.add_argument("--connect", metavar="ADDRESS", help="listening process.")
+    args = parser.parse_args()
+    args.protocol = args.protocol or ["tcp"]
+
+    if args.serve is not None:
+        asyncio.run(serve(args.serve))
+    elif args.connect is not None:
+        for size in SIZES:
+            rate = asyncio.run(measure(args.connect, size, args.total * 2**20))
+            print(f"{size:>10} {rate:>9.1f}")
+    elif args.veth:
+        with veth_pair(args.mtu):
+            run(
+                [
+                    ("loopback", "127.0.0.1", None),
+                    ("veth", NAMESPACE_ADDRESS, NAMESPACE),
+                ],
+                args,
+            )
+    else:
+        run([("loopback", "127.0.0.1", None)], args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Measure the effect of binding the Dask workers to NUMA domains on a matmul.
+
+A Dask cluster with one worker process per NUMA domain is started on the current
+node, as in a worker job with `worker_numa_binding`, and a chunked matrix product is
+computed with and without the NUMA preload script of the worker jobs. The benchmark
+is meant to run on a full compute node of the remote cluster, e.g.:
+
+    srun --nodes=1 --exclusive python benchmarks/numa_matmul.py --size 20000
+"""
+
+import argparse
+import logging
+import os
+import pathlib
+import sys
+import time
+
+import dask.array as da
+from distributed import Client, Nanny, Scheduler, SpecCluster
+
+NUMA_SCRIPT = (
+    pathlib.Path(__file__).parents[1] / "jupyterdask" / "scripts" / "numa.py"
+).resolve()
+
+# The BLAS libraries run single-threaded in the worker jobs, see the job script
+BLAS_THREADS = {
+    "OMP_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+}
+
+
+def start_cluster(workers: int, threads: int, numa_binding: bool) -> SpecCluster:
+    """Start a local Dask cluster with workers named as in the worker jobs.
+
+    :param workers: number of worker processes
+    :param threads: number of threads of each worker
+    :param numa_binding: bind the workers to NUMA domains with the preload script
+    :return: the cluster
+    """
+    options = {"nthreads": threads, "env": BLAS_THREADS, "silence_logs": logging.ERROR}
+    if numa_binding:
+        options["preload"] = [str(NUMA_SCRIPT)]
+    return SpecCluster(
+        scheduler={"cls": Scheduler, "options": {"dashboard_address": None}},
+        workers={
+            f"benchmark-{i}": {"cls": Nanny, "options": options} for i in range(workers)
+        },
+        silence_logs=logging.ERROR,
+    )
+
+
+def run_matmul(size: int, chunk_size: int, repeat: int) -> float:
+    """Compute a chunked matrix product on the current Dask client.
+
+    :param size: number of rows and columns of the matrices
+    :param chunk_size: number of rows and columns of the chunks
+    :param repeat: number of runs
+    :return: best throughput (in GFLOP/s)
+    """
+    x = da.random.random((size, size), chunks=chunk_size).persist()
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        (x @ x.T).sum().compute()
+        best = min(best, time.perf_counter() - start_time)
+    return 2 * size**3 / best / 1e9
+
+
+def main() -> None:
+    """Run the benchmark."""
+    sys.path.insert(0, str(NUMA_SCRIPT.parent))
+    from numa import get_numa_domains
+
+    domains = get_numa_domains()
+    cores = len(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=8000, help="matrix size.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="chunk size.")
+    parser.add_argument("--workers", type=int, default=len(domains), help="processes.")
+    parser.add_argument("--repeat", type=int, default=3, help="best of n runs.")
+    args = parser.parse_args()
+    threads = max(1, cores // args.workers)
+    print(f"{len(domains)} NUMA domain(s), {cores} core(s), ", end="")
+    print(f"{args.workers} worker(s) with {threads} thread(s)")
+    if len(domains) < 2:
+        print("Workers are only bound with at least two NUMA domains.")
+
+    for numa_binding in (False, True):
+        with (
+            start_cluster(args.workers, threads, numa_binding) as cluster,
+            Client(cluster),
+        ):
+            rate = run_matmul(args.size, args.chunk_size, args.repeat)
+        label = "with" if numa_binding else "without"
+        print(f"{label} NUMA binding: {rate:.1f} GFLOP/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Compare the throughput of `jupyterdask sync` with scp.
+
+A data set with one large file and many small files is uploaded to and downloaded
+from a remote host with both tools, and the throughput of each transfer is printed.
+The remote host is given as for `jupyterdask sync`, e.g. an alias defined in the SSH
+configuration, and the files are written to a temporary directory on it:
+
+    python benchmarks/sync_throughput.py snellius --large-size 1024 --small-files 2000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import pathlib
+import shutil
+import subprocess
+import tempfile
+import time
+
+from fabric import Connection
+
+from jupyterdask.connection import get_connect_kwargs
+from jupyterdask.sync import sync
+
+
+def create_dataset(path: pathlib.Path, large_size: int, small_files: int) -> None:
+    """Write a data set with one large file and many small files.
+
+    :param path: directory where to write the data set
+    :param large_size: size (in MiB) of the large file
+    :param small_files: number of small files, of 16 KiB each
+    """
+    (path / "large").mkdir(parents=True)
+    with open(path / "large" / "data.bin", "wb") as f:
+        for _ in range(large_size):
+            f.write(os.urandom(2**20))
+    for i in range(small_files):
+        subdir = path / "small" / f"{i // 100:03d}"
+        subdir.mkdir(parents=True, exist_ok=True)
+        (subdir / f"{i:05d}.bin").write_bytes(os.urandom(16 * 2**10))
+
+
+def get_size(path: pathlib.Path) -> int:
+    """Get the total size of the files in a directory tree.
+
+    :param path: path to the directory
+    :return: number of bytes
+    """
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def run_sync(source: str, destination: str, args: argparse.Namespace) -> None:
+    """Transfer a directory tree with `jupyterdask sync`."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        sync(
+            source,
+            destination,
+            identity_file=args.identity_file,
+            streams=args.streams,
+            compress=args.compress,
+        )
+
+
+def run_scp(source: str, destination: str, args: argparse.Namespace) -> None:
+    """Transfer a directory tree with scp."""
+    command = ["scp", "-q", "-r"]
+    if args.identity_file is not None:
+        command += ["-i", args.identity_file]
+    if args.compress:
+        command.append("-C")
+    if args.scp_legacy:
+        command.append("-O")
+    subprocess.run([*command, source, destination], check=True)
+
+
+def measure(
+    conn: Connection,
+    run,
+    direction: str,
+    source: pathlib.Path,
+    remote_copy: str,
+    local_copy: pathlib.Path,
+    args: argparse.Namespace,
+) -> float:
+    """Measure the best time of a transfer, starting each time without a copy.
+
+    :param conn: connection to the remote host
+    :param run: function transferring a directory tree
+    :param direction: "upload" or "download"
+    :param source: local data set
+    :param remote_copy: path of the copy on the remote host
+    :param local_copy: path of the downloaded copy
+    :param args: command-line arguments
+    :return: time (in seconds)
+    """
+    best = float("inf")
+    for _ in range(args.repeat):
+        # Files already copied would be skipped by sync
+        conn.run(f"rm -rf {remote_copy}", hide=True)
+        shutil.rmtree(local_copy, ignore_errors=True)
+        if direction == "upload":
+            src, dst = str(source), f"{args.host}:{remote_copy}"
+        else:
+            run_scp(str(source), f"{args.host}:{remote_copy}", args)
+            src, dst = f"{args.host}:{remote_copy}", str(local_copy)
+        start_time = time.perf_counter()
+        run(src, dst, args)
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("host", help="remote host as `[user@]hostname`.")
+    parser.add_argument("-i", "--identity-file", help="private key.")
+    parser.add_argument("--large-size", type=int, default=512, help="in MiB.")
+    parser.add_argument("--small-files", type=int, default=1000, help="of 16 KiB.")
+    parser.add_argument("--streams", type=int, default=4, help="of sync.")
+    parser.add_argument("--compress", action="store_true", help="compress the data.")
+    parser.add_argument(
+        "--scp-legacy", action="store_true", help="use the SCP protocol, not SFTP."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="best of n runs.")
+    args = parser.parse_args()
+
+    connect_kwargs = get_connect_kwargs(args.identity_file)
+    with (
+        tempfile.TemporaryDirectory() as local_dir,
+        Connection(host=args.host, connect_kwargs=connect_kwargs) as conn,
+    ):
+        local_dir = pathlib.Path(local_dir)
+        create_dataset(local_dir / "data", args.large_size, args.small_files)
+        remote_dir = conn.run("mktemp -d", hide=True).stdout.strip()
+        print(f"{'data set':<8} {'tool':<6} {'direction':<9} {'MiB/s':>8}")
+        try:
+            for dataset in ("large", "small"):
+                source = local_dir / "data" / dataset
+                size = get_size(source)
+                for tool, run in (("sync", run_sync), ("scp", run_scp)):
+                    for direction in ("upload", "download"):
+                        elapsed = measure(
+                            conn,
+                            run,
+                            direction,
+                            source,
+                            f"{remote_dir}/copy",
+                            local_dir / "copy",
+                            args,
+                        )
+                        rate = size / 2**20 / elapsed
+                        print(f"{dataset:<8} {tool:<6} {direction:<9} {rate:>8.1f}")
+        finally:
+            conn.run(f"rm -rf {remote_dir}", hide=True)
+
+
+if __name__ == "__main__":
+    main()
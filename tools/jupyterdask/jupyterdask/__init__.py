@@ -1 +1,13 @@
 __version__ = "0.3.0"
+
+
+def __getattr__(name: str):
+    """Import the Python API when it is first used.
+
+    The API depends on fabric and distributed, which are not needed to start the CLI.
+    """
+    if name == "Session":
+        from .api import Session
+
+        return Session
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
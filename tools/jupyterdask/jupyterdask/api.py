@@ -0,0 +1,283 @@
+import json
+import logging
+import threading
+import time
+import urllib.request
+from contextlib import ExitStack
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlparse
+
+from fabric import Connection
+
+from .connection import get_connect_kwargs
+from .jobs import JobMonitor
+from .remote import (
+    KEEPALIVE_INTERVAL,
+    _check_job,
+    _forward_jupyter,
+    _get_local_url,
+    _parse_url,
+    _setup_log_dir,
+    _start_jupyter,
+)
+from .sessions import SessionRecord, new_session_id
+from .supervisor import SessionEndedError
+from .template import setup_job_script
+from .tunnels import CONNECTION_ERRORS, LocalForward, SessionTunnel, get_free_port
+
+if TYPE_CHECKING:
+    from distributed import Client
+
+logger = logging.getLogger(__file__)
+
+# Time (in seconds) waited for the Jupyter server to respond to the API requests
+REQUEST_TIMEOUT = 60
+
+# Dask settings of the local client, whose messages to the scheduler go through the
+# SSH tunnel: the round trips are much slower than within the remote cluster
+CLIENT_CONFIG = {
+    "distributed.comm.timeouts.connect": "60s",
+    "distributed.comm.timeouts.tcp": "120s",
+    "distributed.comm.retry.count": 3,
+}
+
+
+class Session:
+    """Run Jupyter and a Dask cluster on a remote cluster, and connect from Python.
+
+    The session starts the Jupyter job as `jupyterdask <host>` does, creates a Dask
+    cluster via the Dask JupyterLab extension (i.e. from the cluster configuration of
+    the host) and forwards both the Jupyter server and the Dask scheduler to local
+    ports. The Dask client connects to the scheduler through the SSH tunnel, and
+    never directly to the workers. All the jobs of the session are cancelled when
+    the session is closed::
+
+        with jupyterdask.Session("snellius", workers=4) as session:
+            print(session.url)
+            session.client.submit(sum, [1, 2]).result()
+    """
+
+    def __init__(
+        self,
+        host: str,
+        workers: int = 1,
+        identity_file: str | None = None,
+        port: int = 8888,
+        scheduler_port: int = 8786,
+        timeout: int = 120,
+        template: str | None = None,
+        python: str = "python",
+        image: str | None = None,
+        env_file: str | None = None,
+        env_builder: str = "tykky",
+        env_channels: list[str] | None = None,
+        env_prefix: str = ".jupyterdask/envs",
+        log_dir: str = ".jupyterdask",
+        scheduler_job: bool | None = None,
+    ):
+        """Set up the session, which is not started yet.
+
+        :param host: remote cluster destination
+        :param workers: number of Dask workers requested for the cluster
+        :param identity_file: path to the private key used for authentication on the
+            remote cluster
+        :param port: the local port where to forward the remote Jupyter server
+        :param scheduler_port: the local port where to forward the Dask scheduler
+        :param timeout: time (in seconds) waited for the remote Jupyter server to start
+        :param template: use the given custom file as template for the job script
+        :param python: Python executable on the remote cluster
+        :param image: run Python from the given image using Apptainer
+        :param env_file: build the given Conda environment file on the remote cluster
+            and use it in place of `python` and `image`
+        :param env_builder: either "tykky" (HPC container wrapper) or "apptainer"
+        :param env_channels: channels overriding the ones in the environment file
+        :param env_prefix: path where to store the environments on the remote cluster
+        :param log_dir: path where to save job scripts and log files on the remote
+            cluster
+        :param scheduler_job: run the Dask scheduler in its own job
+        """
+        self.host = host
+        self.workers = workers
+        self.identity_file = identity_file
+        self.port = port
+        self.scheduler_port = scheduler_port
+        self.timeout = timeout
+        self.template = template
+        self.python = python
+        self.image = image
+        self.env_file = env_file
+        self.env_builder = env_builder
+        self.env_channels = env_channels
+        self.env_prefix = env_prefix
+        self.log_dir = log_dir
+        self.scheduler_job = scheduler_job
+        self.record: SessionRecord | None = None
+        self.url: str | None = None
+        self.dashboard_link: str | None = None
+        self.client: Client | None = None
+        self._token: str | None = None
+        self._cluster: dict[str, Any] | None = None
+        self._stack: ExitStack | None = None
+        self._stopped = threading.Event()
+        self._watcher: threading.Thread | None = None
+
+    def __enter__(self) -> "Session":
+        """Start the session."""
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Close the session."""
+        self.close()
+
+    def start(self) -> "Client":
+        """Start the session, once Jupyter is reachable and the cluster is created.
+
+        :return: the Dask client connected to the cluster
+        """
+        import dask
+        from distributed import Client
+
+        python, image = self.python, self.image
+        if self.env_file is not None:
+            from .env import build_environment
+
+            env = build_environment(
+                self.host,
+                self.env_file,
+                identity_file=self.identity_file,
+                prefix=self.env_prefix,
+                builder=self.env_builder,
+                channels=self.env_channels,
+            )
+            python, image = env["python"], env["image"]
+        # The cluster is created by the session, not when Jupyter starts
+        job_script = setup_job_script(
+            self.host,
+            template=self.template,
+            python=python,
+            image=image,
+            log_dir=self.log_dir,
+            initial_workers=0,
+            scheduler_job=self.scheduler_job,
+        )
+        self.port = get_free_port(self.port)
+        self.record = SessionRecord(
+            session_id=new_session_id(),
+            host=self.host,
+            log_dir=self.log_dir,
+            identity_file=self.identity_file,
+        )
+        self._stack = ExitStack()
+        try:
+            connect_kwargs = get_connect_kwargs(self.identity_file)
+            conn = self._stack.enter_context(
+                Connection(
+                    host=self.host, connect_kwargs=connect_kwargs, forward_agent=True
+                )
+            )
+            _setup_log_dir(conn, self.log_dir)
+            monitor = JobMonitor(conn)
+            url = self._stack.enter_context(
+                _start_jupyter(
+                    conn, job_script, self.record, monitor, timeout=self.timeout
+                )
+            )
+            url_info = _parse_url(url)
+            self._token = url_info["token"]
+            tunnel = self._stack.enter_context(
+                _forward_jupyter(
+                    conn, url_info, self.port, self.record, monitor, connect_kwargs
+                )
+            )
+            self.url = _get_local_url(port=self.port, token=self._token)
+            # Give the forward some time to start accepting connections
+            time.sleep(1)
+            self._cluster = self._create_cluster()
+            forward = self._forward_scheduler(tunnel.connection)
+            self._watcher = threading.Thread(
+                target=self._watch, args=(tunnel, forward, monitor), daemon=True
+            )
+            self._watcher.start()
+            self._stack.callback(self._watcher.join)
+            self._stack.callback(self._stopped.set)
+            self._stack.enter_context(dask.config.set(CLIENT_CONFIG))
+            self.client = self._stack.enter_context(
+                Client(
+                    f"tcp://localhost:{forward.local_port}",
+                    direct_to_workers=False,
+                    timeout=CLIENT_CONFIG["distributed.comm.timeouts.connect"],
+                )
+            )
+        except BaseException:
+            self.close()
+            raise
+        return self.client
+
+    def close(self) -> None:
+        """Close the client and cancel all the jobs of the session."""
+        if self._stack is None:
+            return
+        self._cluster = None
+        self.client = None
+        stack, self._stack = self._stack, None
+        stack.close()
+
+    def _create_cluster(self) -> dict[str, Any]:
+        cluster = self._request("PUT", "/dask/clusters/")
+        if self.workers:
+            cluster = self._request(
+                "PATCH", f"/dask/clusters/{cluster['id']}", {"workers": self.workers}
+            )
+        self.dashboard_link = cluster.get("dashboard_link")
+        if self.dashboard_link:
+            # The dashboard is reached via the Jupyter server proxy
+            path = urlparse(self.dashboard_link).path
+            self.dashboard_link = f"{_get_local_url(port=self.port)}{path}"
+        return cluster
+
+    def _forward_scheduler(self, connection: Connection) -> LocalForward:
+        address = urlparse(self._cluster["scheduler_address"])
+        if address.scheme != "tcp":
+            raise ValueError(
+                f"Cannot forward the scheduler address: {address.geturl()}, only the "
+                "TCP protocol can be forwarded."
+            )
+        forward = LocalForward(
+            local_port=get_free_port(self.scheduler_port),
+            remote_host=address.hostname,
+            remote_port=address.port,
+        )
+        forward.start(connection.transport)
+        self._stack.callback(forward.stop)
+        return forward
+
+    def _watch(
+        self, tunnel: SessionTunnel, forward: LocalForward, monitor: JobMonitor
+    ) -> None:
+        transport = tunnel.connection.transport
+        while not self._stopped.wait(KEEPALIVE_INTERVAL):
+            try:
+                tunnel.check(self._stopped)
+                if tunnel.connection.transport is not transport:
+                    # Restart the forward to the scheduler on the new connection
+                    transport = tunnel.connection.transport
+                    forward.stop()
+                    forward.start(transport)
+                _check_job(monitor, self.record.job_id)
+            except SessionEndedError as e:
+                logger.warning(f"Session ended: {e}")
+                return
+            except CONNECTION_ERRORS as e:
+                logger.info(f"Failed to check the session: {e}")
+
+    def _request(self, method: str, path: str, body: Any = None) -> Any:
+        request = urllib.request.Request(
+            f"{_get_local_url(port=self.port)}{path}",
+            method=method,
+            data=json.dumps(body).encode() if body is not None else None,
+        )
+        if self._token is not None:
+            request.add_header("Authorization", f"token {self._token}")
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.load(response)
@@ -1,26 +1,54 @@
 import argparse
+import sys
 from typing import Any
 
 from . import __version__
 
+COMMANDS = (
+    "env",
+    "exec",
+    "sweep",
+    "gateway",
+    "stop",
+    "report",
+    "reports",
+    "status",
+    "sync",
+)
 
-def parse_args() -> dict[str, Any]:
+
+def parse_args(argv: list[str] | None = None) -> dict[str, Any]:
     """Parse command line arguments.
 
-    :return: Input parameter arguments
+    :param argv: command line arguments, the ones of the current process by default
+    :return: Input parameter arguments, including the name of the `command` to run
     """
-    parser = argparse.ArgumentParser()
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        parser = _get_commands_parser()
+    else:
+        parser = _get_run_parser()
+    args = parser.parse_args(argv)
+    if args.command == "sweep" and args.retry is None:
+        if None in (args.host, args.notebook, args.params):
+            parser.error("sweep: host, notebook and --params are required")
+    return vars(args)
+
+
+def _get_run_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="jupyterdask",
+        epilog=(
+            f"additional commands: {', '.join(COMMANDS)}. Run `jupyterdask <command> "
+            "-h` for their options."
+        ),
+    )
+    parser.set_defaults(command="run")
     parser.add_argument(
         "host",
         help="remote cluster destination as `[user@]hostname`.",
     )
-    parser.add_argument(
-        "--identity_file",
-        "-i",
-        help="path to the private key used for authentication on the remote cluster.",
-        type=str,
-        required=False,
-    )
+    _add_identity_file_argument(parser)
     parser.add_argument(
         "--port",
         "-p",
@@ -34,6 +62,449 @@ def parse_args() -> dict[str, Any]:
         type=int,
         default=120,
     )
+    _add_job_script_arguments(parser)
+    parser.add_argument(
+        "--initial-workers",
+        help=(
+            "number of Dask workers requested as soon as the job starts, so that "
+            "they queue while Jupyter is starting. Defaults to the value of the "
+            "remote cluster configuration."
+        ),
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--scheduler-job",
+        help=(
+            "run the schedulers of the Dask clusters in their own jobs (see "
+            "`scheduler_cores`, `scheduler_memory` and `scheduler_partition` in the "
+            "cluster configuration), instead of in the Jupyter job."
+        ),
+        action="store_true",
+        default=None,
+    )
+    parser.add_argument(
+        "--gateway",
+        help=(
+            "create the Dask clusters via the gateway of the team (see `jupyterdask "
+            "gateway`), given the path to the file where it has published its address "
+            "on the remote cluster."
+        ),
+        type=str,
+        required=False,
+    )
+    parser.add_argument(
+        "--socket",
+        help=(
+            "let Jupyter listen on a Unix socket on the compute node instead of a TCP "
+            "port, and forward it via SSH streamlocal. This requires SSH access to "
+            "the compute node where the job runs, with streamlocal forwarding "
+            "allowed."
+        ),
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--stage-manifest",
+        help=(
+            "file listing the URLs of input files (e.g. `dcache:///pnfs/...`), one "
+            "per line, to fetch into node-local storage when the Jupyter and Dask "
+            "worker jobs start. The path of the local copies is given by the "
+            "`JUPYTERDASK_STAGE_DIR` environment variable in the jobs."
+        ),
+        type=str,
+        required=False,
+    )
+    parser.add_argument(
+        "--headless",
+        help="do not open the web browser, only print the JupyterLab URL.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--daemon",
+        help=(
+            "continue in the background once JupyterLab is reachable, after printing "
+            "the session identifier and the JupyterLab URL (implies `--headless`). "
+            "Use `jupyterdask stop` to end the session."
+        ),
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--follow-log",
+        help="print the log of the remote job as it is written.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--metrics-port",
+        help=(
+            "local port where to expose the metrics of the Dask clusters in the "
+            "Prometheus format (at `/metrics`) while the session is running. The "
+            "metrics are always recorded in `~/.jupyterdask/metrics.sqlite`."
+        ),
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--performance-reports",
+        help=(
+            "record a Dask performance report for each computation run on the Dask "
+            "clusters of the session, and fetch the reports to "
+            "`~/.jupyterdask/sessions/<session>/reports` when the session ends."
+        ),
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--verbose",
+        help="toggle verbose local output.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--run",
+        help="run Jupyter on the remote cluster and connect to the interface.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "-v", "--version", action="version", version="%(prog)s " + __version__
+    )
+    return parser
+
+
+def _get_commands_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="jupyterdask")
+    commands = parser.add_subparsers(metavar="command", required=True)
+
+    env = commands.add_parser("env", help="manage Python environments.")
+    env_commands = env.add_subparsers(metavar="command", required=True)
+    env_build = env_commands.add_parser(
+        "build",
+        help=(
+            "lock a Conda environment file and build it as a single container on "
+            "the remote cluster. The build is skipped if the locked environment has "
+            "already been built."
+        ),
+    )
+    env_build.set_defaults(command="env build")
+    env_build.add_argument(
+        "host",
+        help="remote cluster destination as `[user@]hostname`.",
+    )
+    _add_identity_file_argument(env_build)
+    env_build.add_argument(
+        "--env-file",
+        help="path to the Conda environment file.",
+        type=str,
+        default="config/conda/environment.yaml",
+    )
+    env_build.add_argument(
+        "--builder",
+        help=(
+            "tool used to build the environment on the remote cluster, either the "
+            "HPC container wrapper (`tykky`) or `apptainer`."
+        ),
+        choices=("tykky", "apptainer"),
+        default="tykky",
+    )
+    env_build.add_argument(
+        "--channel",
+        "-c",
+        help=(
+            "Conda channel overriding the ones of the environment file. Local "
+            "channels (e.g. a mirror as `file:///path/to/mirror`) are only used to "
+            "solve the environment locally. Can be given multiple times."
+        ),
+        dest="channels",
+        action="append",
+        required=False,
+    )
+    env_build.add_argument(
+        "--prefix",
+        help="path where to store the environments on the remote cluster.",
+        type=str,
+        default=".jupyterdask/envs",
+    )
+
+    exec_ = commands.add_parser(
+        "exec",
+        help=(
+            "run a Python script or a notebook with a Dask cluster on the remote "
+            "cluster, without JupyterLab. The output of the job is printed as it is "
+            "written, and the files written by the payload in its working directory "
+            "are fetched when it ends. Exit with the exit code of the payload."
+        ),
+    )
+    exec_.set_defaults(command="exec")
+    exec_.add_argument(
+        "host",
+        help="remote cluster destination as `[user@]hostname`.",
+    )
+    exec_.add_argument(
+        "payload",
+        help=(
+            "Python script or notebook (`.ipynb`) to run. In the payload, "
+            "`distributed.Client()` connects to the Dask cluster of the job."
+        ),
+    )
+    exec_.add_argument(
+        "args",
+        help="arguments of the script.",
+        nargs=argparse.REMAINDER,
+    )
+    _add_identity_file_argument(exec_)
+    _add_job_script_arguments(exec_)
+    exec_.add_argument(
+        "--workers",
+        help="number of Dask workers requested when the job starts.",
+        type=int,
+        default=1,
+    )
+    exec_.add_argument(
+        "--scheduler-job",
+        help="run the scheduler of the Dask cluster in its own job.",
+        action="store_true",
+        default=None,
+    )
+    exec_.add_argument(
+        "--output-dir",
+        help=(
+            "local path where to fetch the files written by the payload, "
+            "`<session>-run` by default."
+        ),
+        type=str,
+        required=False,
+    )
+
+    sweep = commands.add_parser(
+        "sweep",
+        help=(
+            "run a notebook once for each row of a CSV file of parameters, as a job "
+            "array on the remote cluster. The executed notebooks are saved in the "
+            "log directory. Exit with a non-zero exit code if any task has failed."
+        ),
+    )
+    sweep.set_defaults(command="sweep")
+    sweep.add_argument(
+        "host",
+        help="remote cluster destination as `[user@]hostname`.",
+        nargs="?",
+    )
+    sweep.add_argument(
+        "notebook",
+        help=(
+            "notebook (`.ipynb`) to run. The parameters are assigned in a cell "
+            "inserted after the cell tagged `parameters`, or at the top."
+        ),
+        nargs="?",
+    )
+    sweep.add_argument(
+        "--params",
+        help=(
+            "CSV file with the names of the parameters as header, and one set of "
+            "parameters per row. Values are read as Python literals, or as strings."
+        ),
+        type=str,
+        required=False,
+    )
+    sweep.add_argument(
+        "--retry",
+        help=(
+            "run again the tasks that have failed in the given sweep session "
+            "(`jupyter-<timestamp>`), in place of a new sweep."
+        ),
+        metavar="SESSION",
+        type=str,
+        required=False,
+    )
+    sweep.add_argument(
+        "--max-concurrent",
+        help="maximum number of tasks running at the same time.",
+        type=int,
+        required=False,
+    )
+    _add_identity_file_argument(sweep)
+    _add_job_script_arguments(sweep)
+    sweep.add_argument(
+        "--workers",
+        help="number of Dask workers requested by each task when it starts.",
+        type=int,
+        default=0,
+    )
+
+    gateway = commands.add_parser(
+        "gateway",
+        help=(
+            "start a long-running job serving Dask clusters to the members of a team, "
+            "who connect to it with `jupyterdask <host> --gateway <file>`. The "
+            "clusters are created from the cluster configuration of the host, with "
+            "limits per user, and closed when idle. Stop it with `jupyterdask stop`."
+        ),
+    )
+    gateway.set_defaults(command="gateway")
+    gateway.add_argument(
+        "host",
+        help="remote cluster destination as `[user@]hostname`.",
+    )
+    _add_identity_file_argument(gateway)
+    _add_job_script_arguments(gateway)
+    gateway.add_argument(
+        "--gateway-file",
+        help=(
+            "path on the remote cluster where the gateway publishes its address and "
+            "token, readable by the group. Use a directory shared with the team, "
+            "`<log-dir>/gateway.json` by default."
+        ),
+        type=str,
+        required=False,
+    )
+    gateway.add_argument(
+        "--max-clusters",
+        help="maximum number of Dask clusters of each user.",
+        type=int,
+        default=2,
+    )
+    gateway.add_argument(
+        "--max-workers",
+        help="maximum number of Dask workers of each user, over all their clusters.",
+        type=int,
+        default=16,
+    )
+    gateway.add_argument(
+        "--idle-timeout",
+        help="time (in seconds) after which a Dask cluster without tasks is closed.",
+        type=int,
+        default=1800,
+    )
+    gateway.add_argument(
+        "--timeout",
+        help="time (in seconds) waited for the gateway to start, once the job runs.",
+        type=int,
+        default=120,
+    )
+
+    stop = commands.add_parser(
+        "stop",
+        help=(
+            "cancel all the jobs (Jupyter and Dask workers) of a session on the remote "
+            "cluster."
+        ),
+    )
+    stop.set_defaults(command="stop")
+    stop.add_argument(
+        "session",
+        help="session identifier (`jupyter-<timestamp>`), the most recent by default.",
+        nargs="?",
+    )
+
+    report = commands.add_parser(
+        "report",
+        help=(
+            "report the resource efficiency of the jobs of a session and recommend "
+            "changes to the cluster configuration."
+        ),
+    )
+    report.set_defaults(command="report")
+    report.add_argument(
+        "session",
+        help="session identifier (`jupyter-<timestamp>`), the most recent by default.",
+        nargs="?",
+    )
+
+    reports = commands.add_parser(
+        "reports",
+        help=(
+            "fetch the Dask performance reports recorded so far in a session started "
+            "with `--performance-reports`. Reports already fetched are skipped."
+        ),
+    )
+    reports.set_defaults(command="reports")
+    reports.add_argument(
+        "session",
+        help="session identifier (`jupyter-<timestamp>`), the most recent by default.",
+        nargs="?",
+    )
+
+    status = commands.add_parser(
+        "status",
+        help=(
+            "show the state of a session: JupyterLab URL, Dask clusters and usage of "
+            "the node where Jupyter runs."
+        ),
+    )
+    status.set_defaults(command="status")
+    status.add_argument(
+        "session",
+        help="session identifier (`jupyter-<timestamp>`), the most recent by default.",
+        nargs="?",
+    )
+    status.add_argument(
+        "--json",
+        help="print the status as a JSON document.",
+        dest="as_json",
+        action="store_true",
+        default=False,
+    )
+
+    sync = commands.add_parser(
+        "sync",
+        help=(
+            "copy a file or a directory to or from the remote cluster over multiple "
+            "SSH channels. Large files are sent in chunks, which are skipped if "
+            "already up to date, so that interrupted transfers can be resumed."
+        ),
+    )
+    sync.set_defaults(command="sync")
+    sync.add_argument(
+        "source",
+        help="local path, or remote path as `[user@]hostname:path`.",
+    )
+    sync.add_argument(
+        "destination",
+        help=(
+            "path of the copy, either local or remote as `[user@]hostname:path`. "
+            "One of source and destination must be remote."
+        ),
+    )
+    _add_identity_file_argument(sync)
+    sync.add_argument(
+        "--streams",
+        help="number of concurrent SSH channels.",
+        type=int,
+        default=4,
+    )
+    sync.add_argument(
+        "--chunk-size",
+        help=(
+            "size (in MiB) of the chunks of large files. Smaller files are packed "
+            "together in tar streams."
+        ),
+        type=int,
+        default=64,
+    )
+    sync.add_argument(
+        "--compress",
+        help="compress the data sent over the SSH connection.",
+        action="store_true",
+        default=False,
+    )
+    return parser
+
+
+def _add_identity_file_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--identity_file",
+        "-i",
+        help="path to the private key used for authentication on the remote cluster.",
+        type=str,
+        required=False,
+    )
+
+
+def _add_job_script_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "--template",
         help=(
@@ -64,25 +535,41 @@ def parse_args() -> dict[str, Any]:
     )
 
     parser.add_argument(
-        "--log-dir",
-        help="path where to save job scripts and log files on the remote cluster.",
+        "--env-file",
+        help=(
+            "build the given Conda environment file as a container on the remote "
+            "cluster (or reuse a previous build of the same environment) and use it "
+            "in place of `--python` and `--image`. See `jupyterdask env build`."
+        ),
         type=str,
-        default=".jupyterdask",
+        required=False,
     )
     parser.add_argument(
-        "--verbose",
-        help="toggle verbose local output.",
-        action="store_true",
-        default=False,
+        "--env-builder",
+        help="tool used to build `--env-file`, see `jupyterdask env build`.",
+        choices=("tykky", "apptainer"),
+        default="tykky",
     )
     parser.add_argument(
-        "--run",
-        help="run Jupyter on the remote cluster and connect to the interface.",
-        action="store_true",
-        default=False,
+        "--env-channel",
+        help=(
+            "Conda channel overriding the ones of `--env-file`, see `jupyterdask env "
+            "build`. Can be given multiple times."
+        ),
+        dest="env_channels",
+        action="append",
+        required=False,
     )
     parser.add_argument(
-        "-v", "--version", action="version", version="%(prog)s " + __version__
+        "--env-prefix",
+        help="path where to store the environments on the remote cluster.",
+        type=str,
+        default=".jupyterdask/envs",
+    )
+
+    parser.add_argument(
+        "--log-dir",
+        help="path where to save job scripts and log files on the remote cluster.",
+        type=str,
+        default=".jupyterdask",
     )
-    args = parser.parse_args()
-    return vars(args)
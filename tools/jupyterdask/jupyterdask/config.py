@@ -1,7 +1,5 @@
 from dataclasses import dataclass
 
-import fabric
-
 
 @dataclass
 class ClusterConfig:
@@ -16,8 +14,22 @@ class ClusterConfig:
     worker_walltime: str
     worker_partition: str
     worker_local_directory: str
-    mem_per_cpu: str|None = None
-    account: str|None = None
+    mem_per_cpu: str | None = None
+    account: str | None = None
+    initial_workers: int = 0
+    worker_lifetime_margin: str | None = "00:05:00"
+    worker_numa_binding: bool = False
+    worker_blas_threads: int = 1
+    interface: str | None = None
+    protocol: str | None = None
+    scheduler_job: bool = False
+    scheduler_cores: int = 2
+    scheduler_memory: str = "8GiB"
+    scheduler_partition: str | None = None
+    stage_directory: str | None = None
+    stage_cache_size: str = "50GiB"
+    checkpoint_directory: str | None = None
+    checkpoint_cache_size: str = "50GiB"
 
 
 DEFAULT_CONFIGS = {
@@ -72,7 +84,57 @@ def get_config(host: str) -> ClusterConfig:
     raise ValueError(f"Cannot find configuration for the host: {host}")
 
 
+def get_worker_lifetime(config: ClusterConfig) -> dict[str, str] | None:
+    """Derive the lifetime of the Dask workers from the walltime of their jobs.
+
+    Workers retire gracefully, handing their data over to the other workers, at
+    least `worker_lifetime_margin` before SLURM kills their jobs. Retirement is
+    staggered by 5% of the walltime, so that under adaptive scaling workers are
+    replaced one at a time.
+
+    :param config: remote cluster configuration
+    :return: worker lifetime and lifetime stagger, or None if the lifetime margin is
+        not set
+    """
+    if config.worker_lifetime_margin is None:
+        return None
+    walltime = parse_walltime(config.worker_walltime)
+    margin = parse_walltime(config.worker_lifetime_margin)
+    stagger = walltime // 20
+    lifetime = walltime - margin - stagger
+    if lifetime <= 0:
+        raise ValueError(
+            f"Worker walltime {config.worker_walltime} is too short for a lifetime "
+            f"margin of {config.worker_lifetime_margin}"
+        )
+    return {
+        "worker_lifetime": f"{lifetime}s",
+        "worker_lifetime_stagger": f"{stagger}s",
+    }
+
+
+def parse_walltime(walltime: str) -> int:
+    """Convert a SLURM time specification to seconds.
+
+    :param walltime: time as "minutes", "minutes:seconds", "hours:minutes:seconds",
+        "days-hours", "days-hours:minutes" or "days-hours:minutes:seconds"
+    :return: number of seconds
+    """
+    days, _, time = walltime.rpartition("-")
+    parts = [int(p) for p in time.split(":")]
+    if days:
+        # With days, the fields are hours[:minutes[:seconds]]
+        parts = parts + [0] * (3 - len(parts))
+    elif len(parts) < 3:
+        # Without days, the fields are minutes[:seconds]
+        parts = [0] + parts + [0] * (2 - len(parts))
+    hours, minutes, seconds = parts
+    return ((int(days or 0) * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
 def _get_host(host: str) -> str:
     """Resolve host, even if it is defined via the SSH agent."""
+    import fabric
+
     with fabric.Connection(host, forward_agent=True) as c:
         return c.host
@@ -0,0 +1,9 @@
+def get_connect_kwargs(identity_file: str | None) -> dict[str, str] | None:
+    """Get the arguments of a connection to authenticate with a private key.
+
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :return: the `connect_kwargs` of the fabric connection, None to rely on the SSH
+        configuration only
+    """
+    return {"key_filename": identity_file} if identity_file is not None else None
@@ -0,0 +1,188 @@
+import hashlib
+import io
+import json
+import subprocess
+
+import yaml
+from fabric import Connection
+
+from .connection import get_connect_kwargs
+
+BUILDERS = ("tykky", "apptainer")
+
+APPTAINER_DEFINITION = """\
+Bootstrap: docker
+From: {base_image}
+
+%files
+    {lock_file} /opt/environment.yaml
+
+%post
+    micromamba install --yes --name base --file /opt/environment.yaml
+    micromamba clean --all --yes
+"""
+
+APPTAINER_PYTHON = "/opt/conda/bin/python"
+
+TYKKY_COMPLETE = ".jupyterdask-complete"
+
+
+def lock_environment(
+    env_file: str,
+    channels: list[str] | None = None,
+    platform: str = "linux-64",
+    solver: str = "micromamba",
+) -> str:
+    """Solve a Conda environment file and pin all packages to exact builds.
+
+    The environment is solved locally with a dry run, so nothing is installed. Pip
+    dependencies are copied as they appear in the environment file. Local channels
+    (e.g. a mirror as `file:///path/to/mirror`) are only used to solve the
+    environment: the lock refers to the other channels given, or to the channels of
+    the environment file, as the remote cluster cannot reach local paths.
+
+    :param env_file: path to the Conda environment file
+    :param channels: channels overriding the ones in the environment file
+    :param platform: target platform of the remote cluster
+    :param solver: (micro)mamba executable used to solve the environment
+    :return: the text of the locked environment file
+    """
+    with open(env_file) as f:
+        env = yaml.safe_load(f)
+    cmd = [
+        solver,
+        "create",
+        "--dry-run",
+        "--json",
+        "--yes",
+        "--name",
+        "jupyterdask-lock",
+        "--platform",
+        platform,
+        "--file",
+        env_file,
+    ]
+    if channels:
+        cmd.append("--override-channels")
+        for channel in channels:
+            cmd.extend(["--channel", channel])
+    res = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    packages = json.loads(res.stdout)["actions"]["LINK"]
+
+    pinned = sorted(
+        f"{pkg['name']}={pkg['version']}={pkg['build_string']}" for pkg in packages
+    )
+    pip = [dep for dep in env.get("dependencies", []) if isinstance(dep, dict)]
+    locked = {
+        "name": env.get("name", "jupyterdask"),
+        "channels": _get_remote_channels(channels, env.get("channels", [])),
+        "dependencies": pinned + pip,
+    }
+    return yaml.safe_dump(locked, sort_keys=False)
+
+
+def _get_remote_channels(
+    channels: list[str] | None, env_channels: list[str]
+) -> list[str]:
+    remote = [c for c in channels or [] if not _is_local_channel(c)] or env_channels
+    local = [c for c in remote if _is_local_channel(c)]
+    if local:
+        raise ValueError(
+            f"Local channels cannot be used on the remote cluster: {', '.join(local)}"
+        )
+    return remote
+
+
+def _is_local_channel(channel: str) -> bool:
+    return channel.startswith("file:") or channel.startswith("/")
+
+
+def get_lock_hash(lock: str) -> str:
+    """Compute the key identifying the artifact built from a locked environment.
+
+    :param lock: the text of the locked environment file
+    :return: short hexadecimal hash of the lock
+    """
+    return hashlib.sha256(lock.encode()).hexdigest()[:16]
+
+
+def build_environment(
+    host: str,
+    env_file: str,
+    identity_file: str | None = None,
+    prefix: str = ".jupyterdask/envs",
+    builder: str = "tykky",
+    channels: list[str] | None = None,
+    base_image: str = "docker://mambaorg/micromamba:latest",
+) -> dict[str, str | None]:
+    """Lock an environment file and build it as a single-file artifact on the host.
+
+    The artifact is keyed by the hash of the lock: if an artifact with the same hash
+    already exists on the remote cluster, the build is skipped.
+
+    :param host: remote cluster destination
+    :param env_file: path to the Conda environment file
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param prefix: path where to store the environment artifacts on the remote cluster
+    :param builder: either "tykky" (HPC container wrapper) or "apptainer"
+    :param channels: channels overriding the ones in the environment file
+    :param base_image: base image of the Apptainer build
+    :return: the `python` executable and the `image` to pass to `setup_job_script`
+    """
+    if builder not in BUILDERS:
+        raise ValueError(f"Unknown environment builder: {builder}")
+    lock = lock_environment(env_file, channels=channels)
+    lock_hash = get_lock_hash(lock)
+    connect_kwargs = get_connect_kwargs(identity_file)
+    with Connection(
+        host=host, connect_kwargs=connect_kwargs, forward_agent=True
+    ) as conn:
+        conn.run(f"mkdir -p '{prefix}'", hide=True)
+        lock_file = f"{prefix}/{lock_hash}.yaml"
+        if builder == "tykky":
+            artifact = f"{prefix}/{lock_hash}"
+            env = {"python": f"{artifact}/bin/python", "image": None}
+            target = f"{artifact}/{TYKKY_COMPLETE}"
+        else:
+            artifact = f"{prefix}/{lock_hash}.sif"
+            env = {"python": APPTAINER_PYTHON, "image": artifact}
+            target = artifact
+        if _artifact_exists(conn, target):
+            return env
+        conn.put(io.StringIO(lock), lock_file)
+        if builder == "tykky":
+            _build_tykky(conn, lock_file, artifact)
+        else:
+            _build_apptainer(conn, lock_file, artifact, base_image=base_image)
+    return env
+
+
+def _artifact_exists(connection: Connection, path: str) -> bool:
+    res = connection.run(f"test -e '{path}'", warn=True, hide=True)
+    return res.exited == 0
+
+
+def _build_tykky(connection: Connection, lock_file: str, artifact: str) -> None:
+    # The wrappers refer to the installation prefix, so the build cannot be moved
+    # in place afterwards: mark completion instead, so that an interrupted build is
+    # never reused
+    connection.run(
+        f"rm -rf '{artifact}' && mkdir -p '{artifact}' && "
+        f"conda-containerize new --mamba --prefix '{artifact}' '{lock_file}' && "
+        f"touch '{artifact}/{TYKKY_COMPLETE}'"
+    )
+
+
+def _build_apptainer(
+    connection: Connection, lock_file: str, artifact: str, base_image: str
+) -> None:
+    definition = APPTAINER_DEFINITION.format(
+        base_image=base_image.removeprefix("docker://"), lock_file=lock_file
+    )
+    definition_file = f"{artifact}.def"
+    connection.put(io.StringIO(definition), definition_file)
+    connection.run(
+        f"apptainer build --fakeroot '{artifact}.tmp' '{definition_file}' && "
+        f"mv '{artifact}.tmp' '{artifact}'"
+    )
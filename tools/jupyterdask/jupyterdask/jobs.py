@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from fabric import Connection
+
+logger = logging.getLogger(__file__)
+
+JOBS_CACHE_DIR = pathlib.Path.home() / ".jupyterdask" / "jobs"
+
+# Minimum time (in seconds) between two queries of the SLURM controller
+JOB_STATE_INTERVAL = 10
+# Maximum number of state transitions kept in memory
+HISTORY_LENGTH = 1000
+
+SQUEUE_FIELDS = ("job_id", "name", "state", "node")
+
+
+@dataclass
+class JobTransition:
+    """Change of the state of a job, as observed in the queue."""
+
+    time: float
+    job_id: str
+    name: str
+    state: str | None
+
+
+class JobMonitor:
+    """Track the state of all the jobs of the user with a single batched query.
+
+    The queue is listed with one `squeue --user $USER` call per interval, whatever the
+    number of jobs being waited for. The listing is also cached on the local disk, so
+    that other processes (e.g. sessions running in the background) monitoring the same
+    remote cluster reuse it instead of querying the SLURM controller again.
+
+    Jobs that are no longer listed have left the queue, and their state is None.
+    """
+
+    def __init__(self, connection: Connection, interval: float = JOB_STATE_INTERVAL):
+        """Set up the monitor, the queue is listed the first time a state is needed.
+
+        :param connection: connection to the remote cluster
+        :param interval: minimum time (in seconds) between two listings of the queue
+        """
+        self.connection = connection
+        self.interval = interval
+        self.history: deque[JobTransition] = deque(maxlen=HISTORY_LENGTH)
+        self._jobs: dict[str, dict[str, str]] = {}
+        self._watched: dict[str, float] = {}
+        self._updated = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def _cache_file(self) -> pathlib.Path:
+        return JOBS_CACHE_DIR / f"{self.connection.user}@{self.connection.host}.json"
+
+    def watch(self, job_id: int | str) -> None:
+        """Start tracking a job that has just been submitted.
+
+        A job is only considered to have left the queue if it is missing from a
+        listing taken after it has been watched.
+
+        :param job_id: SLURM job ID
+        """
+        with self._lock:
+            self._watched.setdefault(str(job_id), time.time())
+
+    def get_job(self, job_id: int | str, force: bool = False) -> dict[str, str] | None:
+        """Get the current state of a job in the queue.
+
+        :param job_id: SLURM job ID
+        :param force: list the queue again, even if the last listing is recent
+        :return: ID, name, state and node list of the job, or None if the job is not
+            in the queue
+        """
+        job_id = str(job_id)
+        with self._lock:
+            self._refresh(force=force)
+            if self._updated < self._watched.get(job_id, 0):
+                self._refresh(force=True)
+            return self._jobs.get(job_id)
+
+    def get_state(self, job_id: int | str) -> str | None:
+        """Get the current state of a job in the queue.
+
+        :param job_id: SLURM job ID
+        :return: state of the job (e.g. "PENDING", "RUNNING"), or None if the job is
+            not in the queue
+        """
+        job = self.get_job(job_id)
+        return job["state"] if job is not None else None
+
+    def is_active(self, job_id: int | str) -> bool:
+        """Check whether a job is still in the queue.
+
+        :param job_id: SLURM job ID
+        :return: True if the job is pending, running, or in any other queue state
+        """
+        return self.get_job(job_id) is not None
+
+    def get_array_states(self, array_id: int | str) -> dict[int, str]:
+        """Get the current state of the tasks of a job array in the queue.
+
+        :param array_id: SLURM job ID of the array
+        :return: state of each task index in the queue, tasks that have left the queue
+            are not included
+        """
+        array_id = str(array_id)
+        with self._lock:
+            self._refresh()
+            if self._updated < self._watched.get(array_id, 0):
+                self._refresh(force=True)
+            jobs = list(self._jobs.items())
+        states = {}
+        for job_id, job in jobs:
+            base, _, tasks = job_id.partition("_")
+            if base == array_id and tasks:
+                for index in _parse_array_tasks(tasks):
+                    states[index] = job["state"]
+        return states
+
+    def get_transitions(self, job_id: int | str) -> list[JobTransition]:
+        """Get the observed state transitions of a job, from the oldest.
+
+        :param job_id: SLURM job ID
+        :return: state transitions
+        """
+        with self._lock:
+            return [t for t in self.history if t.job_id == str(job_id)]
+
+    def get_queue_wait(self, job_id: int | str) -> float | None:
+        """Measure the time a job has spent from PENDING to RUNNING.
+
+        The accuracy is limited by the interval between two listings of the queue.
+
+        :param job_id: SLURM job ID
+        :return: time (in seconds), or None if both states have not been observed
+        """
+        # The job may have been running before the oldest transition kept, or have
+        # been requeued, so the first RUNNING state after PENDING is looked for
+        pending = None
+        for transition in self.get_transitions(job_id):
+            if transition.state == "PENDING" and pending is None:
+                pending = transition.time
+            elif transition.state == "RUNNING" and pending is not None:
+                return transition.time - pending
+        return None
+
+    def _refresh(self, force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self._updated < self.interval:
+            return
+        listing = None if force else self._read_cache(now)
+        if listing is None:
+            jobs = self._list_jobs()
+            if jobs is None:
+                # Keep the previous states, the queue is listed again next time
+                return
+            listing = {"time": now, "jobs": jobs}
+            self._write_cache(listing)
+        self._update(listing["time"], listing["jobs"])
+
+    def _list_jobs(self) -> dict[str, dict[str, str]] | None:
+        res = self.connection.run(
+            "squeue --user $USER --noheader --format '%i|%j|%T|%N'",
+            warn=True,
+            hide=True,
+        )
+        if res.exited != 0:
+            logger.info(f"Failed to list the jobs in the queue: {res.stderr}")
+            return None
+        jobs = {}
+        for line in res.stdout.splitlines():
+            job = dict(zip(SQUEUE_FIELDS, line.split("|", 3), strict=True))
+            jobs[job["job_id"]] = job
+        return jobs
+
+    def _read_cache(self, now: float) -> dict | None:
+        try:
+            with open(self._cache_file) as f:
+                listing = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - listing["time"] >= self.interval or listing["time"] <= self._updated:
+            return None
+        return listing
+
+    def _write_cache(self, listing: dict) -> None:
+        # Replace the file atomically, as other processes may be reading it
+        self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self._cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(listing, f)
+        os.replace(tmp_file, self._cache_file)
+
+    def _update(self, updated: float, jobs: dict[str, dict[str, str]]) -> None:
+        for job_id, job in jobs.items():
+            previous = self._jobs.get(job_id)
+            if previous is None or previous["state"] != job["state"]:
+                self._record(updated, job_id, job["name"], job["state"])
+        for job_id in self._jobs.keys() - jobs.keys():
+            self._record(updated, job_id, self._jobs[job_id]["name"], None)
+        self._jobs = jobs
+        self._updated = updated
+
+    def _record(
+        self, updated: float, job_id: str, name: str, state: str | None
+    ) -> None:
+        self.history.append(
+            JobTransition(time=updated, job_id=job_id, name=name, state=state)
+        )
+
+
+def _parse_array_tasks(tasks: str) -> list[int]:
+    # Pending tasks are listed together, e.g. "[3-10,12%4]" (with at most 4 running)
+    tasks = tasks.strip("[]").split("%")[0]
+    indices = []
+    for part in tasks.split(","):
+        first, _, last = part.partition("-")
+        indices.extend(range(int(first), int(last or first) + 1))
+    return indices
@@ -1,6 +1,15 @@
+import ast
+import csv
+import json
+import os
+import sys
+from typing import Any
+
 from .cli import parse_args
-from .remote import submit_and_connect
-from .template import setup_job_script
+from .sessions import load_session
+
+# Modules depending on fabric, paramiko and Jinja2 are imported within the commands
+# that need them, so that the CLI starts up fast (e.g. for `--version` and `--help`)
 
 
 def run(
@@ -11,7 +20,21 @@ def run(
     template: str | None = None,
     python: str = "python",
     image: str | None = None,
+    env_file: str | None = None,
+    env_builder: str = "tykky",
+    env_channels: list[str] | None = None,
+    env_prefix: str = ".jupyterdask/envs",
     log_dir: str = ".jupyterdask",
+    initial_workers: int | None = None,
+    scheduler_job: bool | None = None,
+    gateway: str | None = None,
+    socket: bool = False,
+    stage_manifest: str | None = None,
+    headless: bool = False,
+    daemon: bool = False,
+    follow_log: bool = False,
+    metrics_port: int | None = None,
+    performance_reports: bool = False,
     verbose: bool = False,
     run: bool = False,
 ) -> None:
@@ -24,19 +47,60 @@ def run(
     :param timeout: time (in seconds) waited for the remote Jupyter server to start
     :param template: use the given custom file as template for the job script
     :param python: Python executable on the remote cluster
+    :param image: run Python from the given image using Apptainer
+    :param env_file: build the given Conda environment file on the remote cluster and
+        use it in place of `python` and `image`, with `env_builder`, `env_channels`
+        and `env_prefix` as in `env_build`
     :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param initial_workers: number of Dask workers requested when the job starts
+    :param scheduler_job: run the Dask schedulers in their own jobs
+    :param gateway: create the Dask clusters via the gateway that has published its
+        address in the given file on the remote cluster
+    :param socket: let Jupyter listen on a Unix socket, forwarded via SSH streamlocal
+    :param stage_manifest: path to a file listing the URLs of input files to stage
+        into node-local storage when the jobs start
+    :param headless: do not open the web browser
+    :param daemon: continue in the background once Jupyter is reachable
+    :param follow_log: print the log of the Jupyter job as it is written
+    :param metrics_port: local port where to expose the metrics of the Dask clusters
+        in the Prometheus format
+    :param performance_reports: record a Dask performance report for each computation
+        and fetch the reports when the session ends
     :param run: run Jupyter on the remote cluster and connect to the interface
     """
+    from .template import setup_job_script
+
+    python, image = _prepare_environment(
+        host,
+        identity_file,
+        python,
+        image,
+        env_file,
+        env_builder,
+        env_channels,
+        env_prefix,
+    )
+    if stage_manifest is not None:
+        with open(stage_manifest) as f:
+            stage_manifest = [line.strip() for line in f if line.strip()]
     job_script = setup_job_script(
         host,
         template=template,
         python=python,
         image=image,
         log_dir=log_dir,
+        initial_workers=initial_workers,
+        scheduler_job=scheduler_job,
+        gateway=gateway,
+        socket=socket,
+        stage_manifest=stage_manifest,
+        performance_reports=performance_reports,
     )
     if verbose:
         print(job_script)
     if run:
+        from .remote import submit_and_connect
+
         submit_and_connect(
             job_script,
             host,
@@ -44,10 +108,422 @@ def run(
             port=port,
             timeout=timeout,
             log_dir=log_dir,
+            headless=headless,
+            daemon=daemon,
+            follow_log=follow_log,
+            metrics_port=metrics_port,
+            performance_reports=performance_reports,
         )
 
 
+def exec_payload(
+    host: str,
+    payload: str,
+    args: list[str] | None = None,
+    identity_file: str | None = None,
+    template: str | None = None,
+    python: str = "python",
+    image: str | None = None,
+    env_file: str | None = None,
+    env_builder: str = "tykky",
+    env_channels: list[str] | None = None,
+    env_prefix: str = ".jupyterdask/envs",
+    log_dir: str = ".jupyterdask",
+    workers: int = 1,
+    scheduler_job: bool | None = None,
+    output_dir: str | None = None,
+) -> None:
+    """Run a script or a notebook with a Dask cluster on a remote cluster.
+
+    The process exits with the exit code of the payload.
+
+    :param host: remote cluster destination
+    :param payload: path to the Python script or notebook
+    :param args: arguments of the script
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param template: use the given custom file as template for the job script
+    :param python: Python executable on the remote cluster
+    :param image: run Python from the given image using Apptainer
+    :param env_file: build the given Conda environment file on the remote cluster and
+        use it in place of `python` and `image`, with `env_builder`, `env_channels`
+        and `env_prefix` as in `env_build`
+    :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param workers: number of Dask workers requested when the job starts
+    :param scheduler_job: run the Dask scheduler in its own job
+    :param output_dir: local path where to fetch the files written by the payload
+    """
+    from .remote import submit_and_run
+    from .template import setup_job_script
+
+    python, image = _prepare_environment(
+        host,
+        identity_file,
+        python,
+        image,
+        env_file,
+        env_builder,
+        env_channels,
+        env_prefix,
+    )
+    job_script = setup_job_script(
+        host,
+        template=template,
+        python=python,
+        image=image,
+        log_dir=log_dir,
+        initial_workers=workers,
+        scheduler_job=scheduler_job,
+        payload=[os.path.basename(payload), *(args or [])],
+    )
+    exit_code = submit_and_run(
+        job_script,
+        host,
+        payload,
+        identity_file=identity_file,
+        log_dir=log_dir,
+        output_dir=output_dir,
+    )
+    sys.exit(exit_code)
+
+
+def sweep(
+    host: str | None = None,
+    notebook: str | None = None,
+    params: str | None = None,
+    retry: str | None = None,
+    max_concurrent: int | None = None,
+    identity_file: str | None = None,
+    template: str | None = None,
+    python: str = "python",
+    image: str | None = None,
+    env_file: str | None = None,
+    env_builder: str = "tykky",
+    env_channels: list[str] | None = None,
+    env_prefix: str = ".jupyterdask/envs",
+    log_dir: str = ".jupyterdask",
+    workers: int = 0,
+) -> None:
+    """Run a notebook for each set of parameters, as a job array on a remote cluster.
+
+    The process exits with a non-zero exit code if any task has failed.
+
+    :param host: remote cluster destination
+    :param notebook: path to the notebook
+    :param params: path to a CSV file with one set of parameters per row
+    :param retry: run again the failed tasks of the given sweep session, in place of a
+        new sweep
+    :param max_concurrent: maximum number of tasks running at the same time
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param template: use the given custom file as template for the job script
+    :param python: Python executable on the remote cluster
+    :param image: run Python from the given image using Apptainer
+    :param env_file: build the given Conda environment file on the remote cluster and
+        use it in place of `python` and `image`, with `env_builder`, `env_channels`
+        and `env_prefix` as in `env_build`
+    :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param workers: number of Dask workers requested by each task when it starts
+    """
+    from .remote import SWEEP_PARAMETERS, retry_sweep, submit_sweep
+    from .template import setup_job_script
+
+    if retry is not None:
+        failed = retry_sweep(load_session(retry), max_concurrent=max_concurrent)
+        sys.exit(1 if failed else 0)
+    if None in (host, notebook, params):
+        raise ValueError("host, notebook and params are required for a new sweep")
+    if not notebook.endswith(".ipynb"):
+        raise ValueError(f"Not a notebook: {notebook}")
+    parameters = _read_parameters(params)
+    python, image = _prepare_environment(
+        host,
+        identity_file,
+        python,
+        image,
+        env_file,
+        env_builder,
+        env_channels,
+        env_prefix,
+    )
+    job_script = setup_job_script(
+        host,
+        template=template,
+        python=python,
+        image=image,
+        log_dir=log_dir,
+        initial_workers=workers,
+        scheduler_job=False,
+        payload=[os.path.basename(notebook)],
+        parameters_file=SWEEP_PARAMETERS,
+    )
+    failed = submit_sweep(
+        job_script,
+        host,
+        notebook,
+        parameters,
+        identity_file=identity_file,
+        log_dir=log_dir,
+        max_concurrent=max_concurrent,
+    )
+    sys.exit(1 if failed else 0)
+
+
+def _read_parameters(path: str) -> list[dict[str, Any]]:
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        for name in reader.fieldnames or []:
+            if not name.isidentifier():
+                raise ValueError(f"Invalid parameter name in {path}: {name!r}")
+        parameters = [
+            {name: _parse_value(value) for name, value in row.items()} for row in reader
+        ]
+    if not parameters:
+        raise ValueError(f"No set of parameters in {path}")
+    return parameters
+
+
+def _parse_value(value: str) -> Any:
+    # Numbers, booleans, quoted strings, lists, ... and any other value as string
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def start_gateway(
+    host: str,
+    identity_file: str | None = None,
+    template: str | None = None,
+    python: str = "python",
+    image: str | None = None,
+    env_file: str | None = None,
+    env_builder: str = "tykky",
+    env_channels: list[str] | None = None,
+    env_prefix: str = ".jupyterdask/envs",
+    log_dir: str = ".jupyterdask",
+    gateway_file: str | None = None,
+    max_clusters: int = 2,
+    max_workers: int = 16,
+    idle_timeout: int | None = 1800,
+    timeout: int = 120,
+) -> None:
+    """Start the gateway of a team on a remote cluster, and leave it running.
+
+    :param host: remote cluster destination
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param template: use the given custom file as template for the job script
+    :param python: Python executable on the remote cluster
+    :param image: run Python from the given image using Apptainer
+    :param env_file: build the given Conda environment file on the remote cluster and
+        use it in place of `python` and `image`, with `env_builder`, `env_channels`
+        and `env_prefix` as in `env_build`
+    :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param gateway_file: path where the gateway publishes its address and token on the
+        remote cluster, `<log_dir>/gateway.json` by default
+    :param max_clusters: maximum number of Dask clusters of each user
+    :param max_workers: maximum number of Dask workers of each user
+    :param idle_timeout: time (in seconds) after which a Dask cluster without tasks is
+        closed
+    :param timeout: time (in seconds) waited for the gateway to start, once the job is
+        running
+    """
+    from .remote import submit_gateway
+    from .template import setup_job_script
+
+    python, image = _prepare_environment(
+        host,
+        identity_file,
+        python,
+        image,
+        env_file,
+        env_builder,
+        env_channels,
+        env_prefix,
+    )
+    gateway_file = gateway_file or f"{log_dir}/gateway.json"
+    args = [
+        "--gateway-file",
+        gateway_file,
+        "--max-clusters",
+        str(max_clusters),
+        "--max-workers",
+        str(max_workers),
+    ]
+    if idle_timeout:
+        args += ["--idle-timeout", str(idle_timeout)]
+    job_script = setup_job_script(
+        host,
+        template=template,
+        python=python,
+        image=image,
+        log_dir=log_dir,
+        initial_workers=0,
+        scheduler_job=False,
+        gateway_service=args,
+    )
+    submit_gateway(
+        job_script,
+        host,
+        gateway_file,
+        identity_file=identity_file,
+        log_dir=log_dir,
+        timeout=timeout,
+    )
+
+
+def _prepare_environment(
+    host: str,
+    identity_file: str | None,
+    python: str,
+    image: str | None,
+    env_file: str | None,
+    env_builder: str,
+    env_channels: list[str] | None,
+    env_prefix: str,
+) -> tuple[str, str | None]:
+    # Python executable and image of the jobs, from the environment built (or reused)
+    # for `env_file` if given
+    if env_file is None:
+        return python, image
+    from .env import build_environment
+
+    env = build_environment(
+        host,
+        env_file,
+        identity_file=identity_file,
+        prefix=env_prefix,
+        builder=env_builder,
+        channels=env_channels,
+    )
+    return env["python"], env["image"]
+
+
+def env_build(
+    host: str,
+    identity_file: str | None = None,
+    env_file: str = "config/conda/environment.yaml",
+    builder: str = "tykky",
+    channels: list[str] | None = None,
+    prefix: str = ".jupyterdask/envs",
+) -> None:
+    """Build a locked Conda environment as a single container on a remote cluster.
+
+    :param host: remote cluster destination
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param env_file: path to the Conda environment file
+    :param builder: either "tykky" (HPC container wrapper) or "apptainer"
+    :param channels: channels overriding the ones in the environment file
+    :param prefix: path where to store the environments on the remote cluster
+    """
+    from .env import build_environment
+
+    env = build_environment(
+        host,
+        env_file,
+        identity_file=identity_file,
+        prefix=prefix,
+        builder=builder,
+        channels=channels,
+    )
+    print(f"Python: {env['python']}")
+    if env["image"] is not None:
+        print(f"Image: {env['image']}")
+
+
+def stop(session: str | None = None) -> None:
+    """Cancel all the jobs of a session on the remote cluster.
+
+    :param session: session identifier, the most recent session if not given
+    """
+    from .remote import stop_session
+
+    stop_session(load_session(session))
+
+
+def report(session: str | None = None) -> None:
+    """Report the resource efficiency of the jobs of a session.
+
+    :param session: session identifier, the most recent session if not given
+    """
+    from .report import create_report, print_report
+
+    print_report(create_report(load_session(session)))
+
+
+def reports(session: str | None = None) -> None:
+    """Fetch the Dask performance reports recorded in a session.
+
+    :param session: session identifier, the most recent session if not given
+    """
+    from .remote import fetch_performance_reports
+
+    fetch_performance_reports(load_session(session))
+
+
+def status(session: str | None = None, as_json: bool = False) -> None:
+    """Show the status of a session.
+
+    :param session: session identifier, the most recent session if not given
+    :param as_json: print the status as a JSON document
+    """
+    from .remote import get_session_status, print_session_status
+
+    session_status = get_session_status(load_session(session))
+    if as_json:
+        print(json.dumps(session_status, indent=2))
+    else:
+        print_session_status(session_status)
+
+
+def sync(
+    source: str,
+    destination: str,
+    identity_file: str | None = None,
+    streams: int = 4,
+    chunk_size: int = 64,
+    compress: bool = False,
+) -> None:
+    """Copy a file or a directory to or from a remote cluster.
+
+    :param source: local path or remote path as `[user@]hostname:path`
+    :param destination: local path or remote path as `[user@]hostname:path`
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param streams: number of concurrent SSH channels
+    :param chunk_size: size (in MiB) of the chunks of large files
+    :param compress: compress the data sent over the SSH connection
+    """
+    from . import sync as sync_
+
+    sync_.sync(
+        source,
+        destination,
+        identity_file=identity_file,
+        streams=streams,
+        chunk_size=chunk_size * 2**20,
+        compress=compress,
+    )
+
+
+COMMANDS = {
+    "run": run,
+    "exec": exec_payload,
+    "sweep": sweep,
+    "gateway": start_gateway,
+    "env build": env_build,
+    "stop": stop,
+    "report": report,
+    "reports": reports,
+    "status": status,
+    "sync": sync,
+}
+
+
 def main() -> None:
     """Run the CLI."""
     args = parse_args()
-    run(**args)
+    command = args.pop("command")
+    COMMANDS[command](**args)
@@ -0,0 +1,284 @@
+import dataclasses
+import json
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import urlparse
+
+from .config import ClusterConfig
+from .sessions import SESSIONS_DIR, SessionRecord
+
+logger = logging.getLogger(__file__)
+
+METRICS_DB = SESSIONS_DIR.parent / "metrics.sqlite"
+
+REQUEST_TIMEOUT = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    host TEXT,
+    start_time REAL,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    session_id TEXT,
+    cluster TEXT,
+    time REAL,
+    metric TEXT,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS samples_index ON samples (session_id, metric, time);
+"""
+
+# Cluster-wide task and worker counts from the scheduler, see `/json/counts.json`
+COUNTS = {
+    "workers": "workers",
+    "desired_workers": "desired_workers",
+    "threads": "cores",
+    "saturated_workers": "saturated",
+    "idle_workers": "idle",
+    "tasks": "tasks",
+    "tasks_processing": "processing",
+    "tasks_waiting": "waiting",
+    "tasks_in_memory": "memory",
+    "tasks_released": "released",
+    "tasks_erred": "erred",
+    "managed_bytes": "bytes",
+}
+
+
+class MetricsStore:
+    """Local time-series store of the metrics of the Dask clusters of all sessions.
+
+    Samples are stored in a SQLite database as (session, cluster, time, metric,
+    value) rows, together with the remote cluster configuration of each session, so
+    that sessions can be compared across runs and configuration changes.
+    """
+
+    def __init__(self, path: str | pathlib.Path = METRICS_DB):
+        """Open the store, creating the database if needed.
+
+        :param path: path to the SQLite database
+        """
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.latest: dict[tuple[str, str], dict[str, float]] = {}
+        self._lock = threading.Lock()
+        with closing(self._connect()) as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add_session(self, session: SessionRecord, config: ClusterConfig) -> None:
+        """Record a session with its remote cluster configuration.
+
+        :param session: session record
+        :param config: remote cluster configuration of the session
+        """
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                (
+                    session.session_id,
+                    session.host,
+                    time.time(),
+                    json.dumps(dataclasses.asdict(config)),
+                ),
+            )
+
+    def add_sample(
+        self, session_id: str, cluster: str, values: dict[str, float]
+    ) -> None:
+        """Store the values of the metrics of a cluster at the current time.
+
+        :param session_id: session identifier
+        :param cluster: name of the Dask cluster
+        :param values: value of each metric
+        """
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            db.executemany(
+                "INSERT INTO samples VALUES (?, ?, ?, ?, ?)",
+                [(session_id, cluster, now, k, v) for k, v in values.items()],
+            )
+        with self._lock:
+            self.latest[(session_id, cluster)] = values
+
+    def to_prometheus(self) -> str:
+        """Format the latest samples in the Prometheus text exposition format.
+
+        :return: the metrics, one gauge per metric
+        """
+        with self._lock:
+            latest = dict(self.latest)
+        lines = []
+        metrics = sorted({metric for values in latest.values() for metric in values})
+        for metric in metrics:
+            name = f"jupyterdask_dask_{metric}"
+            lines.append(f"# TYPE {name} gauge")
+            for (session_id, cluster), values in latest.items():
+                if metric in values:
+                    labels = (
+                        f'session="{_escape_label(session_id)}",'
+                        f'cluster="{_escape_label(cluster)}"'
+                    )
+                    lines.append(f"{name}{{{labels}}} {values[metric]}")
+        return "\n".join(lines) + "\n"
+
+
+class SchedulerSampler:
+    """Sample the metrics of the Dask clusters of a session through the tunnel.
+
+    The clusters created via the Dask JupyterLab extension are listed by its REST
+    API, and their schedulers are reached via the Jupyter server proxy, at the path
+    of their dashboard link.
+    """
+
+    def __init__(
+        self, store: MetricsStore, session: SessionRecord, url: str, token: str | None
+    ):
+        """Set up the sampler.
+
+        :param store: store where to write the samples
+        :param session: session record
+        :param url: local URL of the Jupyter server
+        :param token: Jupyter server token
+        """
+        self.store = store
+        self.session = session
+        self.url = url.rstrip("/")
+        self.token = token
+        self._previous: dict[str, tuple[float, float]] = {}
+
+    def __call__(self) -> None:
+        """Sample the metrics of all the clusters of the session once.
+
+        Collecting metrics must never end the session: the samples that fail (e.g.
+        for a cluster that is closing, or if the store is locked) are skipped.
+        """
+        try:
+            clusters = self._get("/dask/clusters")
+        except Exception as e:
+            logger.info(f"Failed to list the Dask clusters: {e}")
+            return
+        for cluster in clusters:
+            try:
+                self._sample(cluster)
+            except Exception as e:
+                logger.warning(f"Failed to sample the metrics of a Dask cluster: {e}")
+
+    def _sample(self, cluster: dict[str, Any]) -> None:
+        path = urlparse(cluster.get("dashboard_link") or "").path
+        if not path.endswith("/status"):
+            return
+        prefix = path.removesuffix("/status")
+        counts = self._get(f"{prefix}/json/counts.json")
+        identity = self._get(f"{prefix}/json/identity.json")
+        values = self._get_values(cluster["name"], counts, identity)
+        values.update(self._get_event_loop_latency(prefix))
+        self.store.add_sample(self.session.session_id, cluster["name"], values)
+
+    def _get(self, path: str) -> Any:
+        request = urllib.request.Request(f"{self.url}{path}")
+        if self.token is not None:
+            request.add_header("Authorization", f"token {self.token}")
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.load(response)
+
+    def _get_event_loop_latency(self, prefix: str) -> dict[str, float]:
+        # Measured by the scheduler preload script, if loaded
+        try:
+            latency = self._get(f"{prefix}/json/event-loop.json")
+        except urllib.error.HTTPError:
+            return {}
+        return {
+            f"event_loop_latency_{k}": v for k, v in latency.items() if v is not None
+        }
+
+    def _get_values(
+        self, cluster: str, counts: dict[str, Any], identity: dict[str, Any]
+    ) -> dict[str, float]:
+        values = {name: counts[key] for name, key in COUNTS.items() if key in counts}
+        workers = identity.get("workers", {}).values()
+        metrics = [worker.get("metrics", {}) for worker in workers]
+        values["tasks_executing"] = sum(m.get("executing", 0) for m in metrics)
+        values["memory"] = sum(m.get("memory", 0) for m in metrics)
+        values["memory_limit"] = sum(w.get("memory_limit") or 0 for w in workers)
+        values["spilled_bytes"] = sum(_get_spilled_bytes(m) for m in metrics)
+        values["cpu"] = sum(m.get("cpu", 0) for m in metrics)
+        if values.get("threads"):
+            values["saturation"] = values["tasks_executing"] / values["threads"]
+        # Tasks that have completed are either in memory, released or erred (until
+        # they are forgotten), so the throughput is approximate
+        done = sum(counts.get(key, 0) for key in ("memory", "released", "erred"))
+        now = time.time()
+        if cluster in self._previous:
+            previous_time, previous_done = self._previous[cluster]
+            rate = max(0, done - previous_done) / (now - previous_time)
+            values["task_throughput"] = rate
+        self._previous[cluster] = (now, done)
+        return values
+
+
+def _get_spilled_bytes(metrics: dict[str, Any]) -> float:
+    # The name of the metric depends on the version of distributed
+    spilled = metrics.get("spilled_bytes") or metrics.get("spilled_nbytes") or {}
+    return spilled.get("disk", 0)
+
+
+def _escape_label(value: str) -> str:
+    # Backslashes, double quotes and line feeds are escaped in label values, see the
+    # Prometheus text exposition format
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsExporter:
+    """Expose the latest samples of a store on a local Prometheus endpoint."""
+
+    def __init__(self, store: MetricsStore, port: int):
+        """Set up the endpoint, which is not started yet.
+
+        :param store: store of the samples
+        :param port: local port of the endpoint
+        """
+        self.store = store
+        self.port = port
+        self._server = None
+
+    def start(self) -> None:
+        """Start serving `/metrics` in a background thread."""
+        store = self.store
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = store.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format % args)
+
+        self._server = ThreadingHTTPServer(("localhost", self.port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
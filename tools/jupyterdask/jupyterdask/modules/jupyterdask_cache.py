@@ -0,0 +1,167 @@
+"""Caches of files on the remote cluster, bounded in size and shared by the jobs.
+
+This module is uploaded to the remote cluster and used both by the staging script
+(see `scripts/stage.py`) and by the checkpoints of the notebooks (see
+`jupyterdask_checkpoint`). Each cache directory has an index recording the size, the
+last use and the jobs using each entry (a file or a directory). When the cache
+exceeds its size, the least recently used entries are evicted first, except the ones
+used by jobs that are still running.
+"""
+
+import contextlib
+import fcntl
+import getpass
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+
+SIZE_UNITS = {
+    "": 1,
+    "B": 1,
+    "KB": 10**3,
+    "MB": 10**6,
+    "GB": 10**9,
+    "TB": 10**12,
+    "KIB": 2**10,
+    "MIB": 2**20,
+    "GIB": 2**30,
+    "TIB": 2**40,
+}
+
+
+def parse_size(size: str) -> int:
+    """Convert a size (e.g. "50GiB", "500MB") to bytes.
+
+    :param size: size with an optional unit
+    :return: number of bytes
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", size)
+    if match is None or match.group(2).upper() not in SIZE_UNITS:
+        raise ValueError(f"Invalid size: {size}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+@contextlib.contextmanager
+def locked(cache_dir: str):
+    """Hold the lock of a cache directory, e.g. while updating its index.
+
+    :param cache_dir: path to the cache directory
+    """
+    with open(join(cache_dir, LOCK_FILE), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def read_index(cache_dir: str) -> dict:
+    """Read the index of a cache directory.
+
+    :param cache_dir: path to the cache directory
+    :return: entries of the cache, empty if the index is missing or invalid
+    """
+    try:
+        with open(join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_index(cache_dir: str, index: dict) -> None:
+    """Replace the index of a cache directory.
+
+    :param cache_dir: path to the cache directory
+    :param index: entries of the cache
+    """
+    tmp_path = join(cache_dir, f"{INDEX_FILE}.{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, join(cache_dir, INDEX_FILE))
+
+
+def record_use(index: dict, key: str, **fields) -> None:
+    """Record that an entry of the cache is used by the current job.
+
+    :param index: entries of the cache
+    :param key: path of the entry, relative to the cache directory
+    :param fields: other fields of the entry to set, e.g. its size
+    """
+    entry = index.setdefault(key, {})
+    jobs = set(entry.get("jobs", []))
+    job_id = os.environ.get("SLURM_JOB_ID")
+    if job_id is not None:
+        jobs.add(job_id)
+    entry.update(fields, used=time.time(), jobs=sorted(jobs))
+
+
+def evict(cache_dir: str, index: dict, max_size: int, keep: set[str]) -> list[str]:
+    """Remove the least recently used entries until the cache fits in its size.
+
+    The entries used by jobs that are still running are kept, as they may be in use.
+
+    :param cache_dir: path to the cache directory
+    :param index: entries of the cache, updated in place
+    :param max_size: maximum total size (in bytes) of the cache
+    :param keep: entries that must not be evicted
+    :return: entries evicted
+    """
+    total_size = sum(entry["size"] for entry in index.values())
+    evicted = []
+    if total_size <= max_size:
+        return evicted
+    # Forget the jobs that have ended, the entries of the others may be in use
+    jobs = {job for entry in index.values() for job in entry.get("jobs", [])}
+    active_jobs = _get_active_jobs(jobs)
+    for entry in index.values():
+        entry["jobs"] = [job for job in entry.get("jobs", []) if job in active_jobs]
+    for key in sorted(index, key=lambda k: index[k]["used"]):
+        if total_size <= max_size:
+            break
+        if key in keep or index[key]["jobs"]:
+            continue
+        _remove(join(cache_dir, key))
+        total_size -= index.pop(key)["size"]
+        evicted.append(key)
+    if total_size > max_size:
+        print(f"The entries in use exceed the cache size by {total_size - max_size} B")
+    return evicted
+
+
+def join(cache_dir: str, key: str) -> str:
+    """Get the path of an entry of the cache.
+
+    :param cache_dir: path to the cache directory
+    :param key: path of the entry, relative to the cache directory
+    :return: path to the entry
+    """
+    return os.path.join(cache_dir, key)
+
+
+def _get_active_jobs(jobs: set[str]) -> set[str]:
+    if not jobs:
+        return set()
+    try:
+        res = subprocess.run(
+            ["squeue", "--noheader", "--format", "%A", "--user", getpass.getuser()],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=60,
+        )
+    except (OSError, subprocess.SubprocessError):
+        # All the jobs are assumed to be running if the queue cannot be listed
+        return jobs
+    return jobs & set(res.stdout.split())
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    # Files are staged with a lock file next to them
+    for suffix in ("", ".lock"):
+        with contextlib.suppress(FileNotFoundError, IsADirectoryError):
+            os.remove(path + suffix)
@@ -0,0 +1,143 @@
+"""Checkpoint Dask collections to a cache shared by all sessions.
+
+This module is uploaded to the remote cluster and can be imported in the notebooks
+of a session, e.g.:
+
+    from jupyterdask_checkpoint import checkpoint
+
+    mean = checkpoint(expensive_array.mean(axis=0))
+
+The first time a collection is checkpointed, it is computed and written to the cache
+directory (Dask arrays as Zarr, Dask dataframes as Parquet). Later, in the same or
+in another session, the same collection (i.e. with the same graph token) is loaded
+lazily from the cache instead of being recomputed. The cache is bounded in size:
+the least recently used checkpoints are evicted first, except the ones used by
+sessions that are still running. The cache directory and its
+size are set by the `JUPYTERDASK_CHECKPOINT_DIR` and `JUPYTERDASK_CHECKPOINT_SIZE`
+environment variables of the Jupyter job.
+"""
+
+import contextlib
+import os
+import shutil
+import time
+import uuid
+
+import dask
+import dask.array as da
+from jupyterdask_cache import (
+    evict,
+    join,
+    locked,
+    parse_size,
+    read_index,
+    record_use,
+    write_index,
+)
+
+
+def checkpoint(collection, cache_dir: str | None = None, max_size: int | None = None):
+    """Load a Dask collection from the cache, writing it to the cache if needed.
+
+    :param collection: Dask array or Dask dataframe
+    :param cache_dir: path to the cache directory, `JUPYTERDASK_CHECKPOINT_DIR` by
+        default
+    :param max_size: maximum total size (in bytes) of the cache,
+        `JUPYTERDASK_CHECKPOINT_SIZE` by default
+    :return: the same collection, read lazily from the cache
+    """
+    cache_dir = cache_dir or _get_cache_dir()
+    if max_size is None:
+        max_size = parse_size(os.environ.get("JUPYTERDASK_CHECKPOINT_SIZE", "50GiB"))
+    kind = _get_kind(collection)
+    key = f"{kind}-{dask.base.tokenize(collection)}"
+    os.makedirs(cache_dir, exist_ok=True)
+    with locked(cache_dir):
+        index = read_index(cache_dir)
+        if key in index and os.path.exists(join(cache_dir, key)):
+            # The jobs using a checkpoint protect it from eviction
+            record_use(index, key)
+            write_index(cache_dir, index)
+            return _load(kind, join(cache_dir, key))
+    # The collection is computed without holding the lock, so that other sessions
+    # can use the cache in the meantime
+    tmp_path = join(cache_dir, f"{key}.part-{uuid.uuid4().hex}")
+    try:
+        _store(kind, collection, tmp_path)
+        with locked(cache_dir):
+            index = read_index(cache_dir)
+            if os.path.exists(join(cache_dir, key)):
+                # Written concurrently by another session
+                shutil.rmtree(tmp_path)
+            else:
+                os.replace(tmp_path, join(cache_dir, key))
+            record_use(
+                index,
+                key,
+                size=_get_size(join(cache_dir, key)),
+                created=index.get(key, {}).get("created", time.time()),
+            )
+            evict(cache_dir, index, max_size, keep={key})
+            write_index(cache_dir, index)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return _load(kind, join(cache_dir, key))
+
+
+def list_checkpoints(cache_dir: str | None = None) -> dict[str, dict]:
+    """List the checkpoints in the cache.
+
+    :param cache_dir: path to the cache directory, `JUPYTERDASK_CHECKPOINT_DIR` by
+        default
+    :return: size (in bytes), creation and last use time of each checkpoint
+    """
+    cache_dir = cache_dir or _get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return {}
+    with locked(cache_dir):
+        return read_index(cache_dir)
+
+
+def _get_cache_dir() -> str:
+    try:
+        return os.environ["JUPYTERDASK_CHECKPOINT_DIR"]
+    except KeyError:
+        raise ValueError("The cache directory is not set") from None
+
+
+def _get_kind(collection) -> str:
+    if isinstance(collection, da.Array):
+        return "array"
+    # Dask dataframes are optional
+    with contextlib.suppress(ImportError):
+        import dask.dataframe as dd
+
+        if isinstance(collection, dd.DataFrame):
+            return "dataframe"
+    raise TypeError(f"Cannot checkpoint collections of type {type(collection)}")
+
+
+def _store(kind: str, collection, path: str) -> None:
+    if kind == "array":
+        # Zarr only stores regular chunks
+        if any(len(set(c[:-1])) > 1 or c[-1] > c[0] for c in collection.chunks):
+            collection = collection.rechunk(collection.chunksize)
+        collection.to_zarr(path)
+    else:
+        collection.to_parquet(path)
+
+
+def _load(kind: str, path: str):
+    if kind == "array":
+        return da.from_zarr(path)
+    import dask.dataframe as dd
+
+    return dd.read_parquet(path, calculate_divisions=True)
+
+
+def _get_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
@@ -0,0 +1,137 @@
+"""Dask clusters created by the gateway shared by a team.
+
+This module is uploaded to the remote cluster and used as the cluster factory of the
+Dask JupyterLab extension in sessions connected to a gateway (see `jupyterdask
+gateway`). `GatewayCluster` asks the gateway to create a cluster for the user of the
+session, and scales it through the gateway, which applies the limits of the team.
+The address of the gateway is read from the file published by the gateway, given by
+the `JUPYTERDASK_GATEWAY_FILE` environment variable. The requests are authenticated
+with a token of the user, which the gateway issues once the user has answered its
+challenge by creating a file in the authentication directory of the gateway.
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+from distributed.core import rpc
+from distributed.deploy.cluster import Cluster
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+logger = logging.getLogger(__name__)
+
+# Tokens issued by each gateway to the user, shared by the clusters of the process
+_tokens: dict[str, str] = {}
+
+
+class GatewayCluster(Cluster):
+    """Dask cluster managed by the gateway, for the current user."""
+
+    def __init__(
+        self,
+        gateway_file: str | None = None,
+        asynchronous: bool = False,
+        loop=None,
+        **kwargs,
+    ):
+        """Set up the cluster, which is created by the gateway when started.
+
+        :param gateway_file: path to the file published by the gateway, the one given
+            by `JUPYTERDASK_GATEWAY_FILE` by default
+        :param asynchronous: whether the cluster is used from asynchronous code
+        :param loop: event loop of the cluster
+        :param kwargs: other cluster options, which are set by the gateway
+        """
+        with open(gateway_file or os.environ["JUPYTERDASK_GATEWAY_FILE"]) as f:
+            gateway = json.load(f)
+        self.gateway_address = gateway["address"]
+        self._auth_dir = gateway["auth_dir"]
+        self._cluster_name = None
+        super().__init__(asynchronous=asynchronous, loop=loop)
+        if not self.asynchronous:
+            self._loop_runner.start()
+            self.sync(self._start)
+
+    async def _start(self) -> None:
+        if self.gateway_address not in _tokens:
+            _tokens[self.gateway_address] = await self._authenticate()
+        model = await self._request("POST", body={})
+        self._cluster_name = model["name"]
+        self.scheduler_comm = rpc(model["scheduler_address"])
+        await super()._start()
+
+    def scale(self, n: int):
+        """Scale the cluster to a number of workers, within the limits of the user.
+
+        :param n: number of workers
+        """
+        return self._patch({"workers": n})
+
+    def adapt(self, minimum: int = 0, maximum: int | None = None, **kwargs):
+        """Let the gateway scale the cluster to the load.
+
+        :param minimum: minimum number of workers
+        :param maximum: maximum number of workers, all the workers left to the user by
+            default
+        :param kwargs: other options of adaptive scaling, which are not supported
+        """
+        return self._patch({"adapt": {"minimum": minimum, "maximum": maximum}})
+
+    async def _close(self) -> None:
+        if self._cluster_name is not None:
+            try:
+                await self._request("DELETE", self._cluster_name)
+            except (OSError, HTTPClientError) as e:
+                logger.warning(f"Failed to close the cluster in the gateway: {e}")
+            self._cluster_name = None
+        await super()._close()
+
+    def _patch(self, body: dict):
+        # The Dask JupyterLab extension calls the scaling methods without awaiting
+        # them, so the request is scheduled on the running event loop
+        if self.asynchronous:
+            return asyncio.ensure_future(
+                self._request("PATCH", self._cluster_name, body=body)
+            )
+        return self.sync(self._request, "PATCH", self._cluster_name, body=body)
+
+    async def _authenticate(self) -> str:
+        # The gateway identifies the user as the owner of the file answering its
+        # challenge, in a directory that only the team can write to
+        challenge = await self._fetch("POST", "tokens", body={})
+        fd = os.open(challenge["path"], os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o640)
+        try:
+            # The gateway runs as another member of the group
+            os.fchmod(fd, 0o640)
+            with os.fdopen(fd, "w") as f:
+                f.write(challenge["challenge"])
+            response = await self._fetch(
+                "PUT", f"tokens/{challenge['challenge']}", body={}
+            )
+        finally:
+            os.remove(challenge["path"])
+        return response["token"]
+
+    async def _request(self, method: str, name: str = "", body: dict | None = None):
+        return await self._fetch(
+            method,
+            f"clusters/{name}",
+            body=body,
+            headers={"Authorization": f"token {_tokens[self.gateway_address]}"},
+        )
+
+    async def _fetch(
+        self,
+        method: str,
+        path: str,
+        body: dict | None = None,
+        headers: dict[str, str] | None = None,
+    ):
+        response = await AsyncHTTPClient().fetch(
+            f"{self.gateway_address}/{path}",
+            method=method,
+            headers=headers,
+            body=json.dumps(body) if body is not None else None,
+        )
+        return json.loads(response.body)
@@ -0,0 +1,133 @@
+"""Dask clusters whose scheduler runs in its own SLURM job.
+
+This module is uploaded to the remote cluster and used as the cluster factory of the
+Dask JupyterLab extension when the schedulers run in dedicated jobs. By default, the
+scheduler of a `dask_jobqueue.SLURMCluster` runs in the process that creates the
+cluster, i.e. in the Jupyter job, where it competes with the kernels for the cores
+of the job. `SchedulerJobCluster` submits a job running the scheduler instead, with
+the resources given by the `JUPYTERDASK_SCHEDULER_*` environment variables of the
+Jupyter job, and the Dask workers connect to it.
+"""
+
+import asyncio
+import json
+import os
+import shlex
+import uuid
+
+import dask
+from dask.utils import parse_bytes
+from dask_jobqueue import SLURMCluster
+from distributed.deploy.spec import ProcessInterface
+
+STATE_CHECK_INTERVAL = 10
+
+
+class SchedulerJob(ProcessInterface):
+    """Dask scheduler running in a SLURM job."""
+
+    def __init__(
+        self,
+        protocol: str | None = None,
+        dashboard_address: str | None = None,
+        interface: str | None = None,
+        host: str | None = None,
+        **kwargs,
+    ):
+        """Set up the scheduler job, which is not submitted yet.
+
+        :param protocol: communication protocol of the scheduler
+        :param dashboard_address: address of the dashboard of the scheduler
+        :param interface: network interface of the scheduler
+        :param host: host address of the scheduler
+        :param kwargs: other scheduler options, which are not supported
+        """
+        super().__init__()
+        self.options = {
+            "--protocol": protocol,
+            "--dashboard-address": dashboard_address,
+            "--interface": interface,
+            "--host": host,
+        }
+        self.log_dir = os.environ["JUPYTERDASK_LOG_DIR"]
+        self.job_name = f"{os.environ.get('SLURM_JOB_NAME', 'jupyterdask')}-scheduler"
+        self.scheduler_file = os.path.join(
+            self.log_dir, f"{self.job_name}-{uuid.uuid4().hex[:8]}.json"
+        )
+        self.job_id = None
+
+    def job_script(self) -> str:
+        """Write the batch job script of the scheduler.
+
+        :return: the text of the job script
+        """
+        python = dask.config.get("jobqueue.slurm.python")
+        # SLURM does not take the units of Dask (e.g. "8GiB")
+        memory = parse_bytes(os.environ["JUPYTERDASK_SCHEDULER_MEMORY"]) // 2**20
+        directives = [
+            f"--job-name={self.job_name}",
+            "--nodes=1",
+            "--ntasks=1",
+            f"--cpus-per-task={os.environ['JUPYTERDASK_SCHEDULER_CORES']}",
+            f"--mem={memory}M",
+            f"--time={os.environ['JUPYTERDASK_SCHEDULER_WALLTIME']}",
+            f"--partition={os.environ['JUPYTERDASK_SCHEDULER_PARTITION']}",
+            f"--output={self.log_dir}/%x-%j.out",
+        ]
+        if os.environ.get("JUPYTERDASK_SCHEDULER_ACCOUNT"):
+            directives.append(
+                f"--account={os.environ['JUPYTERDASK_SCHEDULER_ACCOUNT']}"
+            )
+        args = [f"--scheduler-file {shlex.quote(self.scheduler_file)}"]
+        args += [f"{k} {shlex.quote(v)}" for k, v in self.options.items() if v]
+        lines = ["#!/bin/bash"] + [f"#SBATCH {d}" for d in directives]
+        lines.append(f"{python} -m distributed.cli.dask_scheduler {' '.join(args)}")
+        return "\n".join(lines) + "\n"
+
+    async def start(self) -> None:
+        """Submit the scheduler job and wait for the scheduler to start."""
+        out = await _run(["sbatch", "--parsable"], stdin=self.job_script())
+        self.job_id = out.split(";")[0].strip()
+        while not os.path.exists(self.scheduler_file):
+            await asyncio.sleep(STATE_CHECK_INTERVAL)
+            state = await _run(["squeue", "--noheader", "-j", self.job_id, "-o", "%T"])
+            if state.strip() not in ("PENDING", "CONFIGURING", "RUNNING"):
+                raise RuntimeError(
+                    f"The scheduler job {self.job_id} has ended, see its log in "
+                    f"{self.log_dir}"
+                )
+        with open(self.scheduler_file) as f:
+            self.address = json.load(f)["address"]
+        await super().start()
+
+    async def close(self) -> None:
+        """Cancel the scheduler job."""
+        if self.job_id is not None:
+            await _run(["scancel", self.job_id])
+            self.job_id = None
+        await super().close()
+
+
+async def _run(command: list[str], stdin: str | None = None) -> str:
+    proc = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    out, err = await proc.communicate(stdin.encode() if stdin is not None else None)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{command[0]} failed: {err.decode().strip()}")
+    return out.decode()
+
+
+class SchedulerJobCluster(SLURMCluster):
+    """SLURM cluster whose scheduler runs in its own SLURM job."""
+
+    def __init__(self, **kwargs):
+        """Set up the cluster.
+
+        :param kwargs: arguments of `dask_jobqueue.SLURMCluster`
+        """
+        kwargs.setdefault("scheduler_cls", SchedulerJob)
+        super().__init__(**kwargs)
@@ -1,18 +1,53 @@
-import datetime
+import dataclasses
+import importlib.resources
 import io
+import json
 import logging
+import os
+import pathlib
+import shlex
+import tarfile
 import time
 import webbrowser
+from collections.abc import Callable
 from contextlib import AbstractContextManager, contextmanager
+from functools import partial
 from typing import Any
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import parse_qs, unquote, urlparse
 
 from fabric import Connection
-from invoke.exceptions import UnexpectedExit
+
+from .config import get_config, parse_walltime
+from .connection import get_connect_kwargs
+from .jobs import JobMonitor
+from .metrics import MetricsExporter, MetricsStore, SchedulerSampler
+from .report import parse_sacct_time
+from .sessions import (
+    SessionRecord,
+    get_scheduler_job_name,
+    get_session_dir,
+    get_session_start_date,
+    get_worker_job_name,
+    new_session_id,
+    save_session,
+)
+from .supervisor import SessionEndedError, Supervisor, daemonize, raise_on_sigterm
+from .tunnels import CONNECTION_ERRORS, LocalForward, SessionTunnel, get_free_port
 
 logger = logging.getLogger(__file__)
 
-TIMESTAMP = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+# Intervals (in seconds) of the tasks run while connected to the remote cluster
+JOB_CHECK_INTERVAL = 30
+KEEPALIVE_INTERVAL = 15
+LOG_FOLLOW_INTERVAL = 5
+METRICS_INTERVAL = 60
+SCHEDULER_METRICS_INTERVAL = 15
+
+# Index of the performance reports recorded by the job, see the preload script
+PERFORMANCE_REPORTS_INDEX = "index.jsonl"
+
+# Sets of parameters of a sweep, in the run directory of the job array
+SWEEP_PARAMETERS = "parameters.json"
 
 
 def submit_and_connect(
@@ -22,6 +57,11 @@ def submit_and_connect(
     port: int = 8888,
     timeout: int = 60,
     log_dir: str = ".jupyterdask",
+    headless: bool = False,
+    daemon: bool = False,
+    follow_log: bool = False,
+    metrics_port: int | None = None,
+    performance_reports: bool = False,
 ) -> None:
     """Start Jupyter on the remote cluster and connect to the server.
 
@@ -32,54 +72,412 @@ def submit_and_connect(
     :param port: the local port where to forward the remote Jupyter server
     :param timeout: time (in seconds) waited for the remote Jupyter server to start
     :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param headless: do not open the web browser
+    :param daemon: continue in the background once Jupyter is reachable (implies
+        `headless`)
+    :param follow_log: print the log of the Jupyter job as it is written
+    :param metrics_port: local port where to expose the metrics of the Dask clusters
+        in the Prometheus format
+    :param performance_reports: fetch the Dask performance reports recorded by the
+        job when the session ends
+    """
+    port = get_free_port(port)
+    session = SessionRecord(
+        session_id=new_session_id(),
+        host=host,
+        log_dir=log_dir,
+        identity_file=identity_file,
+        performance_reports=performance_reports,
+    )
+    notify = None
+    if daemon:
+        # Fork before any connection is opened
+        session_dir = get_session_dir(session.session_id)
+        session_dir.mkdir(parents=True, exist_ok=True)
+        notify = daemonize(session_dir / "client.log")
+    connect_kwargs = get_connect_kwargs(identity_file)
+    # The jobs are cancelled on SIGTERM, also before the supervisor runs
+    with (
+        raise_on_sigterm(),
+        Connection(
+            host=host, connect_kwargs=connect_kwargs, forward_agent=True
+        ) as conn,
+    ):
+        _setup_log_dir(conn, log_dir)
+        monitor = JobMonitor(conn)
+        with _start_jupyter(conn, job_script, session, monitor, timeout=timeout) as url:
+            url_info = _parse_url(url)
+            with _forward_jupyter(
+                conn, url_info, port, session, monitor, connect_kwargs
+            ) as tunnel:
+                time.sleep(1)
+                local_url = _get_local_url(port=port, token=url_info["token"])
+                print(f"JupyterLab URL: {local_url}")
+                if notify is not None:
+                    notify(f"{session.session_id} {local_url}")
+                elif not headless:
+                    _open_browser(local_url)
+                store = MetricsStore()
+                store.add_session(session, get_config(host))
+                sampler = SchedulerSampler(
+                    store, session, _get_local_url(port=port), url_info["token"]
+                )
+                supervisor = _get_supervisor(
+                    tunnel, session, monitor, sampler, follow_log=follow_log
+                )
+                exporter = None
+                if metrics_port is not None:
+                    exporter = MetricsExporter(store, metrics_port)
+                    exporter.start()
+                try:
+                    supervisor.run()
+                finally:
+                    if exporter is not None:
+                        exporter.stop()
+
+
+def stop_session(session: SessionRecord) -> None:
+    """Cancel all the jobs of a session on the remote cluster.
+
+    :param session: session record
+    """
+    connect_kwargs = get_connect_kwargs(session.identity_file)
+    with Connection(
+        host=session.host, connect_kwargs=connect_kwargs, forward_agent=True
+    ) as conn:
+        reclaimed = _stop_session(conn, session)
+    print(
+        f"Cancelled session {session.session_id}: {reclaimed:.2f} node-hours reclaimed."
+    )
+
+
+def fetch_performance_reports(session: SessionRecord) -> None:
+    """Fetch the Dask performance reports of a session that are not fetched yet.
+
+    :param session: session record
+    """
+    connect_kwargs = get_connect_kwargs(session.identity_file)
+    with Connection(
+        host=session.host, connect_kwargs=connect_kwargs, forward_agent=True
+    ) as conn:
+        _fetch_performance_reports(conn, session)
+
+
+def submit_and_run(
+    job_script: str,
+    host: str,
+    payload: str,
+    identity_file: str | None = None,
+    log_dir: str = ".jupyterdask",
+    output_dir: str | None = None,
+) -> int:
+    """Run a script or a notebook with a Dask cluster on the remote cluster.
+
+    The output of the job is printed as it is written. Once the job has ended, the
+    files in the run directory of the job (i.e. the payload and the files it has
+    written in its working directory) are fetched.
+
+    :param job_script: the text of the batch job script
+    :param host: remote cluster destination
+    :param payload: path to the Python script or notebook
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param output_dir: local path where to fetch the files of the run directory,
+        `<session>-run` in the current directory by default
+    :return: the exit code of the payload
+    """
+    session = SessionRecord(
+        session_id=new_session_id(),
+        host=host,
+        log_dir=log_dir,
+        identity_file=identity_file,
+    )
+    run_dir = _get_run_dir(session)
+    connect_kwargs = get_connect_kwargs(identity_file)
+    with (
+        raise_on_sigterm(),
+        Connection(
+            host=host, connect_kwargs=connect_kwargs, forward_agent=True
+        ) as conn,
+    ):
+        _setup_log_dir(conn, log_dir)
+        conn.run(f"mkdir -p {run_dir}", hide=True)
+        conn.put(payload, f"{run_dir}/{os.path.basename(payload)}")
+        monitor = JobMonitor(conn)
+        save_session(session)
+        try:
+            # The job is cancelled by name if interrupted before its ID is recorded
+            job_id = _submit_job(conn, job_script, session.session_id, log_dir)
+            monitor.watch(job_id)
+            session.job_id = job_id
+            save_session(session)
+            print(f"Submitted job {job_id} ({session.session_id})")
+            log_file = _get_log_file(session.session_id, job_id, log_dir)
+            follower = _LogFollower(conn, log_file)
+            while monitor.is_active(job_id):
+                follower()
+                time.sleep(LOG_FOLLOW_INTERVAL)
+            follower()
+        finally:
+            _save_job_transitions(monitor, session)
+            # Cancel the job if interrupted, and any Dask worker job left
+            _stop_session(conn, session)
+        exit_code = _read_exit_code(conn, session)
+        res = conn.run(f"ls -1A {run_dir}", hide=True)
+        local_dir = pathlib.Path(output_dir or f"{session.session_id}-run")
+        _get_files(conn, run_dir, res.stdout.splitlines(), local_dir)
+    print(f"Fetched the files of the run directory to: {local_dir}")
+    if exit_code is None:
+        print(f"Job {job_id} ended before the payload completed.")
+        return 1
+    return exit_code
+
+
+def submit_sweep(
+    job_script: str,
+    host: str,
+    notebook: str,
+    parameters: list[dict[str, Any]],
+    identity_file: str | None = None,
+    log_dir: str = ".jupyterdask",
+    max_concurrent: int | None = None,
+) -> list[int]:
+    """Run a notebook once for each set of parameters, as a SLURM job array.
+
+    Each task of the array runs the notebook with its set of parameters, and saves
+    the executed notebook in the run directory of the session on the remote cluster,
+    as `<name>-<index>.out.ipynb`. The progress of the tasks is printed until all of
+    them have ended.
+
+    :param job_script: the text of the batch job script
+    :param host: remote cluster destination
+    :param notebook: path to the notebook
+    :param parameters: sets of parameters, one for each task of the array
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param max_concurrent: maximum number of tasks running at the same time
+    :return: indices of the tasks that have failed
     """
-    connect_kwargs = _get_connect_kwargs(identity_file)
+    session = SessionRecord(
+        session_id=new_session_id(),
+        host=host,
+        log_dir=log_dir,
+        identity_file=identity_file,
+        array_size=len(parameters),
+    )
+    run_dir = _get_run_dir(session)
+    connect_kwargs = get_connect_kwargs(identity_file)
     with Connection(
         host=host, connect_kwargs=connect_kwargs, forward_agent=True
     ) as conn:
         _setup_log_dir(conn, log_dir)
-        with _start_jupyter(conn, job_script, log_dir=log_dir, timeout=timeout) as url:
-            url_info = _parse_url(url)
-            _forward_port_and_open_browser(
-                conn,
-                remote_host=url_info["hostname"],
-                remote_port=url_info["port"],
-                local_port=port,
-                token=url_info["token"],
-            )
+        conn.run(f"mkdir -p {run_dir}", hide=True)
+        conn.put(notebook, f"{run_dir}/{os.path.basename(notebook)}")
+        conn.put(io.StringIO(json.dumps(parameters)), f"{run_dir}/{SWEEP_PARAMETERS}")
+        indices = list(range(len(parameters)))
+        return _run_sweep(conn, session, job_script, indices, max_concurrent)
+
+
+def retry_sweep(session: SessionRecord, max_concurrent: int | None = None) -> list[int]:
+    """Run again the tasks of a sweep that have failed (or have not completed).
+
+    The tasks are submitted as a new job array, with the job script of the sweep.
+
+    :param session: record of the sweep session
+    :param max_concurrent: maximum number of tasks running at the same time
+    :return: indices of the tasks that have failed again
+    """
+    if session.array_size is None:
+        raise ValueError(f"Session {session.session_id} is not a sweep.")
+    connect_kwargs = get_connect_kwargs(session.identity_file)
+    with Connection(
+        host=session.host, connect_kwargs=connect_kwargs, forward_agent=True
+    ) as conn:
+        exit_codes = _read_sweep_exit_codes(conn, session)
+        failed = [i for i in range(session.array_size) if exit_codes.get(i) != 0]
+        if not failed:
+            print(f"All the tasks of {session.session_id} have completed.")
+            return []
+        res = conn.run(f"cat {session.log_dir}/{session.session_id}.bsh", hide=True)
+        # The exit codes are written again by the new tasks
+        paths = " ".join(_get_sweep_exit_code_file(session, i) for i in failed)
+        conn.run(f"rm -f {paths}", hide=True)
+        return _run_sweep(conn, session, res.stdout, failed, max_concurrent)
+
+
+def submit_gateway(
+    job_script: str,
+    host: str,
+    gateway_file: str,
+    identity_file: str | None = None,
+    log_dir: str = ".jupyterdask",
+    timeout: int = 60,
+) -> None:
+    """Start the gateway of a team on the remote cluster, and leave it running.
+
+    :param job_script: the text of the batch job script
+    :param host: remote cluster destination
+    :param gateway_file: path where the gateway publishes its address on the remote
+        cluster
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param timeout: time (in seconds) waited for the gateway to start, once the job is
+        running
+    """
+    session = SessionRecord(
+        session_id=new_session_id(),
+        host=host,
+        log_dir=log_dir,
+        identity_file=identity_file,
+    )
+    connect_kwargs = get_connect_kwargs(identity_file)
+    with Connection(
+        host=host, connect_kwargs=connect_kwargs, forward_agent=True
+    ) as conn:
+        _setup_log_dir(conn, log_dir)
+        # A gateway left from a previous job would be mistaken for the new one
+        conn.run(f"rm -f {gateway_file}", hide=True)
+        monitor = JobMonitor(conn)
+        job_id = _submit_job(conn, job_script, session.session_id, log_dir)
+        monitor.watch(job_id)
+        session.job_id = job_id
+        save_session(session)
+        print(f"Submitted job {job_id} ({session.session_id})")
+        try:
+            _wait_for_gateway_to_start(conn, monitor, session, gateway_file, timeout)
+        except BaseException:
+            _stop_session(conn, session)
+            raise
+        res = conn.run(f"realpath {gateway_file}", hide=True)
+    print(
+        f"Gateway running in job {job_id}, stop it with: "
+        f"jupyterdask stop {session.session_id}"
+    )
+    print(
+        "Connect to the gateway with: "
+        f"jupyterdask {host} --gateway {res.stdout.strip()}"
+    )
+
+
+def get_session_status(session: SessionRecord) -> dict[str, Any]:
+    """Get the status of a session from the remote cluster.
+
+    :param session: session record
+    :return: state of the Jupyter job and, if the job is running, the status document
+        published by the job (Jupyter URL, Dask clusters and node usage)
+    """
+    connect_kwargs = get_connect_kwargs(session.identity_file)
+    with Connection(
+        host=session.host, connect_kwargs=connect_kwargs, forward_agent=True
+    ) as conn:
+        state = JobMonitor(conn).get_state(session.job_id)
+        status = _read_status(conn, session) if state is not None else None
+    return {
+        "session_id": session.session_id,
+        "host": session.host,
+        "job_id": session.job_id,
+        "state": state,
+        "status": status,
+    }
 
 
-def _get_connect_kwargs(identity_file: str | None) -> dict[str, str | None]:
-    return {"key_filename": identity_file} if identity_file is not None else None
+def print_session_status(status: dict[str, Any]) -> None:
+    """Print the status of a session.
+
+    :param status: status, as returned by `get_session_status`
+    """
+    state = status["state"] or "ENDED"
+    print(f"Session {status['session_id']} on {status['host']}")
+    print(f"  Jupyter job: {status['job_id']} ({state})")
+    job_status = status["status"]
+    if job_status is None:
+        return
+    jupyter = job_status.get("jupyter")
+    if jupyter is None:
+        print("  JupyterLab: starting")
+    else:
+        print(f"  JupyterLab: {jupyter['url']} ({jupyter['kernels']} kernel(s))")
+    for cluster in job_status.get("dask", []):
+        print(
+            f"  Dask cluster {cluster['name']}: {cluster['scheduler_address']} "
+            f"({cluster['workers']} worker(s))"
+        )
+    node = job_status["node"]
+    memory_used = (node["memory_total"] - node["memory_available"]) / 2**30
+    cpu_usage = node["cpu_usage"] or 0
+    print(
+        f"  Node {job_status['hostname']}: {cpu_usage:.0%} CPU of {node['cpus']} "
+        f"cores (load {node['load_average']:.2f}), {memory_used:.1f} GiB of "
+        f"{node['memory_total'] / 2**30:.1f} GiB memory used"
+    )
+    print(
+        f"  I/O: {node['read_rate'] / 2**20:.1f} MiB/s read, "
+        f"{node['write_rate'] / 2**20:.1f} MiB/s written"
+    )
+    print(f"  Updated {time.time() - job_status['time']:.0f} s ago")
 
 
 def _setup_log_dir(connection: Connection, log_dir: str = ".jupyterdask") -> None:
-    connection.run(f"mkdir -p '{log_dir}'", hide=True)
+    # Helper scripts run by the jobs (e.g. to stage input files), and modules that
+    # can be imported in the notebooks
+    for package in ("scripts", "modules"):
+        connection.run(f"mkdir -p '{log_dir}/{package}'", hide=True)
+        files = importlib.resources.files(f"jupyterdask.{package}").iterdir()
+        for script in files:
+            if script.name.endswith(".py"):
+                with script.open("rb") as f:
+                    connection.put(f, f"{log_dir}/{package}/{script.name}")
 
 
 @contextmanager
 def _start_jupyter(
     connection: Connection,
     job_script: str,
-    log_dir: str = ".jupyterdask",
+    session: SessionRecord,
+    monitor: JobMonitor,
     timeout: int = 60,
 ) -> AbstractContextManager:
-    job_id = _submit_job(connection, job_script, log_dir=log_dir)
+    save_session(session)
     try:
-        log_file = _get_log_file(job_id, log_dir=log_dir)
-        _wait_for_jupyter_to_start(connection, job_id, log_file, timeout=timeout)
-        yield _get_jupyter_url(connection, log_file)
+        # The job is cancelled by name if interrupted before its ID is recorded
+        job_id = _submit_job(
+            connection, job_script, session.session_id, session.log_dir
+        )
+        monitor.watch(job_id)
+        session.job_id = job_id
+        save_session(session)
+        yield _wait_for_jupyter_to_start(connection, monitor, session, timeout=timeout)
     finally:
-        _cancel_job(connection, job_id)
+        _save_job_transitions(monitor, session)
+        try:
+            reclaimed = _stop_session(connection, session)
+            _print_session_summary(connection, session, reclaimed)
+            if session.performance_reports:
+                _fetch_performance_reports(connection, session)
+        except CONNECTION_ERRORS:
+            print(
+                "Failed to reach the remote cluster, cancel the session jobs with: "
+                f"jupyterdask stop {session.session_id}"
+            )
+            raise
 
 
 def _submit_job(
-    connection: Connection, job_script: str, log_dir: str = ".jupyterdask"
+    connection: Connection,
+    job_script: str,
+    job_name: str,
+    log_dir: str = ".jupyterdask",
+    array: str | None = None,
 ) -> int:
-    job_name = f"jupyter-{TIMESTAMP}"
     remote_path = f"{log_dir}/{job_name}.bsh"
     connection.put(io.StringIO(job_script), remote_path)
-    res = connection.run(f"sbatch --job-name {job_name} {remote_path}", hide=True)
+    options = f"--job-name {job_name}"
+    if array is not None:
+        options += f" --array {array}"
+    res = connection.run(f"sbatch {options} {remote_path}", hide=True)
     # Parse stdout of the form: "Submitted batch job <JOB_ID>"
     job_id = int(res.stdout.split()[-1])
     return job_id
@@ -87,85 +485,373 @@ def _submit_job(
 
 def _wait_for_jupyter_to_start(
     connection: Connection,
-    job_id: str,
-    log_file: str,
+    monitor: JobMonitor,
+    session: SessionRecord,
     timeout: int = 60,
-):
+) -> str:
+    job_id = session.job_id
     start_time = time.time()
     while time.time() - start_time < timeout:
-        if _job_is_active(connection, job_id):
-            if _jupyter_is_running(connection, log_file):
-                return
+        if monitor.is_active(job_id):
+            url = _get_jupyter_url(connection, session)
+            if url is not None:
+                return url
         else:
             raise RuntimeError(f"Job {job_id} failed.")
         time.sleep(5)
     raise TimeoutError(f"Failed to start Jupyter in job {job_id}.")
 
 
-def _cancel_job(connection: Connection, job_id: int) -> None:
-    connection.run(f"scancel {job_id}", warn=True, hide=True)
+def _wait_for_gateway_to_start(
+    connection: Connection,
+    monitor: JobMonitor,
+    session: SessionRecord,
+    gateway_file: str,
+    timeout: int = 60,
+) -> None:
+    # The job may wait in the queue for a long time, the timeout starts with the job
+    job_id = session.job_id
+    start_time = None
+    while start_time is None or time.time() - start_time < timeout:
+        state = monitor.get_state(job_id)
+        if state is None:
+            raise RuntimeError(f"Job {job_id} failed.")
+        if state == "RUNNING":
+            start_time = start_time or time.time()
+            res = connection.run(f"test -s {gateway_file}", warn=True, hide=True)
+            if res.exited == 0:
+                return
+        time.sleep(5)
+    raise TimeoutError(f"Failed to start the gateway in job {job_id}.")
+
+
+def _stop_session(connection: Connection, session: SessionRecord) -> float:
+    """Cancel all active jobs of a session, returning the node-hours reclaimed."""
+    session_id = session.session_id
+    res = connection.run(
+        f"squeue --user $USER --noheader --name {session_id},"
+        f"{get_worker_job_name(session_id)},{get_scheduler_job_name(session_id)} "
+        "--format '%i|%T|%L|%D'",
+        warn=True,
+        hide=True,
+    )
+    job_ids = []
+    reclaimed = 0.0
+    for line in res.stdout.splitlines() if res.exited == 0 else []:
+        job_id, state, time_left, nodes = line.split("|")
+        job_ids.append(job_id)
+        if state == "RUNNING" and time_left[0].isdigit():
+            reclaimed += parse_walltime(time_left) / 3600 * int(nodes)
+    if session.job_id is not None and str(session.job_id) not in job_ids:
+        # Make sure the Jupyter job is cancelled even if squeue failed
+        job_ids.append(str(session.job_id))
+    if job_ids:
+        connection.run(f"scancel {' '.join(job_ids)}", warn=True, hide=True)
+    session.active = False
+    save_session(session)
+    return reclaimed
+
+
+def _print_session_summary(
+    connection: Connection, session: SessionRecord, reclaimed: float
+) -> None:
+    job_id = session.job_id
+    jobs = _get_session_jobs(connection, session.session_id)
+    submit_time = jobs.get(str(job_id), {}).get("Submit")
+    if submit_time is None:
+        logger.info("Failed to retrieve accounting information for the session.")
+        return
+    jupyter_start_time = jobs[str(job_id)]["Start"]
+    worker_start_times = [
+        job["Start"]
+        for job in jobs.values()
+        if job["JobName"] == get_worker_job_name(session.session_id)
+        and job["Start"] is not None
+    ]
+    print("Session summary:")
+    print(f"  Jupyter job: {job_id}")
+    if jupyter_start_time is not None:
+        print(f"  Jupyter queue wait: {jupyter_start_time - submit_time}")
+    if worker_start_times:
+        print(f"  Time to first worker: {min(worker_start_times) - submit_time}")
+    else:
+        print("  Time to first worker: no worker started")
+    print(f"  Node-hours reclaimed at shutdown: {reclaimed:.2f}")
+
+
+def _get_session_jobs(
+    connection: Connection, session_id: str
+) -> dict[str, dict[str, Any]]:
+    start_date = get_session_start_date(session_id)
+    names = f"{session_id},{get_worker_job_name(session_id)}"
+    res = connection.run(
+        "sacct --allocations --noheader --parsable2 --starttime "
+        f"{start_date} --name {names} "
+        "--format JobID,JobName,Submit,Start",
+        warn=True,
+        hide=True,
+    )
+    jobs = {}
+    if res.exited != 0:
+        return jobs
+    for line in res.stdout.splitlines():
+        job_id, name, submit, start = line.split("|")
+        jobs[job_id] = {
+            "JobName": name,
+            "Submit": parse_sacct_time(submit),
+            "Start": parse_sacct_time(start),
+        }
+    return jobs
+
+
+def _get_log_file(job_name: str, job_id: int, log_dir: str = ".jupyterdask") -> str:
+    return f"{log_dir}/{job_name}-{job_id}.out"
+
 
+def _get_run_dir(session: SessionRecord) -> str:
+    # Working directory of the payload, see the job script template
+    return f"{session.log_dir}/{session.session_id}-run"
 
-def _get_log_file(job_id: int, log_dir: str = ".jupyterdask") -> str:
-    return f"{log_dir}/jupyter-{TIMESTAMP}-{job_id}.out"
+
+def _read_exit_code(connection: Connection, session: SessionRecord) -> int | None:
+    # Written by the payload runner, see the job script template
+    path = f"{session.log_dir}/{session.session_id}-{session.job_id}.exit-code"
+    res = connection.run(f"cat {path}", warn=True, hide=True)
+    if res.exited != 0:
+        return None
+    return int(res.stdout)
+
+
+def _run_sweep(
+    connection: Connection,
+    session: SessionRecord,
+    job_script: str,
+    indices: list[int],
+    max_concurrent: int | None = None,
+) -> list[int]:
+    array = _format_array(indices, max_concurrent)
+    monitor = JobMonitor(connection)
+    job_id = _submit_job(
+        connection, job_script, session.session_id, session.log_dir, array=array
+    )
+    monitor.watch(job_id)
+    session.job_id = job_id
+    session.active = True
+    save_session(session)
+    print(f"Submitted job array {job_id} ({session.session_id}): {len(indices)} tasks")
+    try:
+        progress = None
+        while True:
+            # The tasks of the array are aggregated from the batched queue listing
+            states = monitor.get_array_states(job_id)
+            queued = [states[i] for i in indices if i in states]
+            pending = queued.count("PENDING")
+            done = len(indices) - len(queued)
+            if progress is None or done != progress[0]:
+                exit_codes = _read_sweep_exit_codes(connection, session)
+            failed = sum(exit_codes.get(i) != 0 for i in indices if i not in states)
+            if (done, failed, pending) != progress:
+                progress = (done, failed, pending)
+                print(
+                    f"Tasks: {done}/{len(indices)} done ({failed} failed), "
+                    f"{len(queued) - pending} running, {pending} pending",
+                    flush=True,
+                )
+            if not queued:
+                break
+            time.sleep(monitor.interval)
+    finally:
+        _save_job_transitions(monitor, session)
+        # Cancel the tasks left if interrupted, and any Dask worker job left
+        _stop_session(connection, session)
+    exit_codes = _read_sweep_exit_codes(connection, session)
+    failed = [i for i in indices if exit_codes.get(i) != 0]
+    print(f"Executed notebooks saved in: {_get_run_dir(session)}")
+    if failed:
+        print(f"Failed tasks: {_format_array(failed)}")
+        print(f"Run them again with: jupyterdask sweep --retry {session.session_id}")
+    return failed
+
+
+def _format_array(indices: list[int], max_concurrent: int | None = None) -> str:
+    # Array specification for sbatch, with consecutive indices as ranges (e.g. "0-9,12")
+    ranges = []
+    for index in sorted(indices):
+        if ranges and ranges[-1][1] == index - 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    array = ",".join(f"{a}-{b}" if a != b else str(a) for a, b in ranges)
+    if max_concurrent is not None:
+        array += f"%{max_concurrent}"
+    return array
 
 
-def _job_is_active(connection: Connection, job_id: int):
-    res = connection.run(f"squeue -j {job_id} --format %T", warn=True, hide=True)
-    # If the job is active, squeue will return "STATE\n<SOME_STATE>\n"
-    is_active = len(res.stdout.split()) == 2
-    return (res.exited == 0) and is_active
+def _get_sweep_exit_code_file(session: SessionRecord, index: int) -> str:
+    # Written by the payload runner, see the job script template
+    return f"{session.log_dir}/{session.session_id}-task-{index}.exit-code"
 
 
-def _jupyter_is_running(connection: Connection, log_file: str):
-    if not _file_exists(connection, log_file):
-        return False
+def _read_sweep_exit_codes(
+    connection: Connection, session: SessionRecord
+) -> dict[int, int]:
+    res = connection.run(
+        f"grep -s -H . {session.log_dir}/{session.session_id}-task-*.exit-code",
+        warn=True,
+        hide=True,
+    )
+    exit_codes = {}
+    for line in res.stdout.splitlines():
+        path, _, exit_code = line.rpartition(":")
+        index = path.removesuffix(".exit-code").rpartition("-")[2]
+        exit_codes[int(index)] = int(exit_code)
+    return exit_codes
+
+
+def _get_reports_dir(session: SessionRecord) -> str:
+    # See the job script template
+    return f"{session.log_dir}/{session.session_id}-reports"
+
+
+def _fetch_performance_reports(connection: Connection, session: SessionRecord) -> None:
+    remote_dir = _get_reports_dir(session)
+    local_dir = get_session_dir(session.session_id) / "reports"
+    res = connection.run(f"ls -1A {remote_dir}", warn=True, hide=True)
+    if res.exited != 0 or not res.stdout.strip():
+        print("No performance report has been recorded.")
+        return
+    # The index is always fetched, as it grows with the reports
+    names = [
+        name
+        for name in res.stdout.splitlines()
+        if name == PERFORMANCE_REPORTS_INDEX or not (local_dir / name).exists()
+    ]
+    _get_files(connection, remote_dir, names, local_dir)
+    reports = sum(name.endswith(".html") for name in names)
+    print(f"Fetched {reports} new performance report(s) to: {local_dir}")
+
+
+def _get_files(
+    connection: Connection, remote_dir: str, names: list[str], local_dir: pathlib.Path
+) -> None:
+    # Stream the files (or directories) as a single compressed archive
+    local_dir.mkdir(parents=True, exist_ok=True)
+    paths = " ".join(shlex.quote(name) for name in names)
+    channel = connection.client.get_transport().open_session()
     try:
-        _ = _get_jupyter_url(connection, log_file)
-    except UnexpectedExit:
-        return False
-    return True
+        channel.exec_command(f"tar -cz -C {remote_dir} {paths}")
+        with tarfile.open(fileobj=channel.makefile("rb"), mode="r|gz") as tar:
+            for member in tar:
+                # Only regular files and directories within the directory
+                path = os.path.normpath(member.name)
+                if os.path.isabs(path) or path.startswith(".."):
+                    continue
+                if member.isfile() or member.isdir():
+                    tar.extract(member, local_dir)
+    finally:
+        channel.close()
 
 
-def _file_exists(connection: Connection, path: str) -> bool:
-    res = connection.run(f"test -f {path}", warn=True, hide=True)
-    return res.exited == 0
+def _save_job_transitions(monitor: JobMonitor, session: SessionRecord) -> None:
+    # Keep the transitions of the session jobs, e.g. to measure their queue wait
+    names = (
+        session.session_id,
+        get_worker_job_name(session.session_id),
+        get_scheduler_job_name(session.session_id),
+    )
+    transitions = [dataclasses.asdict(t) for t in monitor.history if t.name in names]
+    with open(get_session_dir(session.session_id) / "jobs.jsonl", "a") as f:
+        for transition in transitions:
+            f.write(json.dumps(transition) + "\n")
 
 
-def _get_jupyter_url(connection: Connection, path: str) -> str:
+def _get_status_file(job_name: str, job_id: int, log_dir: str = ".jupyterdask") -> str:
+    # Written by the status agent started in the job, see the job script template
+    return f"{log_dir}/{job_name}-{job_id}.status.json"
+
+
+def _read_status(connection: Connection, session: SessionRecord) -> dict | None:
+    status_file = _get_status_file(session.session_id, session.job_id, session.log_dir)
+    res = connection.run(f"cat {status_file}", warn=True, hide=True)
+    if res.exited != 0:
+        return None
+    try:
+        return json.loads(res.stdout)
+    except ValueError:
+        return None
+
+
+def _get_jupyter_url(connection: Connection, session: SessionRecord) -> str | None:
+    status = _read_status(connection, session)
+    if status is not None:
+        return status["jupyter"]["url"] if "jupyter" in status else None
+    # Custom templates may not start the status agent, fall back to the job log
+    log_file = _get_log_file(session.session_id, session.job_id, session.log_dir)
     res = connection.run(
-        f"grep -A 1 'is running at:' {path} | grep -oE 'https?://.*'", hide=True
+        f"grep -A 1 'is running at:' {log_file} | grep -oE '(https?|http\\+unix)://.*'",
+        warn=True,
+        hide=True,
     )
-    return res.stdout
+    return res.stdout.strip() if res.exited == 0 and res.stdout.strip() else None
 
 
 def _parse_url(url: str) -> dict[str, Any]:
     parsed = urlparse(url)
     token = parse_qs(parsed.query).get("token", [None])[0]
-    return {"hostname": parsed.hostname, "port": parsed.port, "token": token}
+    if parsed.scheme == "http+unix":
+        # The path to the socket is URL-encoded in place of the host name
+        socket = unquote(parsed.netloc)
+        return {"hostname": None, "port": None, "socket": socket, "token": token}
+    return {
+        "hostname": parsed.hostname,
+        "port": parsed.port,
+        "socket": None,
+        "token": token,
+    }
 
 
-def _forward_port_and_open_browser(
+@contextmanager
+def _forward_jupyter(
     connection: Connection,
+    url_info: dict[str, Any],
     local_port: int,
-    remote_port: int,
-    remote_host: str,
-    token: str | None = None,
-) -> None:
-    with connection.forward_local(
-        local_port=local_port, remote_port=remote_port, remote_host=remote_host
-    ):
-        time.sleep(1)
-        _open_browser(port=local_port, token=token)
-        _wait()
+    session: SessionRecord,
+    monitor: JobMonitor,
+    connect_kwargs: dict[str, str | None],
+) -> AbstractContextManager:
+    if url_info["socket"] is None:
+        forward = LocalForward(
+            local_port=local_port,
+            remote_host=url_info["hostname"],
+            remote_port=url_info["port"],
+        )
+        tunnel = SessionTunnel(connection, forward)
+    else:
+        # Unix sockets can only be reached from the compute node itself
+        forward = LocalForward(local_port=local_port, remote_socket=url_info["socket"])
+        node_connection = Connection(
+            host=monitor.get_job(session.job_id, force=True)["node"],
+            user=connection.user,
+            connect_kwargs=connect_kwargs,
+            gateway=connection,
+        )
+        tunnel = SessionTunnel(connection, forward, node_connection=node_connection)
+    tunnel.open()
+    try:
+        yield tunnel
+    finally:
+        tunnel.close()
 
 
-def _open_browser(port: int = 8888, token: str | None = None) -> None:
-    """Launch web browser (system default) and open JupyterLab interface."""
+def _get_local_url(port: int = 8888, token: str | None = None) -> str:
     url = f"http://localhost:{port}"
     if token is not None:
         url = f"{url}/?token={token}"
-    print(f"JupyterLab URL: {url}")
+    return url
+
+
+def _open_browser(url: str) -> None:
+    """Launch web browser (system default) and open JupyterLab interface."""
     try:
         controller = webbrowser.get()
         controller.open(url)
@@ -174,6 +860,89 @@ def _open_browser(port: int = 8888, token: str | None = None) -> None:
         logger.info("Failed to open web browser.")
 
 
-def _wait():
-    while True:
-        input()
+def _get_supervisor(
+    tunnel: SessionTunnel,
+    session: SessionRecord,
+    monitor: JobMonitor,
+    sampler: SchedulerSampler,
+    follow_log: bool = False,
+) -> Supervisor:
+    supervisor = Supervisor()
+    connection = tunnel.connection
+    # Reconnecting takes as long as the connection is lost
+    supervisor.add_task(
+        "keepalive",
+        partial(tunnel.check, supervisor.stopped),
+        interval=KEEPALIVE_INTERVAL,
+        timeout=None,
+    )
+    # The other tasks are skipped while reconnecting
+    supervisor.add_task(
+        "job-check",
+        _when_connected(tunnel, partial(_check_job, monitor, session.job_id)),
+        interval=JOB_CHECK_INTERVAL,
+    )
+    supervisor.add_task(
+        "metrics",
+        _when_connected(
+            tunnel, partial(_collect_connection_metrics, connection, session)
+        ),
+        interval=METRICS_INTERVAL,
+    )
+    supervisor.add_task(
+        "scheduler-metrics",
+        _when_connected(tunnel, sampler),
+        interval=SCHEDULER_METRICS_INTERVAL,
+    )
+    if follow_log:
+        log_file = _get_log_file(session.session_id, session.job_id, session.log_dir)
+        supervisor.add_task(
+            "log",
+            _when_connected(tunnel, _LogFollower(connection, log_file)),
+            interval=LOG_FOLLOW_INTERVAL,
+        )
+    return supervisor
+
+
+def _when_connected(tunnel: SessionTunnel, func: Callable[[], None]) -> Callable:
+    def wrapper() -> None:
+        if not tunnel.connected.is_set():
+            return
+        try:
+            func()
+        except CONNECTION_ERRORS as e:
+            # The connection is checked (and restored) by the keepalive task
+            logger.info(f"Task skipped, connection lost: {e}")
+
+    return wrapper
+
+
+def _check_job(monitor: JobMonitor, job_id: int) -> None:
+    if not monitor.is_active(job_id):
+        raise SessionEndedError(f"Job {job_id} has ended.")
+
+
+def _collect_connection_metrics(connection: Connection, session: SessionRecord) -> None:
+    start_time = time.time()
+    connection.run("true", hide=True)
+    sample = {"time": start_time, "round_trip_time": time.time() - start_time}
+    with open(get_session_dir(session.session_id) / "metrics.jsonl", "a") as f:
+        f.write(json.dumps(sample) + "\n")
+
+
+class _LogFollower:
+    """Print the lines appended to a remote file since the previous call."""
+
+    def __init__(self, connection: Connection, path: str):
+        self.connection = connection
+        self.path = path
+        self.offset = 0
+
+    def __call__(self) -> None:
+        res = self.connection.run(
+            f"tail -c +{self.offset + 1} {self.path}", warn=True, hide=True
+        )
+        if res.exited != 0 or not res.stdout:
+            return
+        self.offset += len(res.stdout.encode())
+        print(res.stdout, end="", flush=True)
@@ -0,0 +1,318 @@
+import datetime
+import json
+import math
+from typing import Any
+
+from fabric import Connection
+
+from .config import ClusterConfig, get_config, parse_walltime
+from .connection import get_connect_kwargs
+from .sessions import (
+    SessionRecord,
+    get_scheduler_job_name,
+    get_session_dir,
+    get_session_start_date,
+    get_worker_job_name,
+)
+
+SACCT_FIELDS = (
+    "JobID",
+    "JobName",
+    "State",
+    "Submit",
+    "Start",
+    "Elapsed",
+    "Timelimit",
+    "NNodes",
+    "AllocCPUS",
+    "TotalCPU",
+    "ReqMem",
+    "MaxRSS",
+)
+
+MEMORY_UNITS = {"K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+# Thresholds for the right-sizing recommendations
+LOW_CPU_EFFICIENCY = 0.5
+TARGET_CPU_EFFICIENCY = 0.8
+LOW_MEMORY_USAGE = 0.5
+HIGH_MEMORY_USAGE = 0.9
+MEMORY_HEADROOM = 1.25
+LOW_WALLTIME_USAGE = 0.5
+
+
+def create_report(session: SessionRecord) -> dict[str, Any]:
+    """Create a resource-efficiency report for all the jobs of a session.
+
+    The report is stored in the local session directory.
+
+    :param session: session record
+    :return: resource usage of the Jupyter and Dask worker jobs, and recommended
+        changes to the remote cluster configuration
+    """
+    connect_kwargs = get_connect_kwargs(session.identity_file)
+    with Connection(
+        host=session.host, connect_kwargs=connect_kwargs, forward_agent=True
+    ) as conn:
+        res = conn.run(_get_sacct_command(session.session_id), hide=True)
+    jobs = parse_sacct(res.stdout)
+    worker_job_name = get_worker_job_name(session.session_id)
+    jupyter = [job for job in jobs if job["JobName"] == session.session_id]
+    workers = [job for job in jobs if job["JobName"] == worker_job_name]
+    usage = {"jupyter": summarize_usage(jupyter), "workers": summarize_usage(workers)}
+    scheduler_job_name = get_scheduler_job_name(session.session_id)
+    schedulers = [job for job in jobs if job["JobName"] == scheduler_job_name]
+    if schedulers:
+        usage["schedulers"] = summarize_usage(schedulers)
+    report = {
+        "session_id": session.session_id,
+        "host": session.host,
+        "jobs": jobs,
+        "usage": usage,
+        "recommendations": recommend_config(get_config(session.host), usage),
+    }
+    with open(get_session_dir(session.session_id) / "report.json", "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def _get_sacct_command(session_id: str) -> str:
+    start_date = get_session_start_date(session_id)
+    names = (
+        f"{session_id},{get_worker_job_name(session_id)},"
+        f"{get_scheduler_job_name(session_id)}"
+    )
+    return (
+        f"sacct --noheader --parsable2 --starttime {start_date} --name {names} "
+        f"--format {','.join(SACCT_FIELDS)}"
+    )
+
+
+def parse_sacct(output: str) -> list[dict[str, Any]]:
+    """Parse the output of sacct, merging job steps into their jobs.
+
+    :param output: sacct output obtained with `--parsable2 --noheader` and the fields
+        in `SACCT_FIELDS`
+    :return: resource usage of the jobs
+    """
+    jobs = {}
+    for line in output.splitlines():
+        record = dict(zip(SACCT_FIELDS, line.split("|"), strict=True))
+        job_id, _, step = record["JobID"].partition(".")
+        if not step:
+            alloc_cpus = int(record["AllocCPUS"])
+            nodes = int(record["NNodes"])
+            jobs[job_id] = {
+                "JobID": job_id,
+                "JobName": record["JobName"],
+                "State": record["State"].split()[0],
+                "AllocCPUS": alloc_cpus,
+                "QueueWait": _get_queue_wait(record["Submit"], record["Start"]),
+                "Elapsed": parse_walltime(record["Elapsed"]),
+                "Timelimit": _parse_timelimit(record["Timelimit"]),
+                "TotalCPU": _parse_cpu_time(record["TotalCPU"]),
+                "ReqMem": _parse_req_mem(record["ReqMem"], alloc_cpus, nodes),
+                "MaxRSS": parse_memory(record["MaxRSS"]),
+            }
+        elif job_id in jobs:
+            # Memory usage is only measured for the job steps
+            steps_rss = parse_memory(record["MaxRSS"])
+            jobs[job_id]["MaxRSS"] = max(jobs[job_id]["MaxRSS"], steps_rss)
+    return list(jobs.values())
+
+
+def summarize_usage(jobs: list[dict[str, Any]]) -> dict[str, Any] | None:
+    """Compute the resource efficiency of a group of jobs.
+
+    :param jobs: resource usage of the jobs, as returned by `parse_sacct`
+    :return: CPU efficiency, peak memory usage, queue wait and unused walltime, or None
+        if no job has run
+    """
+    jobs = [job for job in jobs if job["Elapsed"] > 0]
+    if not jobs:
+        return None
+    core_seconds = sum(job["Elapsed"] * job["AllocCPUS"] for job in jobs)
+    cpu_seconds = sum(job["TotalCPU"] for job in jobs)
+    timelimits = [job["Timelimit"] for job in jobs if job["Timelimit"] is not None]
+    unused_walltime = [
+        job["Timelimit"] - job["Elapsed"]
+        for job in jobs
+        if job["Timelimit"] is not None
+    ]
+    # MaxRSS is empty if the memory usage of the job has not been measured
+    memory_usage = [
+        job["MaxRSS"] / job["ReqMem"]
+        for job in jobs
+        if job["ReqMem"] > 0 and job["MaxRSS"] > 0
+    ]
+    return {
+        "jobs": len(jobs),
+        "timeouts": sum(job["State"] == "TIMEOUT" for job in jobs),
+        "out_of_memory": sum(job["State"] == "OUT_OF_MEMORY" for job in jobs),
+        "alloc_cpus": max(job["AllocCPUS"] for job in jobs),
+        "cpu_efficiency": cpu_seconds / core_seconds,
+        "peak_rss": max(job["MaxRSS"] for job in jobs),
+        "req_mem": max(job["ReqMem"] for job in jobs),
+        "peak_memory_usage": max(memory_usage, default=None),
+        "max_queue_wait": max(job["QueueWait"] for job in jobs),
+        "max_elapsed": max(job["Elapsed"] for job in jobs),
+        "max_timelimit": max(timelimits, default=None),
+        "unused_walltime": sum(unused_walltime),
+    }
+
+
+def recommend_config(
+    config: ClusterConfig, usage: dict[str, dict[str, Any] | None]
+) -> dict[str, Any]:
+    """Recommend changes to the remote cluster configuration based on resource usage.
+
+    :param config: current remote cluster configuration
+    :param usage: resource usage of the Jupyter and worker jobs, as returned by
+        `summarize_usage`
+    :return: recommended values of the remote cluster configuration fields
+    """
+    recommendations = {}
+    jupyter, workers = usage["jupyter"], usage["workers"]
+    if jupyter is not None:
+        cores = _recommend_cores(jupyter)
+        if cores is not None and cores != config.cores:
+            recommendations["cores"] = cores
+        walltime = _recommend_walltime(jupyter)
+        if walltime is not None and walltime != config.walltime:
+            recommendations["walltime"] = walltime
+    if workers is not None:
+        # Dask workers share the cores of a job among processes
+        cores = _recommend_cores(workers)
+        if cores is not None:
+            cores = max(cores, config.worker_processes)
+        if cores is not None and cores != config.worker_cores:
+            recommendations["worker_cores"] = cores
+        memory = _recommend_memory(workers)
+        if memory is not None:
+            recommendations["worker_memory"] = memory
+    return recommendations
+
+
+def _recommend_cores(usage: dict[str, Any]) -> int | None:
+    if usage["cpu_efficiency"] >= LOW_CPU_EFFICIENCY:
+        return None
+    used_cores = usage["alloc_cpus"] * usage["cpu_efficiency"]
+    return max(1, math.ceil(used_cores / TARGET_CPU_EFFICIENCY))
+
+
+def _recommend_memory(usage: dict[str, Any]) -> str | None:
+    memory_usage = usage["peak_memory_usage"]
+    if memory_usage is None:
+        return None
+    if usage["out_of_memory"] == 0 and (
+        LOW_MEMORY_USAGE <= memory_usage <= HIGH_MEMORY_USAGE
+    ):
+        return None
+    if usage["out_of_memory"] > 0:
+        memory = usage["req_mem"] * 2
+    else:
+        memory = usage["peak_rss"] * MEMORY_HEADROOM
+    return f"{math.ceil(memory / MEMORY_UNITS['G'])}GiB"
+
+
+def _recommend_walltime(usage: dict[str, Any]) -> str | None:
+    timelimit = usage["max_timelimit"]
+    if timelimit is None:
+        return None
+    if usage["timeouts"] > 0:
+        walltime = timelimit * 2
+    elif usage["max_elapsed"] < LOW_WALLTIME_USAGE * timelimit:
+        # Shorter jobs are more easily backfilled by the scheduler
+        walltime = usage["max_elapsed"] * 1.5
+    else:
+        return None
+    # Round up to 15 minutes
+    minutes = max(15, math.ceil(walltime / 900) * 15)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def print_report(report: dict[str, Any]) -> None:
+    """Print a resource-efficiency report.
+
+    :param report: report, as returned by `create_report`
+    """
+    print(f"Session {report['session_id']} on {report['host']}")
+    for role, usage in report["usage"].items():
+        if usage is None:
+            print(f"  {role}: no job has run")
+            continue
+        print(f"  {role} ({usage['jobs']} job(s)):")
+        print(f"    CPU efficiency: {usage['cpu_efficiency']:.0%}")
+        peak_rss = usage["peak_rss"] / MEMORY_UNITS["G"]
+        req_mem = usage["req_mem"] / MEMORY_UNITS["G"]
+        print(f"    Peak memory: {peak_rss:.1f} GiB of {req_mem:.1f} GiB requested")
+        print(f"    Max queue wait: {_format_seconds(usage['max_queue_wait'])}")
+        print(f"    Unused walltime: {_format_seconds(usage['unused_walltime'])}")
+    if report["recommendations"]:
+        print("  Recommended configuration:")
+        for field, value in report["recommendations"].items():
+            print(f"    {field}={value!r}")
+    else:
+        print("  The current configuration fits the resource usage.")
+
+
+def parse_memory(value: str) -> int:
+    """Convert a sacct memory value (e.g. "1234K", "2.5G") to bytes.
+
+    :param value: memory value, without unit for bytes
+    :return: number of bytes
+    """
+    if not value:
+        return 0
+    unit = value[-1].upper()
+    if unit in MEMORY_UNITS:
+        return int(float(value[:-1]) * MEMORY_UNITS[unit])
+    return int(float(value))
+
+
+def _parse_req_mem(value: str, alloc_cpus: int, nodes: int) -> int:
+    # Older SLURM versions mark memory per CPU ("c") or per node ("n")
+    if value.endswith("c"):
+        return parse_memory(value[:-1]) * alloc_cpus
+    if value.endswith("n"):
+        return parse_memory(value[:-1]) * nodes
+    return parse_memory(value)
+
+
+def _parse_timelimit(value: str) -> int | None:
+    if not value[:1].isdigit():
+        # e.g. "UNLIMITED" or "Partition_Limit"
+        return None
+    return parse_walltime(value)
+
+
+def parse_sacct_time(value: str) -> datetime.datetime | None:
+    """Parse a time reported by sacct.
+
+    :param value: time in ISO format
+    :return: the time, None if not (yet) defined, e.g. "Unknown" or "None"
+    """
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _parse_cpu_time(value: str) -> float:
+    # TotalCPU may include fractions of seconds, e.g. "01:02.345"
+    time, _, fraction = value.partition(".")
+    seconds = parse_walltime(time) if ":" in time else 0
+    return seconds + float(f"0.{fraction or 0}")
+
+
+def _get_queue_wait(submit: str, start: str) -> int:
+    submit_time, start_time = parse_sacct_time(submit), parse_sacct_time(start)
+    if submit_time is None or start_time is None:
+        return 0
+    return int((start_time - submit_time).total_seconds())
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,181 @@
+"""Publish the status of a session job as a JSON document.
+
+This script is uploaded to the remote cluster and runs next to JupyterLab in the
+Jupyter job. It periodically writes the status document to a file in the log
+directory, which `jupyterdask` reads over its SSH connection. The document includes
+the URL of the Jupyter server (once it is running), the number of kernels, the Dask
+clusters created via the Dask JupyterLab extension, and the CPU, memory and I/O use
+of the node.
+"""
+
+import argparse
+import glob
+import http.client
+import json
+import os
+import socket
+import time
+from urllib.parse import unquote, urlparse
+
+REQUEST_TIMEOUT = 5
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__("localhost", timeout=REQUEST_TIMEOUT)
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(REQUEST_TIMEOUT)
+        self.sock.connect(self.path)
+
+
+def run(status_file: str, runtime_dir: str, interval: float) -> None:
+    """Write the status document periodically.
+
+    :param status_file: path to the status file
+    :param runtime_dir: Jupyter runtime directory, where the server info is found
+    :param interval: time (in seconds) between two updates
+    """
+    previous = _read_counters()
+    while True:
+        time.sleep(interval)
+        current = _read_counters()
+        status = {
+            "time": time.time(),
+            "hostname": socket.gethostname(),
+            "job_id": os.environ.get("SLURM_JOB_ID"),
+            "node": _get_node_usage(previous, current),
+        }
+        previous = current
+        server = _get_server_info(runtime_dir)
+        if server is not None:
+            status["jupyter"] = {
+                "url": f"{server['url']}?token={server['token']}",
+                "version": server.get("version"),
+                "kernels": _get_kernel_count(server),
+            }
+            status["dask"] = _get_dask_clusters(server)
+        _write_status(status_file, status)
+
+
+def _get_server_info(runtime_dir: str) -> dict | None:
+    for path in glob.glob(os.path.join(runtime_dir, "jpserver-*.json")):
+        try:
+            with open(path) as f:
+                server = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if os.path.exists(f"/proc/{server['pid']}"):
+            return server
+    return None
+
+
+def _request(server: dict, path: str):
+    url = urlparse(server["url"])
+    if url.scheme == "http+unix":
+        conn = _UnixHTTPConnection(unquote(url.netloc))
+    else:
+        conn = http.client.HTTPConnection(
+            url.hostname, url.port, timeout=REQUEST_TIMEOUT
+        )
+    try:
+        conn.request(
+            "GET",
+            f"{server['base_url'].rstrip('/')}{path}",
+            headers={"Authorization": f"token {server['token']}"},
+        )
+        response = conn.getresponse()
+        if response.status != 200:
+            return None
+        return json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def _get_kernel_count(server: dict) -> int | None:
+    try:
+        kernels = _request(server, "/api/kernels")
+    except (OSError, ValueError, http.client.HTTPException):
+        return None
+    return len(kernels) if kernels is not None else None
+
+
+def _get_dask_clusters(server: dict) -> list[dict]:
+    # REST API of the Dask JupyterLab extension
+    try:
+        clusters = _request(server, "/dask/clusters") or []
+    except (OSError, ValueError, http.client.HTTPException):
+        return []
+    return [
+        {
+            "name": cluster.get("name"),
+            "scheduler_address": cluster.get("scheduler_address"),
+            "dashboard_link": cluster.get("dashboard_link"),
+            "workers": cluster.get("workers"),
+        }
+        for cluster in clusters
+    ]
+
+
+def _read_counters() -> dict:
+    with open("/proc/stat") as f:
+        cpu_times = [int(v) for v in f.readline().split()[1:]]
+    sectors_read = sectors_written = 0
+    disks = set(os.listdir("/sys/block"))
+    with open("/proc/diskstats") as f:
+        for line in f:
+            fields = line.split()
+            # Only whole disks, as partitions are included in their disks
+            if fields[2] in disks and not fields[2].startswith(("loop", "ram")):
+                sectors_read += int(fields[5])
+                sectors_written += int(fields[9])
+    return {
+        "time": time.time(),
+        "cpu_idle": cpu_times[3] + cpu_times[4],
+        "cpu_total": sum(cpu_times),
+        "read_bytes": sectors_read * 512,
+        "write_bytes": sectors_written * 512,
+    }
+
+
+def _get_node_usage(previous: dict, current: dict) -> dict:
+    elapsed = current["time"] - previous["time"]
+    cpu_total = current["cpu_total"] - previous["cpu_total"]
+    cpu_idle = current["cpu_idle"] - previous["cpu_idle"]
+    memory = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, value = line.split(":")
+            memory[key] = int(value.split()[0]) * 2**10
+    return {
+        "cpus": os.cpu_count(),
+        "load_average": os.getloadavg()[0],
+        "cpu_usage": 1 - cpu_idle / cpu_total if cpu_total > 0 else None,
+        "memory_total": memory["MemTotal"],
+        "memory_available": memory["MemAvailable"],
+        "read_rate": (current["read_bytes"] - previous["read_bytes"]) / elapsed,
+        "write_rate": (current["write_bytes"] - previous["write_bytes"]) / elapsed,
+    }
+
+
+def _write_status(status_file: str, status: dict) -> None:
+    # The status file is read from the login node, so it is replaced atomically
+    tmp_file = f"{status_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp_file, status_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--status-file", required=True, help="status file path.")
+    parser.add_argument(
+        "--runtime-dir",
+        default=os.environ.get("JUPYTER_RUNTIME_DIR"),
+        help="Jupyter runtime directory.",
+    )
+    parser.add_argument("--interval", type=float, default=5, help="update interval.")
+    args = parser.parse_args()
+    run(args.status_file, args.runtime_dir, args.interval)
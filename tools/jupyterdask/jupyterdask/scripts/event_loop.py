@@ -0,0 +1,70 @@
+"""Measure the latency of the event loop of the Dask scheduler.
+
+This script is uploaded to the remote cluster and loaded as a scheduler preload (see
+`distributed.scheduler.preload`) by the schedulers of a session. A callback is
+scheduled on the event loop at a fixed interval, and the delay with which it runs is
+the time the loop was busy, e.g. handling a large task graph. The mean and maximum
+latency over the last minute are served as JSON next to the other routes of the
+dashboard, at `/json/event-loop.json`, where `jupyterdask` samples them.
+"""
+
+import time
+from collections import deque
+
+from tornado.ioloop import PeriodicCallback
+from tornado.web import RequestHandler
+
+INTERVAL = 100  # ms
+WINDOW = 60  # s
+
+
+class EventLoopMonitor:
+    """Record the latency of the event loop of the current thread."""
+
+    def __init__(self):
+        """Set up the monitor, which is not started yet."""
+        self.latencies = deque()
+        self._last = None
+
+    def tick(self) -> None:
+        """Record the delay since the expected time of the callback."""
+        now = time.monotonic()
+        if self._last is not None:
+            latency = max(0.0, now - self._last - INTERVAL / 1000)
+            self.latencies.append((now, latency))
+        self._last = now
+        while self.latencies and self.latencies[0][0] < now - WINDOW:
+            self.latencies.popleft()
+
+    def summary(self) -> dict:
+        """Summarize the latencies measured over the last minute.
+
+        :return: mean and maximum latency (in seconds)
+        """
+        latencies = [latency for _, latency in self.latencies]
+        if not latencies:
+            return {"mean": None, "max": None}
+        return {"mean": sum(latencies) / len(latencies), "max": max(latencies)}
+
+
+class _EventLoopHandler(RequestHandler):
+    def initialize(self, monitor: EventLoopMonitor) -> None:
+        self.monitor = monitor
+
+    def get(self) -> None:
+        self.write(self.monitor.summary())
+
+
+def dask_setup(scheduler) -> None:
+    """Start measuring the event loop latency (preload entry point).
+
+    :param scheduler: the Dask scheduler
+    """
+    monitor = EventLoopMonitor()
+    callback = PeriodicCallback(monitor.tick, INTERVAL)
+    scheduler.periodic_callbacks["jupyterdask-event-loop"] = callback
+    callback.start()
+    if scheduler.http_application is not None:
+        scheduler.http_application.add_handlers(
+            r".*", [(r"/json/event-loop.json", _EventLoopHandler, {"monitor": monitor})]
+        )
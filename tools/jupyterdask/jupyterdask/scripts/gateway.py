@@ -0,0 +1,383 @@
+"""Serve per-user Dask clusters from a long-running job shared by a team.
+
+This script is uploaded to the remote cluster and runs in the job started by
+`jupyterdask gateway`, in place of JupyterLab. It serves a small HTTP API, in the
+spirit of Dask Gateway, to create, scale and close Dask clusters on behalf of the
+members of a team (see the `jupyterdask_gateway` module, used by their sessions). The
+clusters are created in this process with the cluster factory of the Dask JupyterLab
+extension, i.e. from the configuration of the remote cluster, so that their
+schedulers start in seconds instead of waiting for a job in the queue. The number of
+clusters and workers of each user is limited, and the clusters without tasks are
+closed after a timeout.
+
+The address of the gateway is written to a file, to be shared with the team. Each
+member gets a token of their own from the gateway, which identifies them in the
+requests: the member proves who they are by creating a file named after a challenge
+of the gateway, in a directory next to the gateway file that only the group of the
+team can write to, and the owner of the file is the user of the token.
+
+The gateway can be tried on a local machine with a `distributed.LocalCluster`
+factory, e.g. by setting `DASK_LABEXTENSION__FACTORY__MODULE=distributed` and
+`DASK_LABEXTENSION__FACTORY__CLASS=LocalCluster`.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import pwd
+import secrets
+import shutil
+import signal
+import socket
+import stat
+import time
+
+import dask
+from distributed.core import Status
+from tornado import netutil, web
+from tornado.httpserver import HTTPServer
+
+# Interval (in seconds) between two checks of the idle clusters
+CULL_INTERVAL = 60
+
+# Time (in seconds) left to answer an authentication challenge
+CHALLENGE_TIMEOUT = 60
+
+
+class Gateway:
+    """Dask clusters of all the users, with the limits applied to each user."""
+
+    def __init__(
+        self,
+        max_clusters: int,
+        max_workers: int,
+        auth_dir: str,
+        idle_timeout: float | None = None,
+    ):
+        """Set up the gateway without clusters.
+
+        :param max_clusters: maximum number of clusters of each user
+        :param max_workers: maximum number of workers of each user, over all clusters
+        :param auth_dir: path to the directory where the users answer the
+            authentication challenges
+        :param idle_timeout: time (in seconds) after which a cluster without tasks is
+            closed, never by default
+        """
+        self.max_clusters = max_clusters
+        self.max_workers = max_workers
+        self.auth_dir = auth_dir
+        self.idle_timeout = idle_timeout
+        self.clusters: dict[str, dict] = {}
+        self.tokens: dict[str, str] = {}
+        self.challenges: dict[str, float] = {}
+
+    def challenge(self) -> dict:
+        """Start the authentication of a user.
+
+        The user answers by creating a file named after the challenge, and containing
+        it, in the authentication directory.
+
+        :return: challenge and path of the file to create
+        """
+        now = time.time()
+        self.challenges = {c: t for c, t in self.challenges.items() if t > now}
+        challenge = secrets.token_hex(16)
+        self.challenges[challenge] = now + CHALLENGE_TIMEOUT
+        return {"challenge": challenge, "path": os.path.join(self.auth_dir, challenge)}
+
+    def issue_token(self, challenge: str) -> dict:
+        """Issue a token to the owner of the file answering a challenge.
+
+        :param challenge: challenge answered
+        :return: token and user name
+        """
+        if self.challenges.pop(challenge, 0) < time.time():
+            raise web.HTTPError(403, reason="Invalid or expired challenge")
+        try:
+            # Links are not followed, their owner is not the one of the target
+            fd = os.open(
+                os.path.join(self.auth_dir, challenge), os.O_RDONLY | os.O_NOFOLLOW
+            )
+            with os.fdopen(fd) as f:
+                info = os.fstat(f.fileno())
+                answer = f.read(len(challenge) + 1)
+        except OSError:
+            raise web.HTTPError(403, reason="Challenge not answered") from None
+        if not stat.S_ISREG(info.st_mode) or answer.strip() != challenge:
+            raise web.HTTPError(403, reason="Invalid answer to the challenge")
+        user = pwd.getpwuid(info.st_uid).pw_name
+        token = secrets.token_hex(32)
+        self.tokens[token] = user
+        print(f"Issued a token to {user}", flush=True)
+        return {"token": token, "user": user}
+
+    def get_clusters(self, user: str) -> list[dict]:
+        """List the clusters of a user.
+
+        :param user: user name
+        :return: cluster records
+        """
+        return [c for c in self.clusters.values() if c["user"] == user]
+
+    def get_cluster(self, user: str, name: str) -> dict:
+        """Get a cluster of a user.
+
+        :param user: user name
+        :param name: cluster name
+        :return: cluster record
+        """
+        record = self.clusters.get(name)
+        if record is None or record["user"] != user:
+            raise web.HTTPError(404, reason=f"Cluster not found: {name}")
+        return record
+
+    async def create(self, user: str) -> dict:
+        """Create a cluster without workers for a user.
+
+        :param user: user name
+        :return: cluster record
+        """
+        if len(self.get_clusters(user)) >= self.max_clusters:
+            raise web.HTTPError(
+                403, reason=f"Limit of {self.max_clusters} clusters per user reached"
+            )
+        factory = dask.config.get("labextension.factory")
+        cls = getattr(importlib.import_module(factory["module"]), factory["class"])
+        cluster = await cls(asynchronous=True, **factory.get("kwargs", {}))
+        name = f"{user}-{secrets.token_hex(4)}"
+        self.clusters[name] = {
+            "name": name,
+            "user": user,
+            "cluster": cluster,
+            "workers": 0,
+            "adapt": None,
+            "adaptive": None,
+            "idle_since": time.time(),
+        }
+        print(f"Created cluster {name}: {cluster.scheduler_address}", flush=True)
+        return self.clusters[name]
+
+    def scale(
+        self,
+        record: dict,
+        workers: int | None = None,
+        adapt: dict[str, int] | None = None,
+    ) -> None:
+        """Scale a cluster to a number of workers, or let it adapt to the load.
+
+        :param record: cluster record
+        :param workers: number of workers
+        :param adapt: minimum and maximum numbers of workers, the maximum defaults to
+            the number of workers left to the user
+        """
+        others = sum(
+            max(c["workers"], (c["adapt"] or {}).get("maximum", 0))
+            for c in self.get_clusters(record["user"])
+            if c is not record
+        )
+        available = self.max_workers - others
+        if adapt is not None:
+            adapt = {
+                "minimum": adapt.get("minimum") or 0,
+                "maximum": adapt.get("maximum") or available,
+            }
+            requested = adapt["maximum"]
+        else:
+            requested = workers
+        if requested > available:
+            raise web.HTTPError(
+                403, reason=f"Limit of {self.max_workers} workers per user reached"
+            )
+        cluster = record["cluster"]
+        if record["adaptive"] is not None:
+            record["adaptive"].stop()
+            record["adaptive"] = None
+        if adapt is not None:
+            record["adaptive"] = cluster.adapt(**adapt)
+        else:
+            cluster.scale(workers)
+        record["workers"] = workers or 0
+        record["adapt"] = adapt
+
+    async def close(self, record: dict) -> None:
+        """Close a cluster and cancel its workers.
+
+        :param record: cluster record
+        """
+        self.clusters.pop(record["name"], None)
+        await record["cluster"].close()
+        print(f"Closed cluster {record['name']}", flush=True)
+
+    async def cull(self) -> None:
+        """Close the clusters that have been without tasks for too long."""
+        now = time.time()
+        for record in list(self.clusters.values()):
+            scheduler = record["cluster"].scheduler
+            if scheduler.status in (Status.closing, Status.closed):
+                await self.close(record)
+            elif scheduler.tasks:
+                record["idle_since"] = now
+            elif self.idle_timeout and now - record["idle_since"] > self.idle_timeout:
+                await self.close(record)
+
+    async def close_all(self) -> None:
+        """Close all the clusters."""
+        for record in list(self.clusters.values()):
+            await self.close(record)
+
+
+def get_model(record: dict) -> dict:
+    """Describe a cluster in the responses of the API.
+
+    :param record: cluster record
+    :return: name, scheduler address and requested workers of the cluster
+    """
+    return {
+        "name": record["name"],
+        "scheduler_address": record["cluster"].scheduler_address,
+        "workers": record["workers"],
+        "adapt": record["adapt"],
+    }
+
+
+class TokenHandler(web.RequestHandler):
+    """API to issue a token to a user, once they have answered a challenge."""
+
+    def initialize(self, gateway: Gateway) -> None:
+        """Set the gateway serving the requests."""
+        self.gateway = gateway
+
+    def post(self, challenge: str = "") -> None:
+        """Start the authentication of a user."""
+        self.write(self.gateway.challenge())
+
+    def put(self, challenge: str) -> None:
+        """Issue a token to the user who has answered a challenge."""
+        self.write(self.gateway.issue_token(challenge))
+
+
+class ClusterHandler(web.RequestHandler):
+    """API to manage the clusters of the user making the request."""
+
+    def initialize(self, gateway: Gateway) -> None:
+        """Set the gateway serving the requests."""
+        self.gateway = gateway
+
+    def prepare(self) -> None:
+        """Authenticate the request, the user is the one of the token."""
+        token = self.request.headers.get("Authorization", "").removeprefix("token ")
+        self.user = self.gateway.tokens.get(token)
+        if self.user is None:
+            raise web.HTTPError(403, reason="Invalid token")
+
+    def get(self, name: str = "") -> None:
+        """List the clusters of the user, or get one of them."""
+        if name:
+            self.write(get_model(self.gateway.get_cluster(self.user, name)))
+        else:
+            clusters = self.gateway.get_clusters(self.user)
+            self.write({"clusters": [get_model(c) for c in clusters]})
+
+    async def post(self, name: str = "") -> None:
+        """Create a cluster."""
+        self.write(get_model(await self.gateway.create(self.user)))
+
+    def patch(self, name: str) -> None:
+        """Scale a cluster, or let it adapt to the load."""
+        record = self.gateway.get_cluster(self.user, name)
+        body = json.loads(self.request.body or "{}")
+        if "adapt" in body:
+            self.gateway.scale(record, adapt=body["adapt"])
+        elif "workers" in body:
+            self.gateway.scale(record, workers=int(body["workers"]))
+        else:
+            raise web.HTTPError(400, reason="Missing number of workers")
+        self.write(get_model(record))
+
+    async def delete(self, name: str) -> None:
+        """Close a cluster."""
+        await self.gateway.close(self.gateway.get_cluster(self.user, name))
+        self.write({})
+
+
+def write_gateway_file(path: str, address: str, auth_dir: str) -> None:
+    """Publish the address of the gateway and its authentication directory.
+
+    The file is readable by the group, so that it can be shared with the team by
+    placing it in a directory of the team.
+
+    :param path: path to the file
+    :param address: URL of the gateway
+    :param auth_dir: path to the directory where the users answer the
+        authentication challenges
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o640)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"address": address, "auth_dir": auth_dir}, f)
+    os.replace(tmp_path, path)
+
+
+async def serve(gateway: Gateway, port: int, gateway_file: str) -> None:
+    """Serve the API until the process is terminated.
+
+    :param gateway: the gateway
+    :param port: port where to listen, a free one if 0
+    :param gateway_file: path where to publish the address
+    """
+    app = web.Application(
+        [
+            (r"/tokens/?([^/]*)", TokenHandler, {"gateway": gateway}),
+            (r"/clusters/?([^/]*)", ClusterHandler, {"gateway": gateway}),
+        ]
+    )
+    # Only the group can answer the challenges, and only remove their own answers
+    os.makedirs(gateway.auth_dir, exist_ok=True)
+    os.chmod(gateway.auth_dir, 0o1770)
+    sockets = netutil.bind_sockets(port)
+    server = HTTPServer(app)
+    server.add_sockets(sockets)
+    address = f"http://{socket.gethostname()}:{sockets[0].getsockname()[1]}"
+    write_gateway_file(gateway_file, address, os.path.abspath(gateway.auth_dir))
+    print(f"Gateway listening on: {address}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), CULL_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await gateway.cull()
+            except Exception as e:
+                print(f"Failed to close the idle clusters: {e}", flush=True)
+    finally:
+        server.stop()
+        await gateway.close_all()
+        if os.path.exists(gateway_file):
+            os.remove(gateway_file)
+        shutil.rmtree(gateway.auth_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=0, help="port where to listen.")
+    parser.add_argument("--gateway-file", required=True, help="address file path.")
+    parser.add_argument("--max-clusters", type=int, default=2, help="per user.")
+    parser.add_argument("--max-workers", type=int, default=16, help="per user.")
+    parser.add_argument("--idle-timeout", type=float, help="seconds without tasks.")
+    args = parser.parse_args()
+    gateway = Gateway(
+        args.max_clusters,
+        args.max_workers,
+        f"{args.gateway_file}.auth",
+        idle_timeout=args.idle_timeout,
+    )
+    asyncio.run(serve(gateway, args.port, args.gateway_file))
@@ -0,0 +1,69 @@
+"""Print the name of the fastest network interface of the node.
+
+This script is uploaded to the remote cluster and run by the Jupyter job when the
+network interface of the Dask clusters is set to "auto". The interfaces listed by
+`ip -j addr` that are up and have a global IPv4 address are ranked by link type
+(InfiniBand first, as IP over InfiniBand reports no speed) and then by link speed.
+Nothing is printed if no such interface is found, e.g. if `ip` is not available.
+"""
+
+import json
+import subprocess
+
+
+def get_interfaces() -> list[dict]:
+    """List the network interfaces of the node that can reach other nodes.
+
+    :return: name, link type and speed (in Mb/s, 0 if unknown) of the interfaces
+    """
+    try:
+        res = subprocess.run(
+            ["ip", "-j", "addr"], capture_output=True, text=True, check=True
+        )
+        links = json.loads(res.stdout)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return []
+    interfaces = []
+    for link in links:
+        if "UP" not in link.get("flags", []) or "LOOPBACK" in link.get("flags", []):
+            continue
+        addresses = link.get("addr_info", [])
+        if not any(a["family"] == "inet" and a["scope"] == "global" for a in addresses):
+            continue
+        interfaces.append(
+            {
+                "name": link["ifname"],
+                "link_type": link.get("link_type"),
+                "speed": _get_speed(link["ifname"]),
+            }
+        )
+    return interfaces
+
+
+def _get_speed(name: str) -> int:
+    # Reading the speed fails for some link types (e.g. virtual interfaces)
+    try:
+        with open(f"/sys/class/net/{name}/speed") as f:
+            return max(int(f.read()), 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def get_fastest_interface() -> str | None:
+    """Find out the fastest network interface of the node.
+
+    :return: the name of the interface, None if no interface is found
+    """
+    interfaces = get_interfaces()
+    if not interfaces:
+        return None
+    fastest = max(
+        interfaces, key=lambda i: (i["link_type"] == "infiniband", i["speed"])
+    )
+    return fastest["name"]
+
+
+if __name__ == "__main__":
+    interface = get_fastest_interface()
+    if interface is not None:
+        print(interface)
@@ -0,0 +1,20 @@
+"""Configuration of the Jupyter server when the Dask schedulers run in their own jobs.
+
+This file is uploaded to the remote cluster and loaded by the Jupyter server, which
+finds it in the scripts directory added to `JUPYTER_CONFIG_PATH` by the job script.
+The dashboards of the schedulers are then served by other nodes, which the Jupyter
+server proxy only reaches if they are allowed: the nodes of the cluster are reached
+via private addresses.
+"""
+
+import ipaddress
+
+
+def _is_allowed(handler, host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_private
+    except ValueError:
+        return host == "localhost"
+
+
+c.ServerProxy.host_allowlist = _is_allowed  # noqa: F821
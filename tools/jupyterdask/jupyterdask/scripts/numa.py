@@ -0,0 +1,68 @@
+"""Bind the Dask worker processes of a job to the NUMA domains of the node.
+
+This script is uploaded to the remote cluster and loaded as a worker preload (see
+`distributed.worker.preload`) by the Dask worker jobs. The worker processes of a job
+are numbered by the suffix of their names (`<job name>-<index>`), and each process
+is bound to the CPUs of one NUMA domain (round-robin over the domains), within the
+CPUs allocated to the job by SLURM. Memory is allocated on the NUMA domain of the
+CPU that first touches it, so binding the CPUs also keeps the data of each worker
+local to its domain.
+"""
+
+import glob
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+NODES_DIR = "/sys/devices/system/node"
+
+
+def get_numa_domains() -> list[set[int]]:
+    """List the CPUs of each NUMA domain of the node available to the process.
+
+    :return: the CPUs of each domain, leaving out domains without allocated CPUs
+    """
+    allocated = os.sched_getaffinity(0)
+    domains = []
+    paths = glob.glob(os.path.join(NODES_DIR, "node[0-9]*", "cpulist"))
+    for path in sorted(paths, key=lambda p: int(re.findall(r"\d+", p)[-1])):
+        with open(path) as f:
+            cpus = _parse_cpulist(f.read()) & allocated
+        if cpus:
+            domains.append(cpus)
+    return domains
+
+
+def _parse_cpulist(cpulist: str) -> set[int]:
+    cpus = set()
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def _bind_process(cpus: set[int]) -> None:
+    # Threads that are already running keep their affinity, so all of them are bound
+    for tid in os.listdir("/proc/self/task"):
+        try:
+            os.sched_setaffinity(int(tid), cpus)
+        except OSError:
+            pass
+
+
+def dask_setup(worker) -> None:
+    """Bind the worker process to a NUMA domain (preload entry point).
+
+    :param worker: the Dask worker
+    """
+    match = re.search(r"-(\d+)$", str(worker.name))
+    domains = get_numa_domains()
+    if match is None or len(domains) < 2:
+        return
+    index = int(match.group(1)) % len(domains)
+    _bind_process(domains[index])
+    logger.info("Bound worker %s to NUMA domain %d", worker.name, index)
@@ -0,0 +1,127 @@
+"""Record a Dask performance report for each computation run on the scheduler.
+
+This script is uploaded to the remote cluster and loaded as a scheduler preload (see
+`distributed.scheduler.preload`) by the schedulers started in the Jupyter job. A
+computation starts when a graph is submitted to an idle scheduler and ends when no
+task is left to run. For each computation, the HTML performance report and a
+snapshot of the task stream (gzipped JSON) are written to the directory given by the
+`JUPYTERDASK_REPORTS_DIR` environment variable, and a line is appended to the index
+of the directory (`index.jsonl`).
+"""
+
+import asyncio
+import datetime
+import gzip
+import json
+import logging
+import os
+import time
+
+from distributed.diagnostics.plugin import SchedulerPlugin
+from distributed.diagnostics.task_stream import TaskStreamPlugin
+from tornado.ioloop import PeriodicCallback
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 1000  # ms
+INDEX_FILE = "index.jsonl"
+
+
+class PerformanceReportPlugin(SchedulerPlugin):
+    """Write a performance report when a computation ends."""
+
+    name = "jupyterdask-performance-report"
+
+    def __init__(self, scheduler, directory: str):
+        """Set up the plugin.
+
+        :param scheduler: the Dask scheduler
+        :param directory: path where to write the reports
+        """
+        self.scheduler = scheduler
+        self.directory = directory
+        self.computation_start = None
+        self.last_count = None
+        self.last_index = None
+        self.writing = False
+
+    @property
+    def task_stream(self) -> TaskStreamPlugin:
+        """Plugin recording the task stream of the scheduler."""
+        return self.scheduler.plugins[TaskStreamPlugin.name]
+
+    def update_graph(self, scheduler, *args, **kwargs) -> None:
+        """Start a computation, unless one is running already."""
+        if self.computation_start is None:
+            self.computation_start = time.time()
+            self.last_count = scheduler.monitor.count
+            self.last_index = self.task_stream.index
+
+    def check(self) -> None:
+        """End the current computation if no task is left to run."""
+        if self.computation_start is None or self.writing or not self._is_idle():
+            return
+        if self.task_stream.index == self.last_index:
+            # No task has run, e.g. all results were already in memory
+            self.computation_start = None
+            return
+        self.writing = True
+        asyncio.ensure_future(self._write_report())
+
+    def _is_idle(self) -> bool:
+        if getattr(self.scheduler, "queued", None):
+            return False
+        return not any(ws.processing for ws in self.scheduler.workers.values())
+
+    def _get_code(self) -> str:
+        computations = getattr(self.scheduler, "computations", None)
+        if not computations:
+            return ""
+        return "\n\n".join(computations[-1].code)
+
+    async def _write_report(self) -> None:
+        start, stop = self.computation_start, time.time()
+        try:
+            tasks = self.task_stream.index - self.last_index
+            code = self._get_code()
+            html = await self.scheduler.performance_report(
+                start=start, last_count=self.last_count, code=code
+            )
+            task_stream = self.task_stream.collect(start=start, stop=stop)
+            os.makedirs(self.directory, exist_ok=True)
+            name = datetime.datetime.fromtimestamp(start).strftime("%Y-%m-%dT%H-%M-%S")
+            with open(os.path.join(self.directory, f"{name}.html"), "w") as f:
+                f.write(html)
+            task_stream_file = os.path.join(self.directory, f"{name}-tasks.json.gz")
+            with gzip.open(task_stream_file, "wt") as f:
+                json.dump(task_stream, f, default=str)
+            entry = {
+                "report": f"{name}.html",
+                "task_stream": f"{name}-tasks.json.gz",
+                "start": start,
+                "stop": stop,
+                "tasks": tasks,
+                "code": code[:1000],
+            }
+            with open(os.path.join(self.directory, INDEX_FILE), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except Exception:
+            logger.exception("Failed to write the performance report")
+        finally:
+            self.computation_start = None
+            self.writing = False
+
+
+def dask_setup(scheduler) -> None:
+    """Register the plugin on the scheduler (preload entry point).
+
+    :param scheduler: the Dask scheduler
+    """
+    directory = os.environ.get("JUPYTERDASK_REPORTS_DIR", "dask-reports")
+    if TaskStreamPlugin.name not in scheduler.plugins:
+        scheduler.add_plugin(TaskStreamPlugin(scheduler))
+    plugin = PerformanceReportPlugin(scheduler, directory)
+    scheduler.add_plugin(plugin)
+    callback = PeriodicCallback(plugin.check, CHECK_INTERVAL)
+    scheduler.periodic_callbacks[PerformanceReportPlugin.name] = callback
+    callback.start()
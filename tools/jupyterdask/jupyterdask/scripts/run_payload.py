@@ -0,0 +1,140 @@
+"""Run a Python script or a notebook with a Dask cluster, without JupyterLab.
+
+This script is uploaded to the remote cluster and runs in the job started by
+`jupyterdask exec`, in the directory where the payload has been uploaded. It creates
+a Dask cluster with the cluster factory of the Dask JupyterLab extension (i.e. with
+the same configuration as the clusters created in JupyterLab), and runs the payload
+in a subprocess where `distributed.Client()` connects to that cluster. Notebooks are
+executed with nbconvert and saved next to the original as `<name>.out.ipynb`. The
+exit code of the payload is written to a file, as the job exit code is not always
+available from SLURM accounting.
+
+In the tasks of a job array started by `jupyterdask sweep`, the notebook is run with
+the set of parameters of the task, which are assigned in a cell inserted after the
+cell tagged "parameters" (the convention of papermill). The copy of the notebook with
+the parameters is saved as `<name>-<index>.ipynb`, and executed as
+`<name>-<index>.out.ipynb`.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+import dask
+
+
+def inject_parameters(notebook: str, parameters: dict, index: int) -> str:
+    """Write a copy of a notebook with a cell assigning the given parameters.
+
+    :param notebook: path to the notebook
+    :param parameters: values of the parameters, by variable name
+    :param index: index of the set of parameters, used to name the copy
+    :return: path to the copy
+    """
+    with open(notebook) as f:
+        nb = json.load(f)
+    cell = {
+        "cell_type": "code",
+        "execution_count": None,
+        "metadata": {"tags": ["injected-parameters"]},
+        "outputs": [],
+        "source": "".join(f"{k} = {v!r}\n" for k, v in parameters.items()),
+    }
+    if (nb["nbformat"], nb["nbformat_minor"]) >= (4, 5):
+        cell["id"] = "injected-parameters"
+    # Override the default values, or assign the parameters first
+    position = 0
+    for i, c in enumerate(nb["cells"]):
+        if "parameters" in c.get("metadata", {}).get("tags", []):
+            position = i + 1
+            break
+    nb["cells"].insert(position, cell)
+    path = f"{notebook.removesuffix('.ipynb')}-{index}.ipynb"
+    with open(path, "w") as f:
+        json.dump(nb, f, indent=1)
+    return path
+
+
+def get_command(payload: str, args: list[str]) -> list[str]:
+    """Build the command running the payload.
+
+    :param payload: path to a Python script or a notebook
+    :param args: arguments of the script
+    :return: the command
+    """
+    if payload.endswith(".ipynb"):
+        output = f"{os.path.basename(payload).removesuffix('.ipynb')}.out.ipynb"
+        return [
+            sys.executable,
+            "-m",
+            "nbconvert",
+            "--to",
+            "notebook",
+            "--execute",
+            "--output",
+            output,
+            payload,
+        ]
+    return [sys.executable, payload, *args]
+
+
+def run(
+    payload: str,
+    args: list[str],
+    workers: int,
+    exit_code_file: str,
+    parameters_file: str | None = None,
+    index: int | None = None,
+) -> int:
+    """Run the payload with a Dask cluster.
+
+    :param payload: path to a Python script or a notebook
+    :param args: arguments of the script
+    :param workers: number of Dask workers requested for the cluster
+    :param exit_code_file: path where to write the exit code of the payload
+    :param parameters_file: path to a JSON list of sets of parameters of the notebook
+    :param index: index of the set of parameters to run the notebook with
+    :return: the exit code of the payload
+    """
+    if parameters_file is not None:
+        with open(parameters_file) as f:
+            parameters = json.load(f)[index]
+        payload = inject_parameters(payload, parameters, index)
+    factory = dask.config.get("labextension.factory")
+    cls = getattr(importlib.import_module(factory["module"]), factory["class"])
+    cluster = cls(**factory.get("kwargs", {}))
+    try:
+        if workers:
+            cluster.scale(workers)
+        print(f"Dask cluster: {cluster.scheduler_address}", flush=True)
+        env = dict(os.environ, DASK_SCHEDULER_ADDRESS=cluster.scheduler_address)
+        exit_code = subprocess.call(get_command(payload, args), env=env)
+    finally:
+        cluster.close()
+    with open(exit_code_file, "w") as f:
+        f.write(str(exit_code))
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1, help="Dask workers.")
+    parser.add_argument("--exit-code-file", required=True, help="exit code path.")
+    parser.add_argument("--parameters-file", help="notebook parameters path.")
+    parser.add_argument("--index", type=int, help="index of the parameters.")
+    parser.add_argument("payload", help="Python script or notebook.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="script arguments.")
+    args = parser.parse_args()
+    sys.exit(
+        run(
+            args.payload,
+            args.args,
+            args.workers,
+            args.exit_code_file,
+            parameters_file=args.parameters_file,
+            index=args.index,
+        )
+    )
@@ -0,0 +1,124 @@
+"""Stage remote files into a node-local cache before they are used by the jobs.
+
+This script is uploaded to the remote cluster and runs in the jobs of a session, with
+the Python environment of the session. The files are fetched in parallel via fsspec
+(e.g. from dCache with dCacheFS, using the credentials in the fsspec configuration)
+and stored in the cache directory under `<protocol>/<path>`. The cache is shared by
+all the jobs of the user running on the same node, in node-local storage by default,
+and is bounded in size: the least recently used files that are not listed in the
+manifest are evicted first. Files staged by jobs that are still running are never
+evicted, as they may be in use.
+"""
+
+import argparse
+import contextlib
+import fcntl
+import getpass
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fsspec
+
+# The cache is managed as the checkpoints of the notebooks, by the module uploaded
+# next to the scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../modules"))
+from jupyterdask_cache import (  # noqa: E402
+    evict,
+    join,
+    locked,
+    parse_size,
+    read_index,
+    record_use,
+    write_index,
+)
+
+# Candidates for the default cache directory, from the first one that is writable.
+# Unlike `$TMPDIR`, which is private to each job on some systems, these are shared by
+# the jobs of the user running on the same node.
+DEFAULT_CACHE_DIRS = ("/scratch-local/{user}", "/tmp/{user}")
+
+
+def stage(manifest: str, cache_dir: str, max_size: int, jobs: int = 8) -> None:
+    """Fetch all the files listed in a manifest into the cache directory.
+
+    :param manifest: path to a file listing one fsspec URL per line
+    :param cache_dir: path to the node-local cache directory
+    :param max_size: maximum total size (in bytes) of the cache
+    :param jobs: number of files fetched concurrently
+    """
+    with open(manifest) as f:
+        urls = [line.strip() for line in f if line.strip() and line[0] != "#"]
+    os.makedirs(cache_dir, exist_ok=True)
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(lambda url: _fetch(url, cache_dir), urls))
+    fetched = [path for path, is_new in results if is_new]
+    with locked(cache_dir):
+        index = read_index(cache_dir)
+        for path, _ in results:
+            # The jobs using a file protect it from eviction
+            record_use(index, path, size=os.path.getsize(join(cache_dir, path)))
+        evicted = evict(cache_dir, index, max_size, keep={p for p, _ in results})
+        write_index(cache_dir, index)
+    print(
+        f"Staged {len(urls)} file(s) in {cache_dir} in {time.time() - start_time:.1f} s"
+        f" ({len(fetched)} fetched, {len(evicted)} evicted)",
+        flush=True,
+    )
+
+
+def get_default_cache_dir() -> str:
+    """Find a node-local cache directory shared by the jobs of the user.
+
+    :return: path to the cache directory, in `$TMPDIR` if no shared directory is
+        writable
+    """
+    user = getpass.getuser()
+    for base_dir in DEFAULT_CACHE_DIRS:
+        base_dir = base_dir.format(user=user)
+        if not os.path.isdir(os.path.dirname(base_dir)):
+            continue
+        with contextlib.suppress(OSError):
+            os.makedirs(base_dir, mode=0o700, exist_ok=True)
+        if os.access(base_dir, os.W_OK | os.X_OK):
+            return os.path.join(base_dir, "jupyterdask-stage")
+    return os.path.join(os.environ.get("TMPDIR", "/tmp"), "jupyterdask-stage")
+
+
+def _fetch(url: str, cache_dir: str) -> tuple[str, bool]:
+    fs, path = fsspec.core.url_to_fs(url)
+    protocol = fs.protocol if isinstance(fs.protocol, str) else fs.protocol[0]
+    # Some file systems (e.g. HTTP) keep the protocol in the path
+    relpath = f"{protocol}/{path.split('://')[-1].lstrip('/')}"
+    local_path = join(cache_dir, relpath)
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    # Jobs on the same node staging the same file wait for each other
+    with open(f"{local_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(local_path):
+            return relpath, False
+        tmp_path = f"{local_path}.part-{os.getpid()}"
+        fs.get_file(path, tmp_path)
+        os.replace(tmp_path, local_path)
+    return relpath, True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--manifest", help="file listing fsspec URLs.")
+    parser.add_argument("--cache-dir", help="node-local cache path.")
+    parser.add_argument("--max-size", default="50GiB", help="maximum cache size.")
+    parser.add_argument("--jobs", type=int, default=8, help="concurrent fetches.")
+    parser.add_argument(
+        "--print-cache-dir", action="store_true", help="print the default cache path."
+    )
+    args = parser.parse_args()
+    cache_dir = args.cache_dir or get_default_cache_dir()
+    if args.print_cache_dir:
+        print(cache_dir)
+    elif args.manifest is None:
+        parser.error("the following arguments are required: --manifest")
+    else:
+        stage(args.manifest, cache_dir, parse_size(args.max_size), jobs=args.jobs)
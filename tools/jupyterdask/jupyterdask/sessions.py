@@ -0,0 +1,117 @@
+import dataclasses
+import datetime
+import json
+import pathlib
+import uuid
+from dataclasses import dataclass
+
+SESSIONS_DIR = pathlib.Path.home() / ".jupyterdask" / "sessions"
+
+
+@dataclass
+class SessionRecord:
+    """Local record of a session started on a remote cluster.
+
+    The session ID is the name of the Jupyter job, and it is used as prefix for the
+    names of all the jobs that belong to the session (e.g. the Dask workers).
+    """
+
+    session_id: str
+    host: str
+    log_dir: str
+    identity_file: str | None = None
+    job_id: int | None = None
+    active: bool = True
+    performance_reports: bool = False
+    array_size: int | None = None
+
+
+def new_session_id() -> str:
+    """Generate the identifier of a new session.
+
+    The identifier starts with the date and time of the session, and ends with a
+    random suffix, so that sessions started within the same second are distinct.
+
+    :return: session identifier
+    """
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+    return f"jupyter-{timestamp}-{uuid.uuid4().hex[:8]}"
+
+
+def get_session_start_date(session_id: str) -> str:
+    """Get the date when a session started, e.g. to select its jobs with sacct.
+
+    :param session_id: session identifier
+    :return: date as YYYY-MM-DD
+    """
+    # The session ID includes the timestamp of the session start
+    return session_id.removeprefix("jupyter-")[:10]
+
+
+def get_worker_job_name(session_id: str) -> str:
+    """Get the name of the jobs of the Dask workers of a session.
+
+    :param session_id: session identifier
+    :return: job name
+    """
+    # Dask workers are submitted with the name of the Jupyter job as prefix, see the
+    # job script template
+    return f"{session_id}-worker"
+
+
+def get_scheduler_job_name(session_id: str) -> str:
+    """Get the name of the jobs of the Dask schedulers of a session.
+
+    :param session_id: session identifier
+    :return: job name
+    """
+    # Dask schedulers running in their own jobs are submitted with the name of the
+    # Jupyter job as prefix, see the scheduler job module
+    return f"{session_id}-scheduler"
+
+
+def get_session_dir(session_id: str) -> pathlib.Path:
+    """Get the local directory where to store the data of a session.
+
+    :param session_id: session identifier
+    :return: path to the session directory
+    """
+    return SESSIONS_DIR / session_id
+
+
+def save_session(session: SessionRecord) -> None:
+    """Store the record of a session locally.
+
+    :param session: session record
+    """
+    session_dir = get_session_dir(session.session_id)
+    session_dir.mkdir(parents=True, exist_ok=True)
+    with open(session_dir / "session.json", "w") as f:
+        json.dump(dataclasses.asdict(session), f, indent=2)
+
+
+def load_session(session_id: str | None = None) -> SessionRecord:
+    """Load the record of a session.
+
+    :param session_id: session identifier, the most recent session if not given
+    :return: session record
+    """
+    if session_id is None:
+        sessions = list_sessions()
+        if not sessions:
+            raise ValueError("No session found.")
+        return sessions[-1]
+    path = get_session_dir(session_id) / "session.json"
+    if not path.exists():
+        raise ValueError(f"Cannot find session: {session_id}")
+    with open(path) as f:
+        return SessionRecord(**json.load(f))
+
+
+def list_sessions() -> list[SessionRecord]:
+    """List the records of all sessions, from the oldest to the most recent.
+
+    :return: session records
+    """
+    paths = sorted(SESSIONS_DIR.glob("*/session.json"))
+    return [load_session(path.parent.name) for path in paths]
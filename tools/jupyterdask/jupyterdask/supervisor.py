@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+logger = logging.getLogger(__file__)
+
+# Time (in seconds) after which a call of a task that has not returned is reported
+TASK_TIMEOUT = 300
+
+
+class SessionEndedError(Exception):
+    """Raised by a supervised task to end the session without errors."""
+
+
+class TerminatedError(BaseException):
+    """Raised in the main thread when the process receives SIGTERM."""
+
+
+@dataclass
+class PeriodicTask:
+    """Blocking function that is called periodically in a separate thread."""
+
+    name: str
+    func: Callable[[], None]
+    interval: float
+    timeout: float | None = TASK_TIMEOUT
+
+
+class Supervisor:
+    """Run the background tasks of a session concurrently.
+
+    The supervisor returns when one of the tasks ends the session (by raising
+    `SessionEndedError`) or when the process receives SIGINT or SIGTERM, so that the
+    session can be shut down cleanly. Any other error raised by a task is logged, and
+    the task is called again at the next interval. A call that has not returned
+    within the timeout of its task is reported, and the task is only called again
+    once it has returned. Long-running tasks (e.g. retrying to connect) should
+    return early once the `stopped` event is set.
+    """
+
+    def __init__(self):
+        """Create a supervisor without tasks."""
+        self.tasks: list[PeriodicTask] = []
+        self.stopped = threading.Event()
+
+    def add_task(
+        self,
+        name: str,
+        func: Callable[[], None],
+        interval: float,
+        timeout: float | None = TASK_TIMEOUT,
+    ) -> None:
+        """Add a function to be called periodically.
+
+        :param name: name of the task
+        :param func: blocking function, which can raise `SessionEndedError`
+        :param interval: time (in seconds) between two calls
+        :param timeout: time (in seconds) after which a call that has not returned
+            is reported, None to wait without reporting
+        """
+        self.tasks.append(
+            PeriodicTask(name=name, func=func, interval=interval, timeout=timeout)
+        )
+
+    def run(self) -> None:
+        """Run all tasks until the session ends."""
+        # The event loop resets the handlers of the signals it has handled
+        handlers = {
+            sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            asyncio.run(self._run())
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+
+    async def _run(self) -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        tasks = [
+            asyncio.create_task(self._run_periodic(task), name=task.name)
+            for task in self.tasks
+        ]
+        stopper = asyncio.create_task(stop.wait())
+        done, _ = await asyncio.wait(
+            [stopper, *tasks], return_when=asyncio.FIRST_COMPLETED
+        )
+        self.stopped.set()
+        for task in [stopper, *tasks]:
+            task.cancel()
+        await asyncio.gather(stopper, *tasks, return_exceptions=True)
+        for task in done:
+            if task is stopper:
+                logger.info("Shutting down on signal.")
+                continue
+            exception = task.exception()
+            if isinstance(exception, SessionEndedError):
+                print(exception)
+            elif exception is not None:
+                raise exception
+
+    @staticmethod
+    async def _run_periodic(task: PeriodicTask) -> None:
+        call = None
+        while True:
+            if call is None or call.done():
+                call = _call_in_thread(task.func)
+            try:
+                # The call goes on if the timeout expires
+                await asyncio.wait_for(asyncio.shield(call), task.timeout)
+            except SessionEndedError:
+                raise
+            except Exception as e:
+                if call.done():
+                    logger.error(f"Task {task.name} failed: {e!r}")
+                else:
+                    logger.warning(
+                        f"Task {task.name} has not returned after {task.timeout} s."
+                    )
+            await asyncio.sleep(task.interval)
+
+
+def _call_in_thread(func: Callable[[], None]) -> asyncio.Future:
+    # Unlike `asyncio.to_thread`, the call runs in a daemon thread, so that a call
+    # that does not return does not prevent the process from exiting
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(exception: BaseException | None) -> None:
+        if future.done():
+            return
+        if exception is None:
+            future.set_result(None)
+        else:
+            future.set_exception(exception)
+
+    def target() -> None:
+        try:
+            func()
+        except BaseException as e:
+            exception = e
+        else:
+            exception = None
+        try:
+            loop.call_soon_threadsafe(set_result, exception)
+        except RuntimeError:
+            # The event loop is closed once the supervisor has returned
+            pass
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+@contextmanager
+def raise_on_sigterm() -> Iterator[None]:
+    """Turn SIGTERM into a `TerminatedError` raised in the main thread.
+
+    SIGTERM kills the process without running any cleanup by default. Within this
+    context, it unwinds the stack like SIGINT does, so that the jobs submitted so far
+    are cancelled. Further SIGTERMs are ignored while cleaning up. The supervisor
+    handles the signals itself while it runs.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        # Signal handlers can only be set in the main thread
+        yield
+        return
+
+    def handler(signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise TerminatedError("Terminated by SIGTERM.")
+
+    previous = signal.signal(signal.SIGTERM, handler)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+def daemonize(log_file: str) -> Callable[[str], None]:
+    """Detach the process from the terminal and continue in the background.
+
+    The parent process waits until the background process notifies that the session
+    is ready, prints the message received and exits. It exits with an error if the
+    background process fails before notifying.
+
+    :param log_file: path to the file where to redirect the output of the process
+    :return: function to notify the parent process with a message
+    """
+    read_fd, write_fd = os.pipe()
+    if os.fork() > 0:
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            message = pipe.read()
+        if not message:
+            print(f"Failed to start the session, see: {log_file}", file=sys.stderr)
+            sys.exit(1)
+        print(message)
+        sys.exit(0)
+
+    os.close(read_fd)
+    os.setsid()
+    with open(os.devnull) as devnull:
+        os.dup2(devnull.fileno(), sys.stdin.fileno())
+    with open(log_file, "a") as log:
+        os.dup2(log.fileno(), sys.stdout.fileno())
+        os.dup2(log.fileno(), sys.stderr.fileno())
+
+    def notify(message: str) -> None:
+        os.write(write_fd, message.encode())
+        os.close(write_fd)
+
+    return notify
@@ -0,0 +1,367 @@
+import hashlib
+import logging
+import os
+import pathlib
+import shlex
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from fabric import Connection
+from paramiko import SFTPClient, Transport
+
+from .connection import get_connect_kwargs
+
+logger = logging.getLogger(__file__)
+
+CHUNK_SIZE = 64 * 2**20
+# Size of the pieces in which a chunk is read and written
+BLOCK_SIZE = 2**20
+# Maximum total size of the small files packed into a single tar stream
+TAR_BATCH_SIZE = 256 * 2**20
+
+
+@dataclass
+class FileInfo:
+    """Size and modification time of a file to transfer."""
+
+    path: str
+    size: int
+    mtime: float
+
+
+def sync(
+    source: str,
+    destination: str,
+    identity_file: str | None = None,
+    streams: int = 4,
+    chunk_size: int = CHUNK_SIZE,
+    compress: bool = False,
+) -> None:
+    """Copy a file or a directory tree to or from a remote cluster.
+
+    Files larger than `chunk_size` are split into chunks that are sent over multiple
+    SSH channels concurrently, while smaller files are packed in tar streams. Files
+    whose size and modification time match are skipped. For the other large files,
+    only the chunks whose checksums differ are sent, so that interrupted transfers can
+    be resumed, and the checksums of the chunks are verified after the transfer (the
+    chunks that do not match are sent once more).
+
+    :param source: local path or remote path as `[user@]hostname:path`
+    :param destination: local path or remote path as `[user@]hostname:path`, which
+        is the path of the copy (not of the directory where to copy)
+    :param identity_file: path to the private key used for authentication on the remote
+        cluster
+    :param streams: number of concurrent SSH channels
+    :param chunk_size: size (in bytes) of the chunks of large files
+    :param compress: compress the data sent over the SSH connection
+    """
+    source_host, source_path = _split_remote_path(source)
+    destination_host, destination_path = _split_remote_path(destination)
+    if (source_host is None) == (destination_host is None):
+        raise ValueError("Exactly one of source and destination must be remote.")
+    host = source_host or destination_host
+    upload = destination_host is not None
+    connect_kwargs = get_connect_kwargs(identity_file) or {}
+    connect_kwargs["compress"] = compress
+    with Connection(
+        host=host, connect_kwargs=connect_kwargs, forward_agent=True
+    ) as conn:
+        conn.open()
+        transfer = _Transfer(conn, upload, streams=streams, chunk_size=chunk_size)
+        transfer.run(source_path, destination_path)
+
+
+def _split_remote_path(path: str) -> tuple[str | None, str]:
+    host, sep, remote_path = path.partition(":")
+    if not sep or "/" in host:
+        return None, path
+    return host, remote_path
+
+
+class _Transfer:
+    """Transfer files over concurrent SFTP and tar channels of one connection."""
+
+    def __init__(
+        self, connection: Connection, upload: bool, streams: int, chunk_size: int
+    ):
+        self.connection = connection
+        self.transport: Transport = connection.transport
+        self.upload = upload
+        self.streams = streams
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+        self._clients: list[SFTPClient] = []
+        self._lock = threading.Lock()
+        self.transferred = 0
+        self.skipped = 0
+
+    @property
+    def sftp(self) -> SFTPClient:
+        # One SFTP channel per thread
+        if not hasattr(self._local, "sftp"):
+            self._local.sftp = SFTPClient.from_transport(self.transport)
+            with self._lock:
+                self._clients.append(self._local.sftp)
+        return self._local.sftp
+
+    def run(self, source: str, destination: str) -> None:
+        start_time = time.time()
+        if self.upload:
+            source_files = _list_local_files(source)
+            destination_files = self._list_remote_files(destination)
+        else:
+            source_files = self._list_remote_files(source)
+            destination_files = _list_local_files(destination)
+        if not source_files:
+            raise FileNotFoundError(f"Cannot find: {source}")
+        small_files, large_files = [], []
+        for info in source_files.values():
+            existing = destination_files.get(info.path)
+            if (
+                existing is not None
+                and existing.size == info.size
+                and int(existing.mtime) == int(info.mtime)
+            ):
+                self.skipped += info.size
+            elif info.size < self.chunk_size and info.path:
+                # A single file given as source is always sent via SFTP
+                small_files.append(info)
+            else:
+                large_files.append(info)
+        self._make_directories(destination, small_files + large_files)
+        try:
+            with ThreadPoolExecutor(max_workers=self.streams) as executor:
+                futures = [
+                    executor.submit(self._transfer_tar, source, destination, batch)
+                    for batch in _get_tar_batches(small_files)
+                ]
+                for info in large_files:
+                    futures += self._transfer_chunked(
+                        executor, source, destination, info
+                    )
+                for future in futures:
+                    future.result()
+        finally:
+            for client in self._clients:
+                client.close()
+        elapsed = time.time() - start_time
+        rate = self.transferred / 2**20 / elapsed
+        print(
+            f"Transferred {self.transferred / 2**20:.1f} MiB in {elapsed:.1f} s "
+            f"({rate:.1f} MiB/s), skipped {self.skipped / 2**20:.1f} MiB up to date."
+        )
+
+    def _add_transferred(self, size: int) -> None:
+        with self._lock:
+            self.transferred += size
+
+    def _list_remote_files(self, path: str) -> dict[str, FileInfo]:
+        res = self.connection.run(
+            f"find {shlex.quote(path)} -type f -printf '%P\\0%s\\0%T@\\0'",
+            warn=True,
+            hide=True,
+        )
+        fields = res.stdout.split("\0")[:-1] if res.exited == 0 else []
+        files = {}
+        for i in range(0, len(fields), 3):
+            relpath, size, mtime = fields[i : i + 3]
+            files[relpath] = FileInfo(path=relpath, size=int(size), mtime=float(mtime))
+        return files
+
+    def _make_directories(self, destination: str, files: list[FileInfo]) -> None:
+        directories = {
+            os.path.dirname(_join(destination, info.path)) or "." for info in files
+        }
+        if not directories:
+            return
+        if self.upload:
+            quoted = " ".join(shlex.quote(d) for d in sorted(directories))
+            self.connection.run(f"mkdir -p {quoted}", hide=True)
+        else:
+            for directory in directories:
+                os.makedirs(directory, exist_ok=True)
+
+    def _transfer_tar(
+        self, source: str, destination: str, files: list[FileInfo]
+    ) -> None:
+        channel = self.transport.open_session()
+        if self.upload:
+            channel.exec_command(f"tar -x -C {shlex.quote(destination)}")
+            with channel.makefile("wb") as stream:
+                with tarfile.open(fileobj=stream, mode="w|") as tar:
+                    for info in files:
+                        tar.add(_join(source, info.path), arcname=info.path)
+            channel.shutdown_write()
+        else:
+            channel.exec_command(f"tar -c -C {shlex.quote(source)} --null -T -")
+            channel.sendall(b"".join(info.path.encode() + b"\0" for info in files))
+            channel.shutdown_write()
+            with channel.makefile("rb") as stream:
+                with tarfile.open(fileobj=stream, mode="r|") as tar:
+                    tar.extractall(destination, filter="data")
+        status = channel.recv_exit_status()
+        stderr = channel.makefile_stderr("rb").read().decode()
+        channel.close()
+        if status != 0:
+            raise RuntimeError(f"Failed to transfer files with tar: {stderr}")
+        self._add_transferred(sum(info.size for info in files))
+
+    def _transfer_chunked(
+        self,
+        executor: ThreadPoolExecutor,
+        source: str,
+        destination: str,
+        info: FileInfo,
+    ) -> list:
+        source_file = _join(source, info.path)
+        destination_file = _join(destination, info.path)
+        local_file = source_file if self.upload else destination_file
+        remote_file = destination_file if self.upload else source_file
+        chunks = range(0, info.size, self.chunk_size)
+        # Resume by only sending the chunks that differ
+        checksums = self._get_checksums(source_file, info.size, remote=not self.upload)
+        existing = self._get_checksums(destination_file, info.size, remote=self.upload)
+        todo = [
+            offset
+            for i, offset in enumerate(chunks)
+            if i >= len(existing) or existing[i] != checksums[i]
+        ]
+        self.skipped += info.size - sum(
+            min(self.chunk_size, info.size - offset) for offset in todo
+        )
+        self._allocate(destination_file, info.size)
+        futures = [
+            executor.submit(self._transfer_chunk, local_file, remote_file, offset)
+            for offset in todo
+        ]
+
+        def _verify() -> None:
+            for future in futures:
+                future.result()
+            # Chunks whose checksums differ are sent once more
+            for attempt in range(2):
+                transferred = self._get_checksums(
+                    destination_file, info.size, remote=self.upload
+                )
+                failed = [
+                    offset
+                    for i, offset in enumerate(chunks)
+                    if i >= len(transferred) or transferred[i] != checksums[i]
+                ]
+                if not failed:
+                    break
+                if attempt > 0:
+                    raise RuntimeError(f"Checksum mismatch for: {destination_file}")
+                logger.warning(
+                    f"Checksum mismatch for: {destination_file}, sending "
+                    f"{len(failed)} chunk(s) again"
+                )
+                for offset in failed:
+                    self._transfer_chunk(local_file, remote_file, offset)
+            self._set_mtime(destination_file, info.mtime)
+
+        return [*futures, executor.submit(_verify)]
+
+    def _get_checksums(self, path: str, size: int, remote: bool) -> list[str]:
+        count = -(-size // self.chunk_size)
+        if not remote:
+            if not os.path.isfile(path):
+                return []
+            with open(path, "rb") as f:
+                return [
+                    hashlib.sha256(f.read(self.chunk_size)).hexdigest()
+                    for _ in range(count)
+                ]
+        quoted = shlex.quote(path)
+        res = self.connection.run(
+            f"test -f {quoted} && for i in $(seq 0 {count - 1}); do "
+            f"dd if={quoted} bs={self.chunk_size} skip=$i count=1 iflag=fullblock "
+            "2>/dev/null | sha256sum | cut -d ' ' -f 1; done",
+            warn=True,
+            hide=True,
+        )
+        return res.stdout.split() if res.exited == 0 else []
+
+    def _allocate(self, path: str, size: int) -> None:
+        if self.upload:
+            try:
+                self.sftp.truncate(path, size)
+            except FileNotFoundError:
+                with self.sftp.open(path, "w"):
+                    pass
+                self.sftp.truncate(path, size)
+        else:
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+    def _set_mtime(self, path: str, mtime: float) -> None:
+        if self.upload:
+            self.sftp.utime(path, (mtime, mtime))
+        else:
+            os.utime(path, (mtime, mtime))
+
+    def _transfer_chunk(self, local_file: str, remote_file: str, offset: int) -> None:
+        if self.upload:
+            with open(local_file, "rb") as f, self.sftp.open(remote_file, "r+") as rf:
+                f.seek(offset)
+                rf.seek(offset)
+                rf.set_pipelined(True)
+                size = 0
+                while size < self.chunk_size:
+                    block = f.read(min(BLOCK_SIZE, self.chunk_size - size))
+                    if not block:
+                        break
+                    rf.write(block)
+                    size += len(block)
+        else:
+            with self.sftp.open(remote_file, "r") as rf, open(local_file, "r+b") as f:
+                end = min(offset + self.chunk_size, rf.stat().st_size)
+                blocks = [
+                    (start, min(BLOCK_SIZE, end - start))
+                    for start in range(offset, end, BLOCK_SIZE)
+                ]
+                f.seek(offset)
+                size = 0
+                for block in rf.readv(blocks):
+                    f.write(block)
+                    size += len(block)
+        self._add_transferred(size)
+
+
+def _list_local_files(path: str) -> dict[str, FileInfo]:
+    root = pathlib.Path(path)
+    if root.is_file():
+        paths = {"": root}
+    elif root.is_dir():
+        paths = {p.relative_to(root).as_posix(): p for p in root.rglob("*")}
+    else:
+        return {}
+    files = {}
+    for relpath, p in paths.items():
+        if p.is_file():
+            stat = p.stat()
+            files[relpath] = FileInfo(
+                path=relpath, size=stat.st_size, mtime=stat.st_mtime
+            )
+    return files
+
+
+def _get_tar_batches(files: list[FileInfo]) -> list[list[FileInfo]]:
+    batches, batch, batch_size = [], [], 0
+    for info in files:
+        if batch and batch_size + info.size > TAR_BATCH_SIZE:
+            batches.append(batch)
+            batch, batch_size = [], 0
+        batch.append(info)
+        batch_size += info.size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _join(base: str, relpath: str) -> str:
+    # An empty relative path refers to a single file given as source
+    return f"{base.rstrip('/')}/{relpath}" if relpath else base
@@ -1,8 +1,10 @@
+import dataclasses
 import os
+import shlex
 
 from jinja2 import Environment, FileSystemLoader, PackageLoader
 
-from .config import get_config
+from .config import get_config, get_worker_lifetime
 
 
 def setup_job_script(
@@ -11,6 +13,15 @@ def setup_job_script(
     python: str = "python",
     image: str | None = None,
     log_dir: str = ".jupyterdask",
+    initial_workers: int | None = None,
+    scheduler_job: bool | None = None,
+    socket: bool = False,
+    stage_manifest: list[str] | None = None,
+    performance_reports: bool = False,
+    payload: list[str] | None = None,
+    parameters_file: str | None = None,
+    gateway: str | None = None,
+    gateway_service: list[str] | None = None,
 ) -> str:
     """Set up the job script to start Jupyter and Dask on the remote cluster.
 
@@ -18,6 +29,24 @@ def setup_job_script(
     :param template_path: use the given custom file as template for the job script
     :param python: Python executable on the remote cluster
     :param log_dir: path where to save job scripts and log files on the remote cluster
+    :param initial_workers: number of Dask workers requested when the job starts,
+        overriding the remote cluster configuration
+    :param scheduler_job: run the Dask schedulers in their own jobs, overriding the
+        remote cluster configuration
+    :param socket: let Jupyter listen on a Unix socket instead of a TCP port
+    :param stage_manifest: URLs of the files to stage into node-local storage when
+        the jobs start
+    :param performance_reports: record a Dask performance report for each computation
+    :param payload: run the given script or notebook (path relative to the run
+        directory of the job, followed by the arguments of the script) in place of
+        Jupyter
+    :param parameters_file: run the payload notebook in each task of a job array, with
+        the set of parameters of the task from the given JSON file (path relative to
+        the run directory of the job)
+    :param gateway: create the Dask clusters via the gateway that has published its
+        address in the given file on the remote cluster
+    :param gateway_service: run the gateway of the team (with the given arguments) in
+        place of Jupyter
     :return: the text of the batch job script
     """
     if template is None:
@@ -27,6 +56,23 @@ def setup_job_script(
         dirname, basename = os.path.split(os.path.abspath(template))
         env = Environment(loader=FileSystemLoader(dirname))
         temp = env.get_template(basename)
+    config = get_config(host)
+    if initial_workers is not None:
+        config = dataclasses.replace(config, initial_workers=initial_workers)
+    if scheduler_job is not None:
+        config = dataclasses.replace(config, scheduler_job=scheduler_job)
+    lifetime = get_worker_lifetime(config) or {}
     return temp.render(
-        python=python, image=image, log_dir=log_dir, **vars(get_config(host))
+        python=python,
+        image=image,
+        log_dir=log_dir,
+        socket=socket,
+        stage_manifest=stage_manifest,
+        performance_reports=performance_reports,
+        payload=shlex.join(payload) if payload else None,
+        parameters_file=parameters_file,
+        gateway=gateway,
+        gateway_service=shlex.join(gateway_service) if gateway_service else None,
+        **vars(config),
+        **lifetime,
     )
@@ -0,0 +1,300 @@
+import logging
+import socket
+import threading
+import time
+
+import paramiko
+from fabric import Connection
+from fabric.tunnels import Tunnel
+from paramiko import Channel, SSHException, Transport
+from paramiko.common import cMSG_CHANNEL_OPEN
+from paramiko.message import Message
+
+logger = logging.getLogger(__file__)
+
+STREAMLOCAL_CHANNEL = "direct-streamlocal@openssh.com"
+
+# Private attributes of paramiko used to open streamlocal channels, see
+# `open_streamlocal_channel` (the supported versions are pinned in the dependencies)
+TRANSPORT_INTERNALS = (
+    "_sanitize_window_size",
+    "_sanitize_packet_size",
+    "_next_channel",
+    "_channels",
+    "channel_events",
+    "channels_seen",
+    "_send_user_message",
+)
+CHANNEL_INTERNALS = ("_set_transport", "_set_window")
+
+
+# Errors raised when the SSH connection drops or cannot be established
+CONNECTION_ERRORS = (SSHException, OSError, EOFError)
+
+KEEPALIVE_TIMEOUT = 10
+MAX_RECONNECT_DELAY = 60
+
+
+class LocalForward:
+    """Forward a local port to a TCP port or a Unix domain socket on the remote host.
+
+    Forwarding to a socket is the equivalent of `ssh -L <local_port>:<remote_socket>`,
+    which relies on the streamlocal extension of OpenSSH. The forward can be
+    restarted on a new transport, keeping the same local port.
+    """
+
+    def __init__(
+        self,
+        local_port: int,
+        remote_host: str | None = None,
+        remote_port: int | None = None,
+        remote_socket: str | None = None,
+    ):
+        """Set up the forward, which is not started yet.
+
+        :param local_port: the local port to forward
+        :param remote_host: the remote host to forward to, for TCP forwarding
+        :param remote_port: the remote port to forward to, for TCP forwarding
+        :param remote_socket: path to the remote socket, for streamlocal forwarding
+        """
+        self.local_port = local_port
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        self.remote_socket = remote_socket
+        self._finished = None
+        self._thread = None
+
+    def start(self, transport: Transport) -> None:
+        """Start accepting connections on the local port.
+
+        :param transport: transport of the connection to the remote host
+        """
+        if self.remote_socket is not None:
+            check_streamlocal_support(transport)
+        self._finished = threading.Event()
+        self._thread = threading.Thread(
+            target=self._accept, args=(transport, self._finished), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop accepting connections and close the open ones."""
+        if self._thread is None:
+            return
+        self._finished.set()
+        self._thread.join()
+        self._thread = None
+
+    def _open_channel(self, transport: Transport, local_address: tuple) -> Channel:
+        if self.remote_socket is not None:
+            return open_streamlocal_channel(transport, self.remote_socket)
+        remote_address = (self.remote_host, self.remote_port)
+        return transport.open_channel("direct-tcpip", remote_address, local_address)
+
+    def _accept(self, transport: Transport, finished: threading.Event) -> None:
+        # Same as fabric's TunnelManager, but the listening socket is always closed
+        # so that the local port can be bound again right away
+        tunnels = []
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setblocking(False)
+            sock.bind(("localhost", self.local_port))
+            sock.listen(16)
+            while not finished.is_set():
+                try:
+                    tunnel_sock, local_address = sock.accept()
+                except BlockingIOError:
+                    time.sleep(0.01)
+                    continue
+                tunnel_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                try:
+                    channel = self._open_channel(transport, local_address)
+                except CONNECTION_ERRORS as e:
+                    logger.info(f"Failed to open forwarding channel: {e}")
+                    tunnel_sock.close()
+                    continue
+                tunnel = Tunnel(
+                    channel=channel, sock=tunnel_sock, finished=threading.Event()
+                )
+                tunnel.start()
+                tunnels.append(tunnel)
+        for tunnel in tunnels:
+            tunnel.finished.set()
+            tunnel.join()
+
+
+class SessionTunnel:
+    """Forward a local port to Jupyter, reconnecting if the SSH connection drops.
+
+    When the connection is lost, the forward is rebuilt on the same local port once
+    a new connection is established, while the remote job keeps running.
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        forward: LocalForward,
+        node_connection: Connection | None = None,
+    ):
+        """Set up the tunnel, which is not open yet.
+
+        :param connection: connection to the remote cluster
+        :param forward: the forward to Jupyter
+        :param node_connection: connection to the compute node (through
+            `connection`), if Jupyter can only be reached from there
+        """
+        self.connection = connection
+        self.node_connection = node_connection
+        self.forward = forward
+        self.connected = threading.Event()
+
+    @property
+    def _forward_connection(self) -> Connection:
+        return self.node_connection or self.connection
+
+    def open(self) -> None:
+        """Open the connections and start forwarding."""
+        self.connection.open()
+        if self.node_connection is not None:
+            self.node_connection.open()
+        self.forward.start(self._forward_connection.transport)
+        self.connected.set()
+
+    def close(self) -> None:
+        """Stop forwarding, keeping the connection to the remote cluster open."""
+        self.connected.clear()
+        self.forward.stop()
+        if self.node_connection is not None:
+            self.node_connection.close()
+
+    def check(self, stopped: threading.Event) -> None:
+        """Check the connection, and reconnect with exponential backoff if it is lost.
+
+        :param stopped: event set when reconnection attempts should stop
+        """
+        if is_alive(self._forward_connection.transport):
+            return
+        print("Connection to the remote cluster lost, reconnecting...", flush=True)
+        self.close()
+        self.connection.close()
+        delay = 1
+        while not stopped.wait(delay):
+            try:
+                self.open()
+            except CONNECTION_ERRORS as e:
+                logger.info(f"Failed to reconnect: {e}")
+                self.close()
+                self.connection.close()
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            else:
+                print("Reconnected to the remote cluster.", flush=True)
+                return
+
+
+def is_alive(transport: Transport | None, timeout: float = KEEPALIVE_TIMEOUT) -> bool:
+    """Check whether the remote server responds on a transport.
+
+    :param transport: transport of the connection to the remote host
+    :param timeout: time (in seconds) waited for the server to respond
+    :return: True if the server has responded in time
+    """
+    if transport is None or not transport.is_active():
+        return False
+    # Any response to the request (including a failure) proves that the server is
+    # reachable. The request itself has no timeout, so it runs in a separate thread.
+    thread = threading.Thread(
+        target=transport.global_request,
+        args=("keepalive@openssh.com",),
+        kwargs={"wait": True},
+        daemon=True,
+    )
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        # Closing the transport also stops the pending request
+        transport.close()
+        return False
+    return transport.is_active()
+
+
+def get_free_port(port: int) -> int:
+    """Check whether a local port is free, otherwise find a free one.
+
+    :param port: preferred local port
+    :return: a local port that is free
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("localhost", port))
+        except OSError:
+            sock.bind(("localhost", 0))
+            free_port = sock.getsockname()[1]
+            logger.warning(f"Local port {port} is in use, using {free_port} instead.")
+            return free_port
+    return port
+
+
+def check_streamlocal_support(transport: Transport) -> None:
+    """Check that paramiko has the internals used to open streamlocal channels.
+
+    :param transport: transport of the connection to the remote host
+    """
+    missing = [name for name in TRANSPORT_INTERNALS if not hasattr(transport, name)]
+    missing += [name for name in CHANNEL_INTERNALS if not hasattr(Channel, name)]
+    if missing:
+        raise RuntimeError(
+            "Forwarding to a Unix socket is not supported with paramiko "
+            f"{paramiko.__version__} (missing: {', '.join(missing)}), run without "
+            "--socket to forward a TCP port instead"
+        )
+
+
+def open_streamlocal_channel(
+    transport: Transport, remote_socket: str, timeout: float = 60
+) -> Channel:
+    """Open a channel to a Unix domain socket on the remote host.
+
+    Paramiko only supports TCP forwarding, so the channel-open request for OpenSSH's
+    "direct-streamlocal@openssh.com" extension is built here following the same
+    steps as `Transport.open_channel`.
+
+    :param transport: transport of the connection to the remote host
+    :param remote_socket: path to the socket on the remote host
+    :param timeout: time (in seconds) waited for the channel to open
+    :return: the new channel
+    """
+    if not transport.active:
+        raise SSHException("SSH session not active")
+    with transport.lock:
+        window_size = transport._sanitize_window_size(None)
+        max_packet_size = transport._sanitize_packet_size(None)
+        chanid = transport._next_channel()
+        m = Message()
+        m.add_byte(cMSG_CHANNEL_OPEN)
+        m.add_string(STREAMLOCAL_CHANNEL)
+        m.add_int(chanid)
+        m.add_int(window_size)
+        m.add_int(max_packet_size)
+        m.add_string(remote_socket)
+        # Reserved fields, see OpenSSH's PROTOCOL file
+        m.add_string("")
+        m.add_int(0)
+        chan = Channel(chanid)
+        transport._channels.put(chanid, chan)
+        transport.channel_events[chanid] = event = threading.Event()
+        transport.channels_seen[chanid] = True
+        chan._set_transport(transport)
+        chan._set_window(window_size, max_packet_size)
+    transport._send_user_message(m)
+    start_time = time.time()
+    while not event.is_set():
+        event.wait(0.1)
+        if not transport.active:
+            raise transport.get_exception() or SSHException("Unable to open channel.")
+        if time.time() - start_time > timeout:
+            raise SSHException("Timeout opening channel.")
+    chan = transport._channels.get(chanid)
+    if chan is None:
+        # The request has been rejected, e.g. if streamlocal forwarding is disabled
+        raise transport.get_exception() or SSHException("Unable to open channel.")
+    return chan
@@ -0,0 +1,72 @@
+import importlib.util
+import io
+import os
+import pathlib
+import stat
+import sys
+
+import paramiko
+import pytest
+from fake_cluster import FakeSSHServer
+
+from jupyterdask import config, jobs, sessions
+
+PACKAGE_DIR = pathlib.Path(__file__).parents[1] / "jupyterdask"
+
+
+def load_script(path: str):
+    """Import a script or a module that is uploaded to the remote cluster.
+
+    :param path: path relative to the package directory, e.g. "scripts/stage.py"
+    :return: the imported module
+    """
+    path = PACKAGE_DIR / path
+    # As when running the script, or with the modules in `PYTHONPATH` in the jobs
+    if str(path.parent) not in sys.path:
+        sys.path.append(str(path.parent))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(autouse=True)
+def sessions_dir(tmp_path, monkeypatch):
+    # Keep the session records of the tests away from the home directory
+    path = tmp_path / "sessions"
+    monkeypatch.setattr(sessions, "SESSIONS_DIR", path)
+    return path
+
+
+@pytest.fixture
+def squeue(tmp_path, monkeypatch):
+    """Stand-in for squeue, listing the jobs written to a file."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    jobs = tmp_path / "jobs"
+    jobs.write_text("")
+    path = bin_dir / "squeue"
+    path.write_text(f"#!/bin/sh\ncat {jobs}\n")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return jobs
+
+
+@pytest.fixture
+def remote_cluster(tmp_path, monkeypatch):
+    """Fake remote cluster reached via SSH on the loopback interface."""
+    home = tmp_path / "remote"
+    home.mkdir()
+    server = FakeSSHServer(home, tmp_path / "slurm")
+    server.start()
+    server.host = f"127.0.0.1:{server.port}"
+    server.identity_file = str(tmp_path / "id_rsa")
+    paramiko.RSAKey.generate(2048).write_private_key_file(server.identity_file)
+    monkeypatch.setitem(
+        config.DEFAULT_CONFIGS, "127.0.0.1", config.DEFAULT_CONFIGS["spider"]
+    )
+    monkeypatch.setattr(jobs, "JOBS_CACHE_DIR", tmp_path / "jobs")
+    # Fabric forwards the standard input to the commands, which pytest captures
+    monkeypatch.setattr(sys, "stdin", io.StringIO())
+    yield server
+    server.stop()
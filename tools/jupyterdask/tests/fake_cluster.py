@@ -0,0 +1,286 @@
+"""Stand-in for a remote cluster: an SSH server running SLURM commands locally.
+
+The SSH server runs the commands in a home directory, with fake SLURM commands (see
+`fake_slurm.py`) first in `PATH`, serves the files of the home directory via SFTP and
+forwards TCP connections and Unix domain socket connections to the local host.
+"""
+
+import getpass
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import threading
+
+import paramiko
+from fabric.tunnels import Tunnel
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+
+FAKE_SLURM = pathlib.Path(__file__).parent / "fake_slurm.py"
+
+SLURM_COMMANDS = ("sbatch", "squeue", "scancel", "sacct")
+
+STREAMLOCAL_CHANNEL = "direct-streamlocal@openssh.com"
+
+
+def _set_file_attr(path: str, attr: SFTPAttributes) -> None:
+    # Paramiko empties the file before changing its size, OpenSSH truncates it
+    if attr._flags & attr.FLAG_SIZE:
+        os.truncate(path, attr.st_size)
+        attr._flags &= ~attr.FLAG_SIZE
+    SFTPServer.set_file_attr(path, attr)
+
+
+class FakeSFTPHandle(SFTPHandle):
+    """Open file of the SFTP server."""
+
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def chattr(self, attr):
+        try:
+            _set_file_attr(self.filename, attr)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class FakeSFTPServer(SFTPServerInterface):
+    """SFTP server for the files of the home directory."""
+
+    def __init__(self, server, home: pathlib.Path):
+        super().__init__(server)
+        self.home = home
+
+    def canonicalize(self, path):
+        return os.path.normpath(os.path.join(self.home, path))
+
+    def open(self, path, flags, attr):
+        path = self.canonicalize(path)
+        try:
+            fd = os.open(path, flags, 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        mode = "r+b" if flags & os.O_RDWR else "wb" if flags & os.O_WRONLY else "rb"
+        handle = FakeSFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self.canonicalize(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def list_folder(self, path):
+        path = self.canonicalize(path)
+        try:
+            return [
+                SFTPAttributes.from_stat(os.stat(os.path.join(path, name)), name)
+                for name in os.listdir(path)
+            ]
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, path, attr):
+        try:
+            _set_file_attr(self.canonicalize(path), attr)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class FakeTransport(paramiko.Transport):
+    """Transport passing the socket path of streamlocal channels to the server."""
+
+    def _parse_channel_open(self, m):
+        # Paramiko only passes the kind of unknown channels to the server, so the
+        # socket path is read ahead before the message is parsed as usual
+        position = m.packet.tell()
+        kind = m.get_text()
+        if kind == STREAMLOCAL_CHANNEL:
+            m.get_int(), m.get_int(), m.get_int()
+            self.server_object.socket_path = m.get_text()
+        m.packet.seek(position)
+        super()._parse_channel_open(m)
+
+
+class FakeSSHInterface(paramiko.ServerInterface):
+    """SSH server accepting any key, running the commands in the home directory."""
+
+    def __init__(self, home: pathlib.Path, env: dict[str, str]):
+        self.home = home
+        self.env = env
+        self.forwards: dict[int, tuple[str, int] | str] = {}
+        self.socket_path = None
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == STREAMLOCAL_CHANNEL:
+            self.forwards[chanid] = self.socket_path
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        self.forwards[chanid] = destination
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_env_request(self, channel, name, value):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(
+            target=self._exec, args=(channel, command.decode()), daemon=True
+        ).start()
+        return True
+
+    def _exec(self, channel: paramiko.Channel, command: str) -> None:
+        process = subprocess.Popen(
+            ["bash", "-c", command],
+            cwd=self.home,
+            env=self.env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        def feed_stdin():
+            with process.stdin:
+                for data in iter(lambda: channel.recv(2**16), b""):
+                    process.stdin.write(data)
+                    process.stdin.flush()
+
+        def send_stderr():
+            for data in iter(lambda: process.stderr.read1(2**16), b""):
+                channel.sendall_stderr(data)
+
+        threads = [
+            threading.Thread(target=feed_stdin, daemon=True),
+            threading.Thread(target=send_stderr, daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        for data in iter(lambda: process.stdout.read1(2**16), b""):
+            channel.sendall(data)
+        threads[1].join()
+        channel.send_exit_status(process.wait())
+        channel.close()
+
+
+class FakeSSHServer:
+    """SSH server on the loopback interface, standing in for the remote cluster."""
+
+    def __init__(self, home: pathlib.Path, state_dir: pathlib.Path):
+        """Set up the server and the SLURM commands, which are not started yet.
+
+        :param home: home directory of the user on the remote cluster
+        :param state_dir: directory where the fake SLURM commands keep the jobs
+        """
+        self.home = home
+        bin_dir = state_dir / "bin"
+        bin_dir.mkdir(parents=True, exist_ok=True)
+        for command in SLURM_COMMANDS:
+            path = bin_dir / command
+            path.write_text(
+                f'#!/bin/sh\nexec {sys.executable} {FAKE_SLURM} {command} "$@"\n'
+            )
+            path.chmod(0o755)
+        self.env = {
+            **os.environ,
+            "HOME": str(home),
+            "USER": getpass.getuser(),
+            "PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+            "FAKE_SLURM_DIR": str(state_dir),
+        }
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.transports: list[paramiko.Transport] = []
+        self.port = 0
+        self._sock = None
+
+    def start(self) -> None:
+        """Start accepting connections, on the same port if restarted."""
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", self.port))
+        self.port = self._sock.getsockname()[1]
+        self._sock.listen(16)
+        threading.Thread(target=self._accept, args=(self._sock,), daemon=True).start()
+
+    def run(self, command: str) -> subprocess.CompletedProcess:
+        """Run a command as the server does, e.g. to check the jobs.
+
+        :param command: shell command
+        :return: the completed process, with its output
+        """
+        return subprocess.run(
+            ["bash", "-c", command],
+            cwd=self.home,
+            env=self.env,
+            capture_output=True,
+            text=True,
+        )
+
+    def stop(self) -> None:
+        """Stop accepting connections and close the open ones, cancel the jobs."""
+        self.run("scancel $(squeue --noheader --format %i)")
+        # Shutting the socket down wakes the thread waiting for connections up
+        self._sock.shutdown(socket.SHUT_RDWR)
+        self._sock.close()
+        for transport in self.transports:
+            transport.close()
+        self.transports.clear()
+
+    def _accept(self, listener: socket.socket) -> None:
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            transport = FakeTransport(sock)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler(
+                "sftp", SFTPServer, FakeSFTPServer, self.home
+            )
+            server = FakeSSHInterface(self.home, self.env)
+            try:
+                transport.start_server(server=server)
+            except paramiko.SSHException:
+                continue
+            self.transports.append(transport)
+            threading.Thread(
+                target=self._forward, args=(transport, server), daemon=True
+            ).start()
+
+    @staticmethod
+    def _forward(transport: paramiko.Transport, server: FakeSSHInterface) -> None:
+        # Channels are accepted in the order they are opened, the forwarding ones
+        # are connected to their destination. The transport only keeps weak
+        # references to the channels, so the other ones (i.e. sessions) are kept
+        # here until the transport is closed.
+        sessions = []
+        while transport.is_active():
+            channel = transport.accept(timeout=1)
+            if channel is None:
+                continue
+            if channel.get_id() not in server.forwards:
+                sessions.append(channel)
+                continue
+            destination = server.forwards.pop(channel.get_id())
+            try:
+                if isinstance(destination, str):
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(destination)
+                else:
+                    sock = socket.create_connection(destination)
+            except OSError:
+                channel.close()
+                continue
+            Tunnel(channel=channel, sock=sock, finished=threading.Event()).start()
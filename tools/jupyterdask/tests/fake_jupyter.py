@@ -0,0 +1,74 @@
+"""Stand-in for JupyterLab with the Dask extension, run by the jobs of the tests.
+
+The server prints its URL as Jupyter does, and creates local Dask clusters through
+the REST API of the Dask JupyterLab extension.
+"""
+
+import json
+import secrets
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from distributed import LocalCluster
+
+TOKEN = secrets.token_hex(8)
+
+clusters: dict[str, LocalCluster] = {}
+
+
+def _get_model(cluster_id: str) -> dict:
+    cluster = clusters[cluster_id]
+    return {
+        "id": cluster_id,
+        "name": cluster_id,
+        "scheduler_address": cluster.scheduler_address,
+        "dashboard_link": cluster.dashboard_link,
+        "workers": len(cluster.scheduler_info["workers"]),
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Handler of the requests to the Dask extension."""
+
+    def do_PUT(self):
+        if self._check("/dask/clusters/"):
+            cluster_id = f"cluster-{len(clusters)}"
+            clusters[cluster_id] = LocalCluster(
+                n_workers=0,
+                processes=False,
+                protocol="tcp://",
+                host="127.0.0.1",
+                dashboard_address=":0",
+            )
+            self._reply(_get_model(cluster_id))
+
+    def do_PATCH(self):
+        if self._check("/dask/clusters/"):
+            cluster_id = self.path.rsplit("/", 1)[-1]
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            clusters[cluster_id].scale(body["workers"])
+            self._reply(_get_model(cluster_id))
+
+    def _check(self, prefix: str) -> bool:
+        if self.headers.get("Authorization") != f"token {TOKEN}":
+            self.send_error(403)
+            return False
+        if not self.path.startswith(prefix):
+            self.send_error(404)
+            return False
+        return True
+
+    def _reply(self, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port = server.server_address[1]
+    print("Jupyter Server is running at:", flush=True)
+    print(f"http://127.0.0.1:{port}/lab?token={TOKEN}", flush=True)
+    server.serve_forever()
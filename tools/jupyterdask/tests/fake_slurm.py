@@ -0,0 +1,148 @@
+"""Stand-in for the SLURM commands, running the jobs as local processes.
+
+The fake server of the tests (see `fake_cluster.py`) runs this script as `sbatch`,
+`squeue`, `scancel` and `sacct`. Each job runs its script with bash right away, in
+its own process group, and is listed as running until its process ends. The tasks
+of job arrays run at once, as jobs with IDs `<array ID>_<index>`. The jobs are
+recorded in the directory given by the `FAKE_SLURM_DIR` environment variable.
+"""
+
+import argparse
+import fcntl
+import getpass
+import json
+import os
+import pathlib
+import re
+import signal
+import subprocess
+import sys
+
+STATE_DIR = pathlib.Path(os.environ.get("FAKE_SLURM_DIR", "."))
+
+
+def sbatch(args: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog="sbatch")
+    parser.add_argument("--job-name")
+    parser.add_argument("--array")
+    parser.add_argument("--parsable", action="store_true")
+    parser.add_argument("script", nargs="?")
+    options = parser.parse_args(args)
+    script = sys.stdin.read() if options.script is None else open(options.script).read()
+    directives = dict(re.findall(r"^#SBATCH --([\w-]+)=?(\S*)", script, re.MULTILINE))
+    name = options.job_name or directives.get("job-name") or "sbatch"
+    with _locked():
+        jobs = _read_jobs()
+        job_id = str(max((int(j.split("_")[0]) for j in jobs), default=100) + 1)
+        script_file = STATE_DIR / f"{job_id}.sh"
+        script_file.write_text(script)
+        env = {**os.environ, "SLURM_JOB_ID": job_id, "SLURM_JOB_NAME": name}
+        if options.array is None:
+            jobs[job_id] = _start(script_file, directives, name, job_id, env)
+        else:
+            # All the tasks run at once, the throttle (e.g. "%2") is only recorded
+            for index in _parse_array(options.array):
+                task_id = f"{job_id}_{index}"
+                task_env = {**env, "SLURM_ARRAY_TASK_ID": str(index)}
+                jobs[task_id] = _start(script_file, directives, name, task_id, task_env)
+                jobs[task_id]["array"] = options.array
+        _write_jobs(jobs)
+    print(f"{job_id};fake" if options.parsable else f"Submitted batch job {job_id}")
+
+
+def _start(
+    script_file: pathlib.Path, directives: dict, name: str, job_id: str, env: dict
+) -> dict:
+    output = directives.get("output") or "slurm-%j.out"
+    output = output.replace("%x", name).replace("%j", job_id)
+    with open(output, "a") as log:
+        process = subprocess.Popen(
+            ["bash", str(script_file)],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=env,
+            start_new_session=True,
+        )
+    return {"name": name, "pid": process.pid}
+
+
+def _parse_array(array: str) -> list[int]:
+    indices = []
+    for part in array.split("%")[0].split(","):
+        first, _, last = part.partition("-")
+        indices.extend(range(int(first), int(last or first) + 1))
+    return indices
+
+
+def squeue(args: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog="squeue", add_help=False)
+    parser.add_argument("--user", "-u")
+    parser.add_argument("--noheader", "-h", action="store_true")
+    parser.add_argument("--name", "-n")
+    parser.add_argument("--jobs", "-j")
+    parser.add_argument("--format", "-o", default="%i %j %T")
+    options = parser.parse_args(args)
+    for job_id, job in _read_jobs().items():
+        if not _is_running(job):
+            continue
+        if options.name and job["name"] not in options.name.split(","):
+            continue
+        if options.jobs and job_id.split("_")[0] not in options.jobs.split(","):
+            continue
+        fields = {
+            "A": job_id.split("_")[0],
+            "i": job_id,
+            "j": job["name"],
+            "T": "RUNNING",
+            "N": "localhost",
+            "L": "1:00:00",
+            "D": "1",
+            "u": getpass.getuser(),
+        }
+        print(re.sub(r"%(\w)", lambda m, f=fields: f[m.group(1)], options.format))
+
+
+def scancel(args: list[str]) -> None:
+    jobs = _read_jobs()
+    for job_id, job in jobs.items():
+        # Cancelling a job array cancels all its tasks
+        if {job_id, job_id.split("_")[0]} & set(args) and _is_running(job):
+            os.killpg(job["pid"], signal.SIGTERM)
+
+
+def sacct(args: list[str]) -> None:
+    # Finished jobs are not accounted for
+    pass
+
+
+def _is_running(job: dict) -> bool:
+    try:
+        with open(f"/proc/{job['pid']}/stat") as f:
+            # Processes that have ended but are not reaped yet are zombies
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+def _locked():
+    lock = open(STATE_DIR / "jobs.lock", "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def _read_jobs() -> dict[str, dict]:
+    try:
+        return json.loads((STATE_DIR / "jobs.json").read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def _write_jobs(jobs: dict[str, dict]) -> None:
+    (STATE_DIR / "jobs.json").write_text(json.dumps(jobs))
+
+
+if __name__ == "__main__":
+    {"sbatch": sbatch, "squeue": squeue, "scancel": scancel, "sacct": sacct}[
+        sys.argv[1]
+    ](sys.argv[2:])
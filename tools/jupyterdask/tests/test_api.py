@@ -0,0 +1,63 @@
+import functools
+import pathlib
+import sys
+
+import pytest
+
+from jupyterdask import api
+from jupyterdask.jobs import JobMonitor
+
+pytest.importorskip("distributed")
+
+FAKE_JUPYTER = pathlib.Path(__file__).parent / "fake_jupyter.py"
+
+TEMPLATE = """#!/bin/bash
+#SBATCH --output={{ log_dir }}/%x-%j.out
+{{ python }} FAKE_JUPYTER
+"""
+
+
+@pytest.fixture
+def session_kwargs(tmp_path, remote_cluster):
+    template = tmp_path / "template.slurm"
+    template.write_text(TEMPLATE.replace("FAKE_JUPYTER", str(FAKE_JUPYTER)))
+    return {
+        "host": remote_cluster.host,
+        "identity_file": remote_cluster.identity_file,
+        "template": str(template),
+        "python": sys.executable,
+        "timeout": 60,
+    }
+
+
+def _get_running_jobs(remote_cluster) -> list[str]:
+    res = remote_cluster.run("squeue --noheader --format %j")
+    return res.stdout.split()
+
+
+def test_session(session_kwargs, remote_cluster):
+    with api.Session(**session_kwargs) as session:
+        assert session.client.submit(sum, [1, 2]).result() == 3
+        assert _get_running_jobs(remote_cluster) == [session.record.session_id]
+    assert _get_running_jobs(remote_cluster) == []
+
+
+def test_concurrent_sessions(session_kwargs, remote_cluster):
+    # Sessions started by the same process have their own jobs
+    with api.Session(**session_kwargs) as session:
+        with api.Session(**session_kwargs) as other:
+            assert session.record.session_id != other.record.session_id
+        assert _get_running_jobs(remote_cluster) == [session.record.session_id]
+        assert session.client.submit(sum, [1, 2]).result() == 3
+
+
+def test_session_ended(session_kwargs, remote_cluster, monkeypatch, caplog):
+    monkeypatch.setattr(api, "KEEPALIVE_INTERVAL", 0.1)
+    monkeypatch.setattr(api, "JobMonitor", functools.partial(JobMonitor, interval=0))
+    with api.Session(**session_kwargs) as session:
+        remote_cluster.run(f"scancel {session.record.job_id}")
+        session._watcher.join(timeout=30)
+        assert not session._watcher.is_alive()
+    assert ("WARNING", f"Session ended: Job {session.record.job_id} has ended.") in [
+        (record.levelname, record.getMessage()) for record in caplog.records
+    ]
@@ -0,0 +1,58 @@
+import pytest
+from conftest import load_script
+
+cache = load_script("modules/jupyterdask_cache.py")
+
+
+def _add_entry(cache_dir, index, key, size, used, jobs):
+    path = cache_dir / key
+    path.mkdir()
+    (path / "data.bin").write_bytes(bytes(size))
+    index[key] = {"size": size, "used": used, "jobs": jobs}
+
+
+def test_record_use(monkeypatch):
+    index = {"a": {"size": 1, "used": 0.0, "jobs": ["100"]}}
+    monkeypatch.setenv("SLURM_JOB_ID", "101")
+    cache.record_use(index, "a", size=2)
+    cache.record_use(index, "b", size=3)
+    assert index["a"]["jobs"] == ["100", "101"]
+    assert index["a"]["size"] == 2
+    assert index["a"]["used"] > 0
+    assert index["b"]["jobs"] == ["101"]
+
+
+def test_evict(tmp_path, squeue):
+    index = {}
+    squeue.write_text("100\n")
+    _add_entry(tmp_path, index, "a", 4, used=1.0, jobs=["100"])
+    _add_entry(tmp_path, index, "b", 4, used=2.0, jobs=["101"])
+    _add_entry(tmp_path, index, "c", 4, used=3.0, jobs=[])
+    _add_entry(tmp_path, index, "d", 4, used=4.0, jobs=[])
+    evicted = cache.evict(str(tmp_path), index, max_size=12, keep={"d"})
+    # The entry used by the running job 100 is kept
+    assert evicted == ["b"]
+    assert sorted(index) == ["a", "c", "d"]
+    assert index["a"]["jobs"] == ["100"]
+    assert not (tmp_path / "b").exists()
+    assert (tmp_path / "a").exists()
+
+
+def test_evict_under_size(tmp_path):
+    index = {}
+    _add_entry(tmp_path, index, "a", 4, used=1.0, jobs=["100"])
+    assert cache.evict(str(tmp_path), index, max_size=8, keep=set()) == []
+    assert index["a"]["jobs"] == ["100"]
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [("50GiB", 50 * 2**30), ("500MB", 500 * 10**6), ("1.5 KiB", 1536), ("10", 10)],
+)
+def test_parse_size(size, expected):
+    assert cache.parse_size(size) == expected
+
+
+def test_parse_size_invalid():
+    with pytest.raises(ValueError):
+        cache.parse_size("10 parsecs")
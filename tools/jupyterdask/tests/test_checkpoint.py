@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from conftest import load_script
+
+da = pytest.importorskip("dask.array")
+pytest.importorskip("zarr")
+
+checkpoint = load_script("modules/jupyterdask_checkpoint.py")
+
+
+def test_checkpoint(tmp_path):
+    x = da.arange(100, chunks=30)
+    y = checkpoint.checkpoint(x * 2, cache_dir=str(tmp_path), max_size=2**20)
+    assert (y.compute() == x.compute() * 2).all()
+    (key,) = checkpoint.list_checkpoints(str(tmp_path))
+    # The same collection is loaded from the cache
+    z = checkpoint.checkpoint(x * 2, cache_dir=str(tmp_path), max_size=2**20)
+    assert z.name != (x * 2).name
+    assert list(checkpoint.list_checkpoints(str(tmp_path))) == [key]
+
+
+def test_checkpoint_keeps_checkpoints_in_use(tmp_path, squeue, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    squeue.write_text("100\n102\n")
+    # Random values, which are not compressed
+    x = da.from_array(np.random.default_rng(0).random(10**4))
+    # The sessions of jobs 100 and 102 are still running, the one of job 101 has ended
+    for job_id, value in (("100", x), ("101", x + 1), ("102", x + 2)):
+        monkeypatch.setenv("SLURM_JOB_ID", job_id)
+        checkpoint.checkpoint(value, cache_dir=cache_dir, max_size=10**5)
+    index = checkpoint.list_checkpoints(cache_dir)
+    assert sorted(entry["jobs"] for entry in index.values()) == [["100"], ["102"]]
@@ -0,0 +1,92 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+from jupyterdask.config import DEFAULT_CONFIGS, get_worker_lifetime, parse_walltime
+
+
+@pytest.mark.parametrize(
+    "walltime, seconds",
+    [
+        ("30", 30 * 60),
+        ("30:15", 30 * 60 + 15),
+        ("01:00:00", 3600),
+        ("12:30:05", 12 * 3600 + 30 * 60 + 5),
+        ("2-0", 2 * 86400),
+        ("1-12", 86400 + 12 * 3600),
+        ("1-12:30", 86400 + 12 * 3600 + 30 * 60),
+        ("1-12:30:05", 86400 + 12 * 3600 + 30 * 60 + 5),
+        ("0-00:05:00", 300),
+    ],
+)
+def test_parse_walltime(walltime, seconds):
+    assert parse_walltime(walltime) == seconds
+
+
+def _config(**kwargs):
+    return dataclasses.replace(DEFAULT_CONFIGS["snellius"], **kwargs)
+
+
+def test_worker_lifetime():
+    config = _config(worker_walltime="01:00:00", worker_lifetime_margin="00:05:00")
+    assert get_worker_lifetime(config) == {
+        "worker_lifetime": "3120s",
+        "worker_lifetime_stagger": "180s",
+    }
+
+
+def test_worker_lifetime_with_days():
+    config = _config(worker_walltime="1-00:00:00", worker_lifetime_margin="10")
+    assert get_worker_lifetime(config) == {
+        "worker_lifetime": f"{86400 - 600 - 4320}s",
+        "worker_lifetime_stagger": "4320s",
+    }
+
+
+def test_worker_lifetime_without_margin():
+    assert get_worker_lifetime(_config(worker_lifetime_margin=None)) is None
+
+
+@pytest.mark.parametrize("walltime", ["00:05:00", "00:04:00", "5"])
+def test_worker_lifetime_shorter_than_margin(walltime):
+    config = _config(worker_walltime=walltime, worker_lifetime_margin="00:05:00")
+    with pytest.raises(ValueError, match="too short"):
+        get_worker_lifetime(config)
+
+
+calls = []
+
+
+def _record_call(x):
+    calls.append(x)
+    return x + 1
+
+
+def test_worker_retires_after_lifetime():
+    distributed = pytest.importorskip("distributed")
+
+    async def run():
+        async with (
+            distributed.LocalCluster(
+                n_workers=1,
+                processes=False,
+                dashboard_address=":0",
+                asynchronous=True,
+            ) as cluster,
+            distributed.Worker(cluster.scheduler_address, lifetime="2s") as worker,
+            distributed.Client(cluster, asynchronous=True) as client,
+        ):
+            futures = client.map(_record_call, range(10), workers=[worker.address])
+            await distributed.wait(futures)
+            while worker.status != distributed.core.Status.closed:
+                await asyncio.sleep(0.1)
+            # The results were handed over to the remaining worker
+            assert await client.gather(futures) == list(range(1, 11))
+            (remaining,) = cluster.scheduler.workers.values()
+            assert all(ts.who_has == {remaining} for ts in remaining.has_what)
+            assert len(remaining.has_what) == 10
+
+    asyncio.run(run())
+    # The tasks ran once, none was lost or recomputed
+    assert sorted(calls) == list(range(10))
@@ -0,0 +1,81 @@
+import json
+import stat
+
+import pytest
+import yaml
+
+from jupyterdask.env import get_lock_hash, lock_environment
+
+ENVIRONMENT = """\
+name: analysis
+channels:
+  - conda-forge
+dependencies:
+  - python=3.11
+  - dask
+  - pip:
+    - some-package
+"""
+
+PACKAGES = [
+    {"name": "python", "version": "3.11.9", "build_string": "h0_cpython"},
+    {"name": "dask", "version": "2024.8.0", "build_string": "pyhd8ed1ab_0"},
+]
+
+
+@pytest.fixture
+def env_file(tmp_path):
+    path = tmp_path / "environment.yaml"
+    path.write_text(ENVIRONMENT)
+    return str(path)
+
+
+@pytest.fixture
+def solver(tmp_path):
+    # Stand-in for micromamba, recording its arguments
+    path = tmp_path / "micromamba"
+    output = json.dumps({"actions": {"LINK": PACKAGES}})
+    path.write_text(f"#!/bin/sh\necho \"$@\" > {tmp_path}/args\necho '{output}'\n")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def test_lock_pins_packages(env_file, solver):
+    locked = yaml.safe_load(lock_environment(env_file, solver=solver))
+    assert locked["name"] == "analysis"
+    assert locked["channels"] == ["conda-forge"]
+    assert locked["dependencies"] == [
+        "dask=2024.8.0=pyhd8ed1ab_0",
+        "python=3.11.9=h0_cpython",
+        {"pip": ["some-package"]},
+    ]
+
+
+def test_lock_solves_with_local_channels(env_file, solver, tmp_path):
+    lock = lock_environment(env_file, channels=["file:///mirror"], solver=solver)
+    args = (tmp_path / "args").read_text().split()
+    assert args[args.index("--channel") + 1] == "file:///mirror"
+    # The remote cluster uses the upstream channels
+    assert yaml.safe_load(lock)["channels"] == ["conda-forge"]
+
+
+def test_lock_records_remote_channels(env_file, solver):
+    channels = ["file:///mirror", "https://example.org/channel"]
+    lock = lock_environment(env_file, channels=channels, solver=solver)
+    assert yaml.safe_load(lock)["channels"] == ["https://example.org/channel"]
+
+
+def test_lock_refuses_local_channels_of_env_file(tmp_path, solver):
+    path = tmp_path / "environment.yaml"
+    path.write_text(ENVIRONMENT.replace("conda-forge", "file:///mirror"))
+    with pytest.raises(ValueError, match="file:///mirror"):
+        lock_environment(str(path), solver=solver)
+
+
+def test_lock_hash(env_file, solver):
+    lock = lock_environment(env_file, solver=solver)
+    assert get_lock_hash(lock) == get_lock_hash(
+        lock_environment(env_file, solver=solver)
+    )
+    assert len(get_lock_hash(lock)) == 16
+    assert get_lock_hash(lock) != get_lock_hash(lock.replace("2024.8.0", "2024.9.0"))
@@ -0,0 +1,147 @@
+import functools
+import json
+import sys
+
+import dask
+import pytest
+from conftest import load_script
+from fabric import Connection
+
+from jupyterdask import jobs, main, remote
+
+run_payload = load_script("scripts/run_payload.py")
+
+SCRIPT = """\
+import os
+import sys
+import time
+
+print("started", sys.argv[1:], flush=True)
+time.sleep(1)
+print("scheduler", os.environ["DASK_SCHEDULER_ADDRESS"], flush=True)
+sys.exit(3)
+"""
+
+NOTEBOOK = {
+    "cells": [
+        {
+            "cell_type": "code",
+            "execution_count": None,
+            "metadata": {},
+            "outputs": [],
+            "source": "print(6 * 7)",
+        }
+    ],
+    "metadata": {"kernelspec": {"name": "python3", "display_name": "Python 3"}},
+    "nbformat": 4,
+    "nbformat_minor": 4,
+}
+
+
+@pytest.fixture
+def local_factory():
+    # As set by the job script template, with a local cluster in place of SLURM
+    factory = {
+        "module": "distributed",
+        "class": "LocalCluster",
+        "kwargs": {
+            "n_workers": 0,
+            "processes": False,
+            "protocol": "tcp://",
+            "dashboard_address": ":0",
+        },
+    }
+    with dask.config.set({"labextension.factory": factory}):
+        yield
+
+
+@pytest.mark.parametrize(
+    "payload, expected",
+    [
+        ("run.py", [sys.executable, "run.py", "-v"]),
+        (
+            "dir/analysis.ipynb",
+            [
+                sys.executable,
+                *("-m", "nbconvert", "--to", "notebook", "--execute"),
+                *("--output", "analysis.out.ipynb", "dir/analysis.ipynb"),
+            ],
+        ),
+    ],
+)
+def test_get_command(payload, expected):
+    # Notebooks are executed with nbconvert, which takes no arguments
+    assert run_payload.get_command(payload, ["-v"]) == expected
+
+
+def test_run_writes_exit_code(tmp_path, local_factory, capfd):
+    pytest.importorskip("distributed")
+    script = tmp_path / "run.py"
+    script.write_text(SCRIPT)
+    exit_code_file = tmp_path / "exit-code"
+    exit_code = run_payload.run(str(script), ["a"], 0, str(exit_code_file))
+    assert exit_code == 3
+    assert exit_code_file.read_text() == "3"
+    out = capfd.readouterr().out
+    assert "started ['a']" in out
+    assert "scheduler tcp://" in out
+
+
+def test_log_follower(remote_cluster, capsys):
+    log_file = remote_cluster.home / "job.out"
+    connect_kwargs = {"key_filename": remote_cluster.identity_file}
+    with Connection(remote_cluster.host, connect_kwargs=connect_kwargs) as conn:
+        follower = remote._LogFollower(conn, "job.out")
+        # The log file is created once the job starts
+        follower()
+        assert capsys.readouterr().out == ""
+        log_file.write_text("first line\npartial")
+        follower()
+        assert capsys.readouterr().out == "first line\npartial"
+        follower()
+        assert capsys.readouterr().out == ""
+        with open(log_file, "a") as f:
+            f.write(" line\nété\n")
+        follower()
+        assert capsys.readouterr().out == " line\nété\n"
+
+
+@pytest.fixture
+def exec_kwargs(remote_cluster, monkeypatch, tmp_path):
+    pytest.importorskip("dask_jobqueue")
+    monkeypatch.setattr(remote, "LOG_FOLLOW_INTERVAL", 0.2)
+    monkeypatch.setattr(
+        remote, "JobMonitor", functools.partial(jobs.JobMonitor, interval=0.5)
+    )
+    return {
+        "host": remote_cluster.host,
+        "identity_file": remote_cluster.identity_file,
+        "python": sys.executable,
+        "workers": 0,
+        "output_dir": str(tmp_path / "output"),
+    }
+
+
+def test_exec_script(tmp_path, exec_kwargs, capsys):
+    script = tmp_path / "run.py"
+    script.write_text(SCRIPT)
+    with pytest.raises(SystemExit) as exc_info:
+        main.exec_payload(payload=str(script), args=["a", "b"], **exec_kwargs)
+    # The exit code of the payload is the one of the command
+    assert exc_info.value.code == 3
+    out = capsys.readouterr().out
+    assert "started ['a', 'b']" in out
+    assert "scheduler tcp://" in out
+    assert (tmp_path / "output" / "run.py").read_text() == SCRIPT
+
+
+def test_exec_notebook(tmp_path, exec_kwargs):
+    pytest.importorskip("nbconvert")
+    notebook = tmp_path / "analysis.ipynb"
+    notebook.write_text(json.dumps(NOTEBOOK))
+    with pytest.raises(SystemExit) as exc_info:
+        main.exec_payload(payload=str(notebook), **exec_kwargs)
+    assert exc_info.value.code == 0
+    executed = json.loads((tmp_path / "output" / "analysis.out.ipynb").read_text())
+    (output,) = executed["cells"][0]["outputs"]
+    assert "".join(output["text"]) == "42\n"
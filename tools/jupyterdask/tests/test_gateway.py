@@ -0,0 +1,152 @@
+import getpass
+import json
+import os
+import pwd
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+from conftest import PACKAGE_DIR, load_script
+
+pytest.importorskip("distributed")
+web = pytest.importorskip("tornado.web")
+httpclient = pytest.importorskip("tornado.httpclient")
+
+gateway = load_script("scripts/gateway.py")
+gateway_module = load_script("modules/jupyterdask_gateway.py")
+
+# Local clusters, whose schedulers are reachable from other processes
+FACTORY_ENV = {
+    "DASK_LABEXTENSION__FACTORY__MODULE": "distributed",
+    "DASK_LABEXTENSION__FACTORY__CLASS": "LocalCluster",
+    "DASK_LABEXTENSION__FACTORY__KWARGS": (
+        "{'processes': False, 'protocol': 'tcp://', 'host': '127.0.0.1', "
+        "'dashboard_address': ':0'}"
+    ),
+}
+
+
+@pytest.fixture
+def gateway_file(tmp_path, monkeypatch):
+    """Gateway running locally, in the same way as in the gateway job."""
+    path = tmp_path / "gateway.json"
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            str(PACKAGE_DIR / "scripts" / "gateway.py"),
+            "--gateway-file",
+            str(path),
+            "--max-workers",
+            "2",
+        ],
+        env={**os.environ, **FACTORY_ENV},
+    )
+    try:
+        while not path.exists():
+            assert process.poll() is None, "The gateway has failed to start"
+            time.sleep(0.1)
+        # Tokens are issued again by each gateway
+        monkeypatch.setattr(gateway_module, "_tokens", {})
+        yield str(path)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+@pytest.fixture
+def auth_gateway(tmp_path):
+    auth_dir = tmp_path / "auth"
+    auth_dir.mkdir()
+    return gateway.Gateway(max_clusters=1, max_workers=1, auth_dir=str(auth_dir))
+
+
+def _get_status(gateway_file: str, path: str, headers: dict) -> int:
+    with open(gateway_file) as f:
+        address = json.load(f)["address"]
+    request = urllib.request.Request(f"{address}/{path}", headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_gateway_cluster(gateway_file):
+    from distributed import Client
+
+    with gateway_module.GatewayCluster(gateway_file=gateway_file) as cluster:
+        assert cluster._cluster_name.startswith(f"{getpass.getuser()}-")
+        cluster.scale(1)
+        with Client(cluster) as client:
+            client.wait_for_workers(1)
+            assert client.submit(sum, [1, 2]).result() == 3
+        with pytest.raises(httpclient.HTTPClientError, match="403"):
+            cluster.scale(3)
+    # The answer to the challenge is removed
+    with open(gateway_file) as f:
+        assert os.listdir(json.load(f)["auth_dir"]) == []
+
+
+def test_gateway_rejects_requests_without_token(gateway_file):
+    # The user cannot be chosen by the client
+    headers = {"X-Jupyterdask-User": getpass.getuser()}
+    assert _get_status(gateway_file, "clusters/", headers) == 403
+    headers["Authorization"] = "token invalid"
+    assert _get_status(gateway_file, "clusters/", headers) == 403
+
+
+def test_issue_token(auth_gateway):
+    challenge = auth_gateway.challenge()
+    with open(challenge["path"], "w") as f:
+        f.write(challenge["challenge"])
+    response = auth_gateway.issue_token(challenge["challenge"])
+    assert response["user"] == getpass.getuser()
+    assert auth_gateway.tokens[response["token"]] == getpass.getuser()
+    # Challenges are only answered once
+    with pytest.raises(web.HTTPError):
+        auth_gateway.issue_token(challenge["challenge"])
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="changing file owners requires root")
+def test_issue_token_to_file_owner(auth_gateway):
+    challenge = auth_gateway.challenge()
+    with open(challenge["path"], "w") as f:
+        f.write(challenge["challenge"])
+    os.chown(challenge["path"], 65534, -1)
+    response = auth_gateway.issue_token(challenge["challenge"])
+    assert response["user"] == pwd.getpwuid(65534).pw_name
+
+
+def test_issue_token_invalid_answers(auth_gateway, tmp_path):
+    # Unknown challenge
+    with pytest.raises(web.HTTPError):
+        auth_gateway.issue_token("0" * 32)
+    # Not answered
+    challenge = auth_gateway.challenge()["challenge"]
+    with pytest.raises(web.HTTPError):
+        auth_gateway.issue_token(challenge)
+    # Wrong content
+    challenge = auth_gateway.challenge()
+    with open(challenge["path"], "w") as f:
+        f.write("answer")
+    with pytest.raises(web.HTTPError):
+        auth_gateway.issue_token(challenge["challenge"])
+    # Link to a file of another user
+    challenge = auth_gateway.challenge()
+    target = tmp_path / "target"
+    target.write_text(challenge["challenge"])
+    os.symlink(target, challenge["path"])
+    with pytest.raises(web.HTTPError):
+        auth_gateway.issue_token(challenge["challenge"])
+
+
+def test_issue_token_expired_challenge(auth_gateway, monkeypatch):
+    monkeypatch.setattr(gateway, "CHALLENGE_TIMEOUT", -1)
+    challenge = auth_gateway.challenge()
+    with open(challenge["path"], "w") as f:
+        f.write(challenge["challenge"])
+    with pytest.raises(web.HTTPError):
+        auth_gateway.issue_token(challenge["challenge"])
@@ -0,0 +1,188 @@
+import json
+import types
+
+import pytest
+
+from jupyterdask import jobs
+from jupyterdask.jobs import JobMonitor
+
+
+class FakeConnection:
+    """Connection running a stubbed squeue, listing the jobs set in `queue`."""
+
+    def __init__(self, host: str = "cluster", user: str = "user"):
+        self.host = host
+        self.user = user
+        self.queue: dict[str, tuple[str, str]] | None = {}
+        self.calls = 0
+
+    def run(self, command, warn=False, hide=False):
+        assert command.startswith("squeue --user $USER")
+        self.calls += 1
+        if self.queue is None:
+            return types.SimpleNamespace(exited=1, stdout="", stderr="squeue failed")
+        lines = [
+            f"{job_id}|{name}|{state}|node1"
+            for job_id, (name, state) in self.queue.items()
+        ]
+        return types.SimpleNamespace(exited=0, stdout="\n".join(lines), stderr="")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(jobs, "time", clock)
+    monkeypatch.setattr(jobs, "JOBS_CACHE_DIR", tmp_path / "jobs")
+    return clock
+
+
+def test_get_state(clock):
+    connection = FakeConnection()
+    connection.queue = {"101": ("session", "PENDING")}
+    monitor = JobMonitor(connection, interval=10)
+    assert monitor.get_state(101) == "PENDING"
+    assert monitor.get_job("101") == {
+        "job_id": "101",
+        "name": "session",
+        "state": "PENDING",
+        "node": "node1",
+    }
+    assert monitor.get_state(102) is None
+    assert not monitor.is_active(102)
+    # The queue is listed once per interval, whatever the number of jobs
+    assert connection.calls == 1
+    clock.now += 10
+    connection.queue = {"101": ("session", "RUNNING")}
+    assert monitor.get_state(101) == "RUNNING"
+    assert connection.calls == 2
+
+
+def test_fresh_cache_is_shared(clock, tmp_path):
+    connection = FakeConnection()
+    connection.queue = {"101": ("session", "RUNNING")}
+    assert JobMonitor(connection).get_state(101) == "RUNNING"
+    cache_file = tmp_path / "jobs" / "user@cluster.json"
+    assert json.loads(cache_file.read_text())["time"] == clock.now
+    # Another process monitoring the same cluster reuses the listing
+    clock.now += 5
+    other = FakeConnection()
+    assert JobMonitor(other).get_state(101) == "RUNNING"
+    assert other.calls == 0
+    # but not the one of another user
+    assert JobMonitor(FakeConnection(user="other")).get_state(101) is None
+
+
+def test_stale_cache_is_refreshed(clock, tmp_path):
+    connection = FakeConnection()
+    connection.queue = {"101": ("session", "RUNNING")}
+    JobMonitor(connection).get_state(101)
+    clock.now += jobs.JOB_STATE_INTERVAL
+    other = FakeConnection()
+    assert JobMonitor(other).get_state(101) is None
+    assert other.calls == 1
+    cache_file = tmp_path / "jobs" / "user@cluster.json"
+    assert json.loads(cache_file.read_text()) == {"time": clock.now, "jobs": {}}
+
+
+def test_watched_job_is_listed_again(clock):
+    connection = FakeConnection()
+    monitor = JobMonitor(connection)
+    assert monitor.get_state(101) is None
+    # A job submitted after the last listing is not considered to have left
+    clock.now += 1
+    connection.queue = {"101": ("session", "PENDING")}
+    monitor.watch(101)
+    assert monitor.get_state(101) == "PENDING"
+    assert connection.calls == 2
+
+
+def test_failed_listing_keeps_states(clock):
+    connection = FakeConnection()
+    connection.queue = {"101": ("session", "RUNNING")}
+    monitor = JobMonitor(connection)
+    assert monitor.get_state(101) == "RUNNING"
+    clock.now += 10
+    connection.queue = None
+    assert monitor.get_state(101) == "RUNNING"
+    # The queue is listed again at the next call
+    clock.now += 1
+    connection.queue = {}
+    assert monitor.get_state(101) is None
+
+
+def test_history_and_queue_wait(clock):
+    connection = FakeConnection()
+    monitor = JobMonitor(connection, interval=1)
+    connection.queue = {"101": ("session", "PENDING"), "102": ("other", "RUNNING")}
+    monitor.get_state(101)
+    clock.now += 1
+    # Unchanged states are not recorded again
+    monitor.get_state(101)
+    clock.now += 30
+    connection.queue = {"101": ("session", "RUNNING")}
+    monitor.get_state(101)
+    clock.now += 60
+    connection.queue = {}
+    monitor.get_state(101)
+    assert [(t.time, t.state) for t in monitor.get_transitions(101)] == [
+        (1000, "PENDING"),
+        (1031, "RUNNING"),
+        (1091, None),
+    ]
+    assert [(t.time, t.state) for t in monitor.get_transitions("102")] == [
+        (1000, "RUNNING"),
+        (1031, None),
+    ]
+    assert monitor.get_queue_wait(101) == 31
+    # The job was already running when first listed
+    assert monitor.get_queue_wait(102) is None
+    assert monitor.get_queue_wait(103) is None
+
+
+def test_history_is_bounded(clock, monkeypatch):
+    monkeypatch.setattr(jobs, "HISTORY_LENGTH", 4)
+    connection = FakeConnection()
+    monitor = JobMonitor(connection, interval=1)
+    for state in ("PENDING", "RUNNING", "COMPLETING", "PENDING", "RUNNING"):
+        connection.queue = {"101": ("session", state)}
+        monitor.get_state(101)
+        clock.now += 1
+    assert [t.state for t in monitor.history] == [
+        "RUNNING",
+        "COMPLETING",
+        "PENDING",
+        "RUNNING",
+    ]
+    # The oldest transitions are forgotten
+    assert monitor.get_queue_wait(101) == 1
+
+
+def test_get_array_states(clock):
+    connection = FakeConnection()
+    connection.queue = {
+        "200_[4-7%2]": ("sweep", "PENDING"),
+        "200_1": ("sweep", "RUNNING"),
+        "200_2": ("sweep", "COMPLETING"),
+        "2001_0": ("other", "RUNNING"),
+        "200": ("not-an-array", "RUNNING"),
+    }
+    monitor = JobMonitor(connection)
+    monitor.watch(200)
+    assert monitor.get_array_states(200) == {
+        1: "RUNNING",
+        2: "COMPLETING",
+        4: "PENDING",
+        5: "PENDING",
+        6: "PENDING",
+        7: "PENDING",
+    }
+    assert monitor.get_array_states(201) == {}
+    assert connection.calls == 1
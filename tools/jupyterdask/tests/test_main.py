@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+import pytest
+
+from jupyterdask.cli import COMMANDS
+
+HEAVY_MODULES = ("fabric", "paramiko", "jinja2", "yaml")
+
+
+def _get_imported(code: str, *args: str) -> set[str]:
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {line.split("|")[-1].strip() for line in res.stderr.splitlines()}
+
+
+def test_import_is_lightweight():
+    # Heavy dependencies are only imported by the commands that use them
+    imported = _get_imported("import jupyterdask.main")
+    assert not imported & set(HEAVY_MODULES)
+
+
+@pytest.mark.parametrize("command", ["run", *COMMANDS])
+def test_help_is_lightweight(command):
+    # The startup time of each command is measured by benchmarks/cli_startup.py
+    argv = ["--help"] if command == "run" else [command, "--help"]
+    imported = _get_imported("from jupyterdask.main import main; main()", *argv)
+    assert "jupyterdask.cli" in imported
+    assert not imported & set(HEAVY_MODULES)
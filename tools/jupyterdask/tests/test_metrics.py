@@ -0,0 +1,143 @@
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from jupyterdask.metrics import MetricsStore, SchedulerSampler
+from jupyterdask.sessions import SessionRecord
+
+COUNTS = {"workers": 2, "cores": 8, "processing": 4, "memory": 10, "released": 5}
+IDENTITY = {
+    "workers": {
+        "tcp://a": {"memory_limit": 100, "metrics": {"executing": 3, "memory": 40}},
+        "tcp://b": {"memory_limit": 100, "metrics": {"executing": 1, "memory": 20}},
+    }
+}
+
+
+class FakeJupyter:
+    """Jupyter server listing Dask clusters, with their dashboards proxied."""
+
+    def __init__(self):
+        self.clusters = []
+        self.responses = {}
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802
+                if self.path == "/dask/clusters":
+                    body = json.dumps(fake.clusters)
+                elif self.path in fake.responses:
+                    body = fake.responses[self.path]
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add_cluster(self, name, counts=COUNTS, identity=IDENTITY):
+        prefix = f"/proxy/{name}"
+        self.clusters.append({"name": name, "dashboard_link": f"{prefix}/status"})
+        self.responses[f"{prefix}/json/counts.json"] = json.dumps(counts)
+        self.responses[f"{prefix}/json/identity.json"] = json.dumps(identity)
+        return prefix
+
+
+@pytest.fixture
+def jupyter():
+    fake = FakeJupyter()
+    yield fake
+    fake.server.shutdown()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MetricsStore(tmp_path / "metrics.sqlite")
+
+
+@pytest.fixture
+def sampler(store, jupyter):
+    session = SessionRecord("jupyter-session", "host", ".jupyterdask")
+    return SchedulerSampler(store, session, jupyter.url, token="token")
+
+
+def test_sample(jupyter, store, sampler):
+    jupyter.add_cluster("a")
+    sampler()
+    values = store.latest[("jupyter-session", "a")]
+    assert values["workers"] == 2
+    assert values["tasks_executing"] == 4
+    assert values["memory"] == 60
+    assert values["memory_limit"] == 200
+    assert values["saturation"] == 0.5
+    assert "event_loop_latency_mean" not in values
+
+
+def test_sample_event_loop_latency(jupyter, store, sampler):
+    prefix = jupyter.add_cluster("a")
+    latency = json.dumps({"mean": 0.01, "max": 0.1, "last": None})
+    jupyter.responses[f"{prefix}/json/event-loop.json"] = latency
+    sampler()
+    values = store.latest[("jupyter-session", "a")]
+    assert values["event_loop_latency_mean"] == 0.01
+    assert "event_loop_latency_last" not in values
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        "not JSON",  # e.g. an error page of the proxy
+        json.dumps([1, 2]),  # unexpected content
+    ],
+)
+def test_failed_sample_is_skipped(jupyter, store, sampler, response):
+    prefix = jupyter.add_cluster("a")
+    jupyter.add_cluster("b")
+    jupyter.responses[f"{prefix}/json/identity.json"] = response
+    sampler()
+    assert list(store.latest) == [("jupyter-session", "b")]
+
+
+def test_missing_dashboard_is_skipped(jupyter, store, sampler):
+    prefix = jupyter.add_cluster("a")
+    del jupyter.responses[f"{prefix}/json/counts.json"]
+    jupyter.clusters.append({"name": "b"})
+    sampler()
+    assert store.latest == {}
+
+
+def test_unreachable_jupyter_is_skipped(jupyter, store, sampler):
+    jupyter.server.shutdown()
+    jupyter.server.server_close()
+    sampler()
+    assert store.latest == {}
+
+
+def test_locked_store_is_skipped(jupyter, store, sampler, monkeypatch):
+    jupyter.add_cluster("a")
+
+    def add_sample(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "add_sample", add_sample)
+    sampler()
+    assert store.latest == {}
+
+
+def test_label_values_are_escaped(store):
+    store.add_sample("jupyter-session", 'cluster "a"\\b\nc', {"workers": 2})
+    assert store.to_prometheus() == (
+        "# TYPE jupyterdask_dask_workers gauge\n"
+        'jupyterdask_dask_workers{session="jupyter-session",'
+        'cluster="cluster \\"a\\"\\\\b\\nc"} 2\n'
+    )
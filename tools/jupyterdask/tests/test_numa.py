@@ -0,0 +1,24 @@
+import os
+
+import pytest
+from conftest import load_script
+
+numa = load_script("scripts/numa.py")
+
+
+@pytest.mark.parametrize(
+    "cpulist, cpus",
+    [("0-3", {0, 1, 2, 3}), ("0-1,8-9", {0, 1, 8, 9}), ("5", {5}), ("\n", set())],
+)
+def test_parse_cpulist(cpulist, cpus):
+    assert numa._parse_cpulist(cpulist) == cpus
+
+
+def test_get_numa_domains(tmp_path, monkeypatch):
+    for node, cpulist in ((0, "0-3"), (1, "4-7"), (2, "8-11"), (10, "12-15")):
+        (tmp_path / f"node{node}").mkdir()
+        (tmp_path / f"node{node}" / "cpulist").write_text(f"{cpulist}\n")
+    monkeypatch.setattr(numa, "NODES_DIR", str(tmp_path))
+    # The job is allocated part of the node, domain 2 is left out
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {2, 3, 4, 5, 12})
+    assert numa.get_numa_domains() == [{2, 3}, {4, 5}, {12}]
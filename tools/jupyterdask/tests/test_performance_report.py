@@ -0,0 +1,50 @@
+import json
+import time
+
+import pytest
+from conftest import PACKAGE_DIR
+
+distributed = pytest.importorskip("distributed")
+pytest.importorskip("bokeh")
+
+PRELOAD = str(PACKAGE_DIR / "scripts" / "performance_report.py")
+
+
+def _read_index(path) -> list[dict]:
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def _wait_for_reports(path, count: int) -> list[dict]:
+    for _ in range(60):
+        entries = _read_index(path)
+        if len(entries) >= count:
+            return entries
+        time.sleep(0.5)
+    raise TimeoutError(f"{count} reports not written")
+
+
+def test_reports_per_computation(tmp_path, monkeypatch):
+    monkeypatch.setenv("JUPYTERDASK_REPORTS_DIR", str(tmp_path))
+    with (
+        distributed.LocalCluster(
+            n_workers=1,
+            processes=False,
+            dashboard_address=":0",
+            scheduler_kwargs={"preload": [PRELOAD]},
+        ) as cluster,
+        distributed.Client(cluster) as client,
+    ):
+        assert client.submit(sum, [1, 2]).result() == 3
+        _wait_for_reports(tmp_path / "index.jsonl", 1)
+        futures = client.map(lambda x: x + 1, range(10))
+        assert client.gather(futures) == list(range(1, 11))
+        entries = _wait_for_reports(tmp_path / "index.jsonl", 2)
+
+    assert len(entries) == 2
+    assert [entry["tasks"] for entry in entries] == [1, 10]
+    for entry in entries:
+        assert (tmp_path / entry["report"]).read_text().startswith("<")
+        assert (tmp_path / entry["task_stream"]).exists()
+        assert entry["start"] <= entry["stop"]
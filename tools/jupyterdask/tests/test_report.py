@@ -0,0 +1,125 @@
+import dataclasses
+import pathlib
+
+import pytest
+
+from jupyterdask.config import DEFAULT_CONFIGS
+from jupyterdask.report import parse_sacct, recommend_config, summarize_usage
+
+DATA_DIR = pathlib.Path(__file__).parent / "data"
+
+SESSION_ID = "jupyter-2026-10-19T10-00-00-0123abcd"
+
+GiB = 2**30
+
+
+def _read_sacct(name):
+    return parse_sacct((DATA_DIR / name).read_text())
+
+
+def _jobs(jobs, name):
+    return [job for job in jobs if job["JobName"] == name]
+
+
+@pytest.fixture
+def config():
+    return dataclasses.replace(DEFAULT_CONFIGS["snellius"], worker_memory="28GiB")
+
+
+def test_parse_sacct_merges_steps():
+    jobs = {job["JobID"]: job for job in _read_sacct("sacct_session.txt")}
+    assert list(jobs) == ["100", "101", "102", "103"]
+    jupyter = jobs["100"]
+    assert jupyter["JobName"] == SESSION_ID
+    assert jupyter["QueueWait"] == 120
+    assert jupyter["Elapsed"] == 1200
+    assert jupyter["Timelimit"] == 3600
+    assert jupyter["TotalCPU"] == 1800
+    assert jupyter["ReqMem"] == 28 * GiB
+    # MaxRSS is only reported by the .batch and .extern steps
+    assert jupyter["MaxRSS"] == 2 * GiB
+    assert jobs["101"]["State"] == "CANCELLED"
+    assert jobs["102"]["MaxRSS"] == 27 * GiB
+
+
+def test_parse_sacct_pending_job_with_unlimited_walltime():
+    job = _read_sacct("sacct_session.txt")[-1]
+    assert job["State"] == "PENDING"
+    assert job["QueueWait"] == 0
+    assert job["Elapsed"] == 0
+    assert job["Timelimit"] is None
+    assert job["MaxRSS"] == 0
+
+
+def test_parse_sacct_array_tasks():
+    jobs = {job["JobID"]: job for job in _read_sacct("sacct_array.txt")}
+    assert list(jobs) == ["200_1", "200_2", "200_[3-4]"]
+    assert jobs["200_1"]["MaxRSS"] == 3 * GiB
+    # Memory per CPU, as reported by older SLURM versions
+    assert jobs["200_2"]["ReqMem"] == 8 * GiB
+    assert jobs["200_2"]["State"] == "OUT_OF_MEMORY"
+    assert jobs["200_[3-4]"]["Elapsed"] == 0
+
+
+def test_summarize_usage():
+    jobs = _read_sacct("sacct_session.txt")
+    workers = summarize_usage(_jobs(jobs, f"{SESSION_ID}-worker"))
+    # The pending job is left out
+    assert workers["jobs"] == 2
+    assert workers["timeouts"] == 1
+    assert workers["cpu_efficiency"] == 0.5
+    assert workers["peak_rss"] == 27 * GiB
+    assert workers["peak_memory_usage"] == pytest.approx(27 / 28)
+    assert workers["max_queue_wait"] == 300
+    assert workers["max_timelimit"] == 3600
+    assert workers["unused_walltime"] == 2700
+
+
+def test_summarize_usage_array_tasks():
+    usage = summarize_usage(_jobs(_read_sacct("sacct_array.txt"), SESSION_ID))
+    assert usage["jobs"] == 2
+    assert usage["out_of_memory"] == 1
+    assert usage["cpu_efficiency"] == 0.5
+    assert usage["peak_memory_usage"] == 1.0
+
+
+def test_summarize_usage_unlimited_walltime_and_empty_max_rss():
+    usage = summarize_usage(_read_sacct("sacct_unlimited.txt"))
+    assert usage["max_timelimit"] is None
+    assert usage["unused_walltime"] == 0
+    assert usage["peak_rss"] == 0
+    assert usage["peak_memory_usage"] is None
+    # Memory per node
+    assert usage["req_mem"] == 8 * GiB
+
+
+def test_summarize_usage_without_jobs():
+    assert summarize_usage([]) is None
+    assert summarize_usage(_read_sacct("sacct_session.txt")[-1:]) is None
+
+
+def test_recommend_config(config):
+    jobs = _read_sacct("sacct_session.txt")
+    usage = {
+        "jupyter": summarize_usage(_jobs(jobs, SESSION_ID)),
+        "workers": summarize_usage(_jobs(jobs, f"{SESSION_ID}-worker")),
+    }
+    assert recommend_config(config, usage) == {
+        "cores": 2,
+        "walltime": "00:30:00",
+        "worker_memory": "34GiB",
+    }
+
+
+def test_recommend_config_out_of_memory(config):
+    workers = summarize_usage(_jobs(_read_sacct("sacct_array.txt"), SESSION_ID))
+    usage = {"jupyter": None, "workers": workers}
+    assert recommend_config(config, usage) == {"worker_memory": "16GiB"}
+
+
+def test_recommend_config_unlimited_walltime_and_empty_max_rss(config):
+    usage = summarize_usage(_read_sacct("sacct_unlimited.txt"))
+    recommendations = recommend_config(config, {"jupyter": usage, "workers": usage})
+    assert "walltime" not in recommendations
+    assert "worker_memory" not in recommendations
+    assert recommendations["cores"] == 3
@@ -0,0 +1,31 @@
+import pytest
+from conftest import load_script
+
+pytest.importorskip("dask_jobqueue")
+
+scheduler = load_script("modules/jupyterdask_scheduler.py")
+
+
+@pytest.fixture
+def scheduler_env(tmp_path, monkeypatch):
+    env = {
+        "JUPYTERDASK_LOG_DIR": str(tmp_path),
+        "JUPYTERDASK_SCHEDULER_CORES": "2",
+        "JUPYTERDASK_SCHEDULER_MEMORY": "8GiB",
+        "JUPYTERDASK_SCHEDULER_WALLTIME": "1:00:00",
+        "JUPYTERDASK_SCHEDULER_PARTITION": "thin",
+        "SLURM_JOB_NAME": "jupyter-session",
+    }
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+
+@pytest.mark.parametrize("memory, expected", [("8GiB", "8192M"), ("2GB", "1907M")])
+def test_job_script(scheduler_env, monkeypatch, memory, expected):
+    monkeypatch.setenv("JUPYTERDASK_SCHEDULER_MEMORY", memory)
+    job = scheduler.SchedulerJob(protocol="tcp://", dashboard_address=":8787")
+    lines = job.job_script().splitlines()
+    assert f"#SBATCH --mem={expected}" in lines
+    assert "#SBATCH --job-name=jupyter-session-scheduler" in lines
+    assert "--protocol tcp://" in lines[-1]
+    assert "--interface" not in lines[-1]
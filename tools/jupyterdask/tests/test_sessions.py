@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from jupyterdask.remote import _print_session_summary, _stop_session
+from jupyterdask.sessions import (
+    SessionRecord,
+    get_session_start_date,
+    load_session,
+    new_session_id,
+)
+
+
+class FakeConnection:
+    """Connection to a remote cluster answering squeue and sacct with the given jobs."""
+
+    def __init__(self, squeue: str = "", sacct: str = ""):
+        self.squeue = squeue
+        self.sacct = sacct
+        self.commands = []
+
+    def run(self, command, **kwargs):
+        self.commands.append(command)
+        stdout = {"squeue": self.squeue, "sacct": self.sacct}.get(command.split()[0])
+        return SimpleNamespace(stdout=stdout or "", exited=0)
+
+
+def test_session_ids_are_unique():
+    ids = {new_session_id() for _ in range(100)}
+    assert len(ids) == 100
+
+
+def test_session_id_start_date():
+    session_id = new_session_id()
+    assert get_session_start_date(session_id) == session_id[8:18]
+    assert session_id[8:18].count("-") == 2
+
+
+def test_stop_session_cancels_jobs_of_session():
+    session = SessionRecord(new_session_id(), "host", ".jupyterdask", job_id=10)
+    conn = FakeConnection("10|RUNNING|30:00|1\n11|PENDING|1:00:00|1\n")
+    reclaimed = _stop_session(conn, session)
+    assert f"--name {session.session_id}," in conn.commands[0]
+    assert conn.commands[-1] == "scancel 10 11"
+    assert reclaimed == 0.5
+    assert not load_session(session.session_id).active
+
+
+def test_stop_session_cancels_recorded_job():
+    session = SessionRecord(new_session_id(), "host", ".jupyterdask", job_id=10)
+    conn = FakeConnection("")
+    _stop_session(conn, session)
+    assert conn.commands[-1] == "scancel 10"
+
+
+def test_session_summary(capsys):
+    session = SessionRecord(new_session_id(), "host", ".jupyterdask", job_id=10)
+    worker = f"{session.session_id}-worker"
+    conn = FakeConnection(
+        sacct=(
+            f"10|{session.session_id}|2024-05-01T10:00:00|2024-05-01T10:02:30\n"
+            f"11|{worker}|2024-05-01T10:03:00|2024-05-01T10:07:00\n"
+            f"12|{worker}|2024-05-01T10:03:00|2024-05-01T10:05:15\n"
+            f"13|{worker}|2024-05-01T10:03:00|Unknown\n"
+        )
+    )
+    _print_session_summary(conn, session, reclaimed=1.5)
+    assert f"--starttime {session.session_id[8:18]} " in conn.commands[0]
+    out = capsys.readouterr().out
+    assert "Jupyter queue wait: 0:02:30" in out
+    # Measured from the submission of the Jupyter job to the first worker started
+    assert "Time to first worker: 0:05:15" in out
+    assert "Node-hours reclaimed at shutdown: 1.50" in out
+
+
+def test_session_summary_without_workers(capsys):
+    session = SessionRecord(new_session_id(), "host", ".jupyterdask", job_id=10)
+    conn = FakeConnection(sacct=f"10|{session.session_id}|2024-05-01T10:00:00|None\n")
+    _print_session_summary(conn, session, reclaimed=0)
+    out = capsys.readouterr().out
+    assert "Jupyter queue wait" not in out
+    assert "Time to first worker: no worker started" in out
+    # Without accounting information, no summary is printed
+    _print_session_summary(FakeConnection(), session, reclaimed=0)
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,118 @@
+import os
+import threading
+
+import pytest
+from conftest import load_script
+
+fsspec = pytest.importorskip("fsspec")
+pytest.importorskip("webdav4")
+cheroot_wsgi = pytest.importorskip("cheroot.wsgi")
+wsgidav_app = pytest.importorskip("wsgidav.wsgidav_app")
+
+stage = load_script("scripts/stage.py")
+cache = load_script("modules/jupyterdask_cache.py")
+
+KiB = 2**10
+
+
+@pytest.fixture
+def webdav(tmp_path, monkeypatch):
+    """WebDAV server standing in for dCache, serving the files of a directory."""
+    root = tmp_path / "webdav"
+    (root / "data").mkdir(parents=True)
+    app = wsgidav_app.WsgiDAVApp(
+        {
+            "provider_mapping": {"/": str(root)},
+            "simple_dc": {"user_mapping": {"*": True}},
+            "verbose": 0,
+            "logging": {"enable": False},
+        }
+    )
+    server = cheroot_wsgi.Server(("127.0.0.1", 0), app)
+    server.prepare()
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    # As for dCacheFS, the server is set in the fsspec configuration
+    base_url = f"http://127.0.0.1:{server.bind_addr[1]}"
+    monkeypatch.setitem(fsspec.config.conf, "webdav", {"base_url": base_url})
+    yield root / "data"
+    server.stop()
+
+
+def _write_manifest(tmp_path, webdav, files):
+    manifest = tmp_path / "manifest.txt"
+    lines = ["# Input files"]
+    for name, size in files.items():
+        (webdav / name).write_bytes(os.urandom(size))
+        lines.append(f"webdav:///data/{name}")
+    manifest.write_text("\n".join(lines) + "\n")
+    return str(manifest)
+
+
+def test_stage(tmp_path, webdav, squeue, capsys):
+    cache_dir = tmp_path / "cache"
+    manifest = _write_manifest(tmp_path, webdav, {"a.bin": KiB, "b.bin": 2 * KiB})
+    stage.stage(manifest, str(cache_dir), max_size=10 * KiB)
+    for name in ("a.bin", "b.bin"):
+        copy = cache_dir / "webdav" / "data" / name
+        assert copy.read_bytes() == (webdav / name).read_bytes()
+    assert "2 fetched" in capsys.readouterr().out
+    # Files already staged are not fetched again
+    stage.stage(manifest, str(cache_dir), max_size=10 * KiB)
+    assert "0 fetched" in capsys.readouterr().out
+
+
+def test_stage_evicts_least_recently_used(tmp_path, webdav, squeue):
+    cache_dir = str(tmp_path / "cache")
+    for name in ("a.bin", "b.bin", "c.bin"):
+        manifest = _write_manifest(tmp_path, webdav, {name: 4 * KiB})
+        stage.stage(manifest, cache_dir, max_size=10 * KiB)
+    index = cache.read_index(cache_dir)
+    assert sorted(index) == ["webdav/data/b.bin", "webdav/data/c.bin"]
+    assert not os.path.exists(f"{cache_dir}/webdav/data/a.bin")
+
+
+def test_stage_keeps_files_in_use(tmp_path, webdav, squeue, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    squeue.write_text("100\n")
+    monkeypatch.setenv("SLURM_JOB_ID", "100")
+    manifest = _write_manifest(tmp_path, webdav, {"a.bin": 4 * KiB})
+    stage.stage(manifest, cache_dir, max_size=10 * KiB)
+    # Job 101 ends, its files can be evicted
+    monkeypatch.setenv("SLURM_JOB_ID", "101")
+    manifest = _write_manifest(tmp_path, webdav, {"b.bin": 4 * KiB})
+    stage.stage(manifest, cache_dir, max_size=10 * KiB)
+    monkeypatch.setenv("SLURM_JOB_ID", "102")
+    manifest = _write_manifest(tmp_path, webdav, {"c.bin": 4 * KiB})
+    stage.stage(manifest, cache_dir, max_size=10 * KiB)
+    index = cache.read_index(cache_dir)
+    assert sorted(index) == ["webdav/data/a.bin", "webdav/data/c.bin"]
+    assert index["webdav/data/a.bin"]["jobs"] == ["100"]
+
+
+def test_stage_keeps_files_if_queue_unavailable(tmp_path, webdav, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    monkeypatch.setenv("PATH", str(tmp_path))
+    monkeypatch.setenv("SLURM_JOB_ID", "100")
+    for name in ("a.bin", "b.bin", "c.bin"):
+        manifest = _write_manifest(tmp_path, webdav, {name: 4 * KiB})
+        stage.stage(manifest, cache_dir, max_size=10 * KiB)
+    assert len(cache.read_index(cache_dir)) == 3
+
+
+def test_default_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        stage,
+        "DEFAULT_CACHE_DIRS",
+        (f"{tmp_path}/missing/{{user}}", f"{tmp_path}/{{user}}"),
+    )
+    cache_dir = stage.get_default_cache_dir()
+    assert cache_dir.startswith(f"{tmp_path}/")
+    assert cache_dir.endswith("/jupyterdask-stage")
+    assert not (tmp_path / "missing").exists()
+
+
+def test_default_cache_dir_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage, "DEFAULT_CACHE_DIRS", (f"{tmp_path}/missing/{{user}}",))
+    monkeypatch.setenv("TMPDIR", str(tmp_path / "job"))
+    assert stage.get_default_cache_dir() == f"{tmp_path}/job/jupyterdask-stage"
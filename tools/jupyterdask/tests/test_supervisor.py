@@ -0,0 +1,102 @@
+import logging
+import os
+import signal
+import threading
+
+import pytest
+
+from jupyterdask.supervisor import (
+    SessionEndedError,
+    Supervisor,
+    TerminatedError,
+    raise_on_sigterm,
+)
+
+
+def test_sigterm_raises_error():
+    cleaned_up = False
+    with pytest.raises(TerminatedError):
+        with raise_on_sigterm():
+            try:
+                os.kill(os.getpid(), signal.SIGTERM)
+                signal.pause()
+            finally:
+                # Further SIGTERMs are ignored while cleaning up
+                os.kill(os.getpid(), signal.SIGTERM)
+                cleaned_up = True
+    assert cleaned_up
+    assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+
+
+def test_supervisor_ends_on_session_end(capsys):
+    def end():
+        raise SessionEndedError("Session ended.")
+
+    supervisor = Supervisor()
+    supervisor.add_task("end", end, interval=1)
+    supervisor.run()
+    assert supervisor.stopped.is_set()
+    assert capsys.readouterr().out == "Session ended.\n"
+
+
+def test_supervisor_keeps_sigterm_handler():
+    supervisor = Supervisor()
+    supervisor.add_task("kill", lambda: os.kill(os.getpid(), signal.SIGTERM), 1)
+    with pytest.raises(TerminatedError):
+        with raise_on_sigterm():
+            # The supervisor returns on SIGTERM
+            supervisor.run()
+            handler = signal.getsignal(signal.SIGTERM)
+            assert callable(handler)
+            os.kill(os.getpid(), signal.SIGTERM)
+            signal.pause()
+
+
+def test_supervisor_keeps_running_after_errors(caplog):
+    calls = []
+
+    def fail():
+        calls.append(len(calls))
+        if len(calls) < 3:
+            raise TimeoutError("timed out")
+        raise SessionEndedError("Session ended.")
+
+    supervisor = Supervisor()
+    supervisor.add_task("fail", fail, interval=0.01)
+    with caplog.at_level(logging.ERROR):
+        supervisor.run()
+    assert calls == [0, 1, 2]
+    assert caplog.messages == ["Task fail failed: TimeoutError('timed out')"] * 2
+
+
+def test_supervisor_reports_calls_not_returning(caplog):
+    released = threading.Event()
+    calls = []
+
+    def hang():
+        calls.append(len(calls))
+        released.wait()
+
+    def end():
+        # Ends the session once the hung call has been reported twice
+        if len(caplog.messages) >= 2:
+            released.set()
+            raise SessionEndedError("Session ended.")
+
+    supervisor = Supervisor()
+    supervisor.add_task("hang", hang, interval=0.01, timeout=0.05)
+    supervisor.add_task("end", end, interval=0.01)
+    with caplog.at_level(logging.WARNING):
+        supervisor.run()
+    # The task is not called again while its call has not returned
+    assert calls == [0]
+    assert caplog.messages[:2] == ["Task hang has not returned after 0.05 s."] * 2
+
+
+def test_supervisor_exits_with_call_not_returning():
+    supervisor = Supervisor()
+    supervisor.add_task("hang", threading.Event().wait, interval=1, timeout=None)
+    supervisor.add_task("kill", lambda: os.kill(os.getpid(), signal.SIGTERM), 1)
+    # The supervisor returns on SIGTERM, without waiting for the call to return
+    supervisor.run()
+    assert supervisor.stopped.is_set()
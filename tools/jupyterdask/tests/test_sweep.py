@@ -0,0 +1,161 @@
+import functools
+import json
+import sys
+
+import pytest
+from conftest import load_script
+
+from jupyterdask import jobs, main, remote
+from jupyterdask.sessions import load_session
+
+run_payload = load_script("scripts/run_payload.py")
+
+CELLS = [
+    ("markdown", "# Sweep", []),
+    ("code", "x = 0\nlabel = 'default'", ["parameters"]),
+    ("code", "import os\nassert x != 2 or os.path.exists('fixed')", []),
+    ("code", "open(f'result-{x}.txt', 'w').write(label)", []),
+]
+
+
+def _write_notebook(path, cells=CELLS, nbformat_minor=5):
+    nb = {
+        "cells": [
+            {
+                "cell_type": kind,
+                "metadata": {"tags": tags} if tags else {},
+                "source": source,
+                **({"execution_count": None, "outputs": []} if kind == "code" else {}),
+                **({"id": f"cell-{i}"} if nbformat_minor >= 5 else {}),
+            }
+            for i, (kind, source, tags) in enumerate(cells)
+        ],
+        "metadata": {
+            "kernelspec": {"name": "python3", "display_name": "Python 3"},
+        },
+        "nbformat": 4,
+        "nbformat_minor": nbformat_minor,
+    }
+    path.write_text(json.dumps(nb))
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "indices, max_concurrent, expected",
+    [
+        ([0], None, "0"),
+        ([0, 1, 2, 3], None, "0-3"),
+        ([5, 0, 2, 1, 8, 7], None, "0-2,5,7-8"),
+        ([0, 1, 2, 3, 4, 5], 2, "0-5%2"),
+        ([3, 9], 1, "3,9%1"),
+    ],
+)
+def test_format_array(indices, max_concurrent, expected):
+    assert remote._format_array(indices, max_concurrent) == expected
+
+
+@pytest.mark.parametrize(
+    "tasks, expected",
+    [
+        ("4", [4]),
+        ("[4-7]", [4, 5, 6, 7]),
+        ("[4-7%2]", [4, 5, 6, 7]),
+        ("[3-5,9,12-13%4]", [3, 4, 5, 9, 12, 13]),
+    ],
+)
+def test_parse_array_tasks(tasks, expected):
+    # Tasks of the job array "123_[4-7%2]" are listed after the array ID
+    assert jobs._parse_array_tasks(tasks) == expected
+
+
+def test_inject_parameters(tmp_path):
+    notebook = _write_notebook(tmp_path / "sweep.ipynb")
+    path = run_payload.inject_parameters(notebook, {"x": 2, "label": "a b"}, 7)
+    assert path == str(tmp_path / "sweep-7.ipynb")
+    cells = json.loads((tmp_path / "sweep-7.ipynb").read_text())["cells"]
+    # The parameters override the defaults of the cell tagged "parameters"
+    assert [c["source"] for c in cells[1:3]] == [
+        CELLS[1][1],
+        "x = 2\nlabel = 'a b'\n",
+    ]
+    assert cells[2]["metadata"]["tags"] == ["injected-parameters"]
+    assert cells[2]["id"] == "injected-parameters"
+
+
+def test_inject_parameters_without_tag(tmp_path):
+    cells = [(kind, source, []) for kind, source, _ in CELLS]
+    notebook = _write_notebook(tmp_path / "sweep.ipynb", cells, nbformat_minor=4)
+    path = run_payload.inject_parameters(notebook, {"x": 1}, 0)
+    cells = json.loads(open(path).read())["cells"]
+    # The parameters are assigned first, and cells have no ID before nbformat 4.5
+    assert cells[0]["source"] == "x = 1\n"
+    assert "id" not in cells[0]
+    assert len(cells) == len(CELLS) + 1
+
+
+def test_read_parameters(tmp_path):
+    path = tmp_path / "params.csv"
+    path.write_text("x,label,scale\n1,a,0.5\n2,'b c',\"[1, 2]\"\n3,True,\n")
+    assert main._read_parameters(str(path)) == [
+        {"x": 1, "label": "a", "scale": 0.5},
+        {"x": 2, "label": "b c", "scale": [1, 2]},
+        {"x": 3, "label": True, "scale": ""},
+    ]
+
+
+@pytest.mark.parametrize(
+    "text, match",
+    [("x,not valid\n1,2\n", "Invalid parameter name"), ("x\n", "No set")],
+)
+def test_read_invalid_parameters(tmp_path, text, match):
+    path = tmp_path / "params.csv"
+    path.write_text(text)
+    with pytest.raises(ValueError, match=match):
+        main._read_parameters(str(path))
+
+
+def test_sweep_requires_notebook():
+    with pytest.raises(ValueError, match="required"):
+        main.sweep(host="127.0.0.1", params="params.csv")
+
+
+def _get_arrays(remote_cluster) -> list[str]:
+    # Job array specifications passed to sbatch, in order of submission
+    state = json.loads((remote_cluster.home.parent / "slurm" / "jobs.json").read_text())
+    return list(dict.fromkeys(job["array"] for job in state.values() if "array" in job))
+
+
+def test_sweep_and_retry(tmp_path, remote_cluster, monkeypatch, capsys):
+    pytest.importorskip("nbconvert")
+    pytest.importorskip("dask_jobqueue")
+    monkeypatch.setattr(
+        remote, "JobMonitor", functools.partial(jobs.JobMonitor, interval=0.5)
+    )
+    notebook = _write_notebook(tmp_path / "sweep.ipynb")
+    params = tmp_path / "params.csv"
+    params.write_text("x,label\n1,a\n2,b\n3,c\n")
+    kwargs = {
+        "host": remote_cluster.host,
+        "identity_file": remote_cluster.identity_file,
+        "python": sys.executable,
+    }
+    with pytest.raises(SystemExit) as exc_info:
+        main.sweep(notebook=notebook, params=str(params), max_concurrent=2, **kwargs)
+    assert exc_info.value.code == 1
+    out = capsys.readouterr().out
+    assert "Tasks: 3/3 done (1 failed)" in out
+    assert "Failed tasks: 1\n" in out
+    (session_id,) = [line.split()[-1] for line in out.splitlines() if "--retry" in line]
+    run_dir = remote_cluster.home / ".jupyterdask" / f"{session_id}-run"
+    assert (run_dir / "result-1.txt").read_text() == "a"
+    assert (run_dir / "result-3.txt").read_text() == "c"
+    assert not (run_dir / "result-2.txt").exists()
+
+    # Only the failed task is run again
+    (run_dir / "fixed").touch()
+    with pytest.raises(SystemExit) as exc_info:
+        main.sweep(retry=session_id)
+    assert exc_info.value.code == 0
+    assert (run_dir / "result-2.txt").read_text() == "b"
+    assert _get_arrays(remote_cluster) == ["0-2%2", "1"]
+    assert load_session(session_id).array_size == 3
@@ -0,0 +1,175 @@
+import os
+
+import pytest
+
+from jupyterdask import sync
+
+CHUNK_SIZE = 2**16
+
+
+@pytest.fixture
+def host(remote_cluster, tmp_path, monkeypatch):
+    """Alias of the fake cluster in the SSH configuration, as paths have no port."""
+    home = tmp_path / "local-home"
+    (home / ".ssh").mkdir(parents=True)
+    (home / ".ssh" / "config").write_text(
+        f"Host fake-cluster\n  HostName 127.0.0.1\n  Port {remote_cluster.port}\n"
+    )
+    monkeypatch.setenv("HOME", str(home))
+    return "fake-cluster"
+
+
+@pytest.fixture
+def transfers(monkeypatch):
+    """Record the chunks and the tar batches sent."""
+    sent = {"chunks": [], "batches": []}
+    transfer_chunk = sync._Transfer._transfer_chunk
+    transfer_tar = sync._Transfer._transfer_tar
+
+    def _transfer_chunk(self, local_file, remote_file, offset):
+        sent["chunks"].append((os.path.basename(local_file), offset))
+        transfer_chunk(self, local_file, remote_file, offset)
+
+    def _transfer_tar(self, source, destination, files):
+        sent["batches"].append(sorted(info.path for info in files))
+        transfer_tar(self, source, destination, files)
+
+    monkeypatch.setattr(sync._Transfer, "_transfer_chunk", _transfer_chunk)
+    monkeypatch.setattr(sync._Transfer, "_transfer_tar", _transfer_tar)
+    return sent
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "data"
+    (path / "small" / "sub").mkdir(parents=True)
+    (path / "large.bin").write_bytes(os.urandom(5 * CHUNK_SIZE + 100))
+    for i in range(6):
+        (path / "small" / "sub" / f"{i}.txt").write_bytes(os.urandom(1000 + i))
+    (path / "small" / "empty.txt").write_bytes(b"")
+    return path
+
+
+def _sync(remote_cluster, source, destination, **kwargs):
+    sync.sync(
+        str(source),
+        str(destination),
+        identity_file=remote_cluster.identity_file,
+        chunk_size=CHUNK_SIZE,
+        **kwargs,
+    )
+
+
+def _assert_same(path, other):
+    files = sorted(p.relative_to(path) for p in path.rglob("*") if p.is_file())
+    other_files = sorted(p.relative_to(other) for p in other.rglob("*") if p.is_file())
+    assert files == other_files
+    for relpath in files:
+        assert (path / relpath).read_bytes() == (other / relpath).read_bytes()
+        mtime, other_mtime = (path / relpath).stat().st_mtime, (other / relpath).stat()
+        assert int(mtime) == int(other_mtime.st_mtime)
+
+
+def test_upload_and_download(remote_cluster, host, dataset, tmp_path, transfers):
+    _sync(remote_cluster, dataset, f"{host}:copy")
+    _assert_same(dataset, remote_cluster.home / "copy")
+    assert sorted(transfers["chunks"]) == [
+        ("large.bin", offset) for offset in range(0, 6 * CHUNK_SIZE, CHUNK_SIZE)
+    ]
+    # The small files are sent together with tar
+    assert transfers["batches"] == [
+        ["small/empty.txt", *(f"small/sub/{i}.txt" for i in range(6))]
+    ]
+
+    transfers["chunks"].clear()
+    _sync(remote_cluster, f"{host}:copy", tmp_path / "download")
+    _assert_same(dataset, tmp_path / "download")
+    assert len(transfers["chunks"]) == 6
+
+
+def test_up_to_date_files_are_skipped(remote_cluster, host, dataset, transfers, capsys):
+    _sync(remote_cluster, dataset, f"{host}:copy")
+    transfers["chunks"].clear()
+    transfers["batches"].clear()
+    _sync(remote_cluster, dataset, f"{host}:copy")
+    assert transfers == {"chunks": [], "batches": []}
+    assert "Transferred 0.0 MiB" in capsys.readouterr().out
+
+
+def test_small_files_are_batched(remote_cluster, host, dataset, transfers, monkeypatch):
+    monkeypatch.setattr(sync, "TAR_BATCH_SIZE", 2500)
+    _sync(remote_cluster, dataset / "small", f"{host}:copy")
+    _assert_same(dataset / "small", remote_cluster.home / "copy")
+    # Each batch holds as many files as fit in its size, and at least one
+    assert [len(batch) for batch in transfers["batches"]] == [3, 2, 2]
+    assert sorted(sum(transfers["batches"], [])) == sorted(
+        p.relative_to(dataset / "small").as_posix()
+        for p in (dataset / "small").rglob("*.txt")
+    )
+
+
+@pytest.mark.parametrize("upload", [True, False])
+def test_interrupted_transfer_is_resumed(
+    remote_cluster, host, dataset, tmp_path, transfers, upload
+):
+    source = dataset / "large.bin"
+    data = source.read_bytes()
+    # The transfer was interrupted after the first two chunks and the fourth one
+    partial = bytearray(len(data))
+    for offset in (0, CHUNK_SIZE, 3 * CHUNK_SIZE):
+        partial[offset : offset + CHUNK_SIZE] = data[offset : offset + CHUNK_SIZE]
+    remote_file = remote_cluster.home / "large.bin"
+    if upload:
+        remote_file.write_bytes(partial)
+        # The modification time is only set once the transfer has completed
+        os.utime(remote_file, (0, 0))
+        _sync(remote_cluster, source, f"{host}:large.bin")
+        assert remote_file.read_bytes() == data
+    else:
+        remote_file.write_bytes(data)
+        local_file = tmp_path / "large.bin"
+        local_file.write_bytes(partial[: 4 * CHUNK_SIZE])
+        _sync(remote_cluster, f"{host}:large.bin", local_file)
+        assert local_file.read_bytes() == data
+    assert sorted(offset for _, offset in transfers["chunks"]) == [
+        2 * CHUNK_SIZE,
+        4 * CHUNK_SIZE,
+        5 * CHUNK_SIZE,
+    ]
+
+
+def test_checksum_mismatch_is_sent_again(remote_cluster, host, dataset, monkeypatch):
+    source = dataset / "large.bin"
+    remote_file = remote_cluster.home / "large.bin"
+    transfer_chunk = sync._Transfer._transfer_chunk
+    offsets = []
+
+    def _transfer_chunk(self, local_file, remote_path, offset):
+        transfer_chunk(self, local_file, remote_path, offset)
+        if offset == 2 * CHUNK_SIZE and offset not in offsets:
+            # Corrupt the chunk the first time it is sent
+            with open(remote_file, "r+b") as f:
+                f.seek(offset + 10)
+                f.write(b"corrupted")
+        offsets.append(offset)
+
+    monkeypatch.setattr(sync._Transfer, "_transfer_chunk", _transfer_chunk)
+    _sync(remote_cluster, source, f"{host}:large.bin", streams=2)
+    assert remote_file.read_bytes() == source.read_bytes()
+    assert offsets.count(2 * CHUNK_SIZE) == 2
+    assert len(offsets) == 7
+
+
+def test_persistent_checksum_mismatch_fails(remote_cluster, host, dataset, monkeypatch):
+    source = dataset / "large.bin"
+    remote_file = remote_cluster.home / "large.bin"
+    transfer_chunk = sync._Transfer._transfer_chunk
+
+    def _transfer_chunk(self, local_file, remote_path, offset):
+        transfer_chunk(self, local_file, remote_path, offset)
+        with open(remote_file, "r+b") as f:
+            f.write(b"corrupted")
+
+    monkeypatch.setattr(sync._Transfer, "_transfer_chunk", _transfer_chunk)
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        _sync(remote_cluster, source, f"{host}:large.bin")
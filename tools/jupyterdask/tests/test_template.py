@@ -0,0 +1,81 @@
+import ast
+import dataclasses
+import re
+import subprocess
+
+import dask
+import pytest
+
+from jupyterdask.config import DEFAULT_CONFIGS
+from jupyterdask.template import setup_job_script
+
+
+@pytest.fixture
+def job_script():
+    return setup_job_script("snellius", log_dir="logs", initial_workers=1)
+
+
+def _get_lines(job_script, pattern):
+    return [line for line in job_script.splitlines() if re.search(pattern, line)]
+
+
+def test_log_dir_is_absolute(job_script):
+    # Only the output of the job itself is relative to the submission directory
+    lines = _get_lines(job_script, r"(^|[\s'=])logs/")
+    assert lines == ["#SBATCH --output=logs/%x-%j.out"]
+    assert "LOG_DIR=`realpath -m logs`" in job_script
+
+
+def test_initial_workers(job_script):
+    (line,) = _get_lines(job_script, "LABEXTENSION__INITIAL")
+    name, _, value = line.removeprefix("export ").partition("=")
+    env = dask.config.collect_env({name: value.strip('"')})
+    assert env["labextension"]["initial"] == [{"name": "SLURMCluster", "workers": 1}]
+    # No cluster is started with the Jupyter server by default
+    assert not _get_lines(setup_job_script("snellius"), "LABEXTENSION__INITIAL")
+
+
+def test_agent(job_script):
+    (line,) = _get_lines(job_script, "agent.py")
+    assert line.startswith("${PYTHON} ${LOG_DIR}/scripts/agent.py ")
+    assert "--status-file ${LOG_DIR}/${SLURM_JOB_NAME}-${SLURM_JOB_ID}" in line
+
+
+@pytest.mark.parametrize("protocol", ["tcp", "tcp://"])
+def test_protocol(protocol, monkeypatch):
+    dask_jobqueue = pytest.importorskip("dask_jobqueue")
+    config = dataclasses.replace(DEFAULT_CONFIGS["snellius"], protocol=protocol)
+    monkeypatch.setitem(DEFAULT_CONFIGS, "snellius", config)
+    job_script = setup_job_script("snellius")
+    (line,) = _get_lines(job_script, "FACTORY__KWARGS")
+    name, _, value = line.removeprefix("export ").partition("=")
+    env = dask.config.collect_env({name: value.strip('"')})
+    kwargs = env["labextension"]["factory"]["kwargs"]
+    assert kwargs == {"protocol": "tcp"}
+    # The protocol is passed on to the scheduler and to the workers
+    cluster = dask_jobqueue.SLURMCluster(
+        cores=1, memory="1GiB", scheduler_options={"host": "127.0.0.1"}, **kwargs
+    )
+    with cluster:
+        assert cluster.scheduler_address.startswith("tcp://")
+        assert "--protocol tcp" in cluster.job_script()
+
+
+def _run_bash(script: str) -> str:
+    res = subprocess.run(["bash", "-c", script], capture_output=True, text=True)
+    return res.stdout.strip()
+
+
+def test_worker_lifetime_after_staging():
+    job_script = setup_job_script("snellius", stage_manifest=["https://dcache/a"])
+    (line,) = _get_lines(job_script, "JOB_SCRIPT_PROLOGUE=")
+    (extra_args,) = _get_lines(job_script, "WORKER_EXTRA_ARGS=")
+    assert "'--lifetime'" not in extra_args
+    prologue = ast.literal_eval(
+        _run_bash(f"{line}\necho $DASK_JOBQUEUE__SLURM__JOB_SCRIPT_PROLOGUE")
+    )
+    # The time spent staging is subtracted from the lifetime of the workers
+    lifetime = prologue[-1]
+    duration = "echo $DASK_DISTRIBUTED__WORKER__LIFETIME__DURATION"
+    assert _run_bash(f"SECONDS=120\n{lifetime}\n{duration}") == "3000s"
+    assert _run_bash(f"SECONDS=4000\n{lifetime}\n{duration}") == "1s"
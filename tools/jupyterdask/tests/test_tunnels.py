@@ -0,0 +1,237 @@
+import socket
+import threading
+import time
+
+import pytest
+from fabric import Connection
+from paramiko import SSHException, Transport
+
+from jupyterdask.tunnels import (
+    MAX_RECONNECT_DELAY,
+    LocalForward,
+    SessionTunnel,
+    is_alive,
+)
+
+
+class FakeTransport:
+    """Transport that responds to keepalives until it is closed."""
+
+    def __init__(self, responsive: bool = True):
+        self.active = True
+        self.responsive = responsive
+
+    def is_active(self):
+        return self.active
+
+    def global_request(self, kind, wait=True):
+        if not self.responsive:
+            threading.Event().wait(1)
+        return None
+
+    def close(self):
+        self.active = False
+
+
+class FakeConnection:
+    """Connection that fails to open a number of times before succeeding."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.attempts = 0
+        self.transport = FakeTransport()
+
+    def open(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise SSHException("Connection refused")
+        self.transport = FakeTransport()
+
+    def close(self):
+        self.transport.close()
+
+
+class FakeForward:
+    """Forward recording the transports it has been started on."""
+
+    def __init__(self):
+        self.transports = []
+        self.running = False
+
+    def start(self, transport):
+        self.transports.append(transport)
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+class FakeStopped:
+    """Stop event recording the delays waited, without waiting."""
+
+    def __init__(self, max_waits: int = 100):
+        self.delays = []
+        self.max_waits = max_waits
+
+    def wait(self, delay):
+        self.delays.append(delay)
+        return len(self.delays) > self.max_waits
+
+
+def test_is_alive():
+    assert is_alive(FakeTransport())
+    assert not is_alive(None)
+    transport = FakeTransport()
+    transport.close()
+    assert not is_alive(transport)
+
+
+def test_is_alive_closes_unresponsive_transport():
+    transport = FakeTransport(responsive=False)
+    assert not is_alive(transport, timeout=0.1)
+    assert not transport.active
+
+
+def test_check_keeps_live_connection():
+    connection, forward = FakeConnection(), FakeForward()
+    tunnel = SessionTunnel(connection, forward)
+    tunnel.open()
+    stopped = FakeStopped()
+    tunnel.check(stopped)
+    assert connection.attempts == 1
+    assert stopped.delays == []
+    assert forward.running
+
+
+def test_check_reconnects_with_backoff(capsys):
+    connection, forward = FakeConnection(), FakeForward()
+    tunnel = SessionTunnel(connection, forward)
+    tunnel.open()
+    connection.failures = 8
+    connection.transport.close()
+    stopped = FakeStopped()
+    tunnel.check(stopped)
+    assert stopped.delays == [1, 2, 4, 8, 16, 32, 60, 60]
+    assert max(stopped.delays) == MAX_RECONNECT_DELAY
+    # The forward is restarted on the transport of the new connection
+    assert forward.running
+    assert forward.transports[-1] is connection.transport
+    assert tunnel.connected.is_set()
+    assert "Reconnected" in capsys.readouterr().out
+
+
+def test_check_reconnects_through_node():
+    connection, node_connection, forward = (
+        FakeConnection(),
+        FakeConnection(),
+        FakeForward(),
+    )
+    tunnel = SessionTunnel(connection, forward, node_connection=node_connection)
+    tunnel.open()
+    node_connection.failures = 2
+    node_connection.transport.close()
+    tunnel.check(FakeStopped())
+    assert node_connection.attempts == 3
+    assert forward.transports[-1] is node_connection.transport
+
+
+def test_check_stops_reconnecting():
+    connection, forward = FakeConnection(), FakeForward()
+    tunnel = SessionTunnel(connection, forward)
+    tunnel.open()
+    connection.failures = 100
+    connection.transport.close()
+    tunnel.check(FakeStopped(max_waits=3))
+    assert connection.attempts == 4
+    assert not forward.running
+    assert not tunnel.connected.is_set()
+
+
+def _serve_echo(sock: socket.socket) -> None:
+    while True:
+        try:
+            conn, _ = sock.accept()
+        except OSError:
+            return
+        with conn:
+            for data in iter(lambda c=conn: c.recv(1024), b""):
+                conn.sendall(data)
+
+
+def _get_unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def _echo(port: int, data: bytes) -> bytes:
+    # The forward listens on the local port once its thread has started
+    for _ in range(50):
+        try:
+            sock = socket.create_connection(("localhost", port), timeout=10)
+        except ConnectionRefusedError:
+            time.sleep(0.1)
+        else:
+            break
+    with sock:
+        sock.sendall(data)
+        return sock.recv(1024)
+
+
+def test_check_reconnects_to_restarted_server(remote_cluster):
+    echo_sock = socket.create_server(("127.0.0.1", 0))
+    threading.Thread(target=_serve_echo, args=(echo_sock,), daemon=True).start()
+    connection = Connection(
+        remote_cluster.host,
+        connect_kwargs={"key_filename": remote_cluster.identity_file},
+    )
+    forward = LocalForward(
+        _get_unused_port(),
+        remote_host="127.0.0.1",
+        remote_port=echo_sock.getsockname()[1],
+    )
+    tunnel = SessionTunnel(connection, forward)
+    tunnel.open()
+    try:
+        assert _echo(forward.local_port, b"before") == b"before"
+        remote_cluster.stop()
+        remote_cluster.start()
+        tunnel.check(threading.Event())
+        assert tunnel.connected.is_set()
+        # The forward is rebuilt on the same local port
+        assert _echo(forward.local_port, b"after") == b"after"
+    finally:
+        tunnel.close()
+        connection.close()
+        echo_sock.close()
+
+
+def test_forward_to_socket(remote_cluster, tmp_path):
+    # Jupyter listens on a socket in the home directory on the remote cluster
+    socket_path = str(remote_cluster.home / "jupyter.sock")
+    echo_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    echo_sock.bind(socket_path)
+    echo_sock.listen(16)
+    threading.Thread(target=_serve_echo, args=(echo_sock,), daemon=True).start()
+    connection = Connection(
+        remote_cluster.host,
+        connect_kwargs={"key_filename": remote_cluster.identity_file},
+    )
+    forward = LocalForward(_get_unused_port(), remote_socket=socket_path)
+    tunnel = SessionTunnel(connection, forward)
+    tunnel.open()
+    try:
+        assert _echo(forward.local_port, b"first") == b"first"
+        assert _echo(forward.local_port, b"second") == b"second"
+    finally:
+        tunnel.close()
+        connection.close()
+        echo_sock.close()
+
+
+def test_forward_to_socket_needs_paramiko_internals(monkeypatch):
+    monkeypatch.delattr(Transport, "_next_channel")
+    forward = LocalForward(_get_unused_port(), remote_socket="/tmp/jupyter.sock")
+    with pytest.raises(RuntimeError, match="_next_channel.*without --socket"):
+        forward.start(Transport(socket.socket()))
+    assert forward._thread is None